@@ -1,11 +1,19 @@
 import os
 import sqlite3
-from flask import Flask, request, jsonify, session, g, render_template
+import json
+from flask import Flask, Response, request, jsonify, session, g, render_template, stream_with_context
 from flask_cors import CORS
 from werkzeug.security import check_password_hash
 from datetime import datetime, timedelta
-from bot.core import TherapyDocumentationBot
-from llama_index.core.base.llms.types import ChatMessage, MessageRole
+import threading
+import time
+from bot.pool import BotPool
+from storage import get_pool
+from migrations import migrate
+from chat_store import ChatSessionStore
+from tools import TherapyDocTools
+from categories import CATEGORIES_ETAG, CATEGORIES_JSON
+import metrics
 
 app = Flask(__name__)
 CORS(app)
@@ -15,40 +23,114 @@ app.config.update(
     SECRET_KEY='dev',
     DATABASE=os.environ.get('DATABASE', 'therapy.db'),
     SESSION_COOKIE_HTTPONLY=True,
-    PERMANENT_SESSION_LIFETIME=timedelta(days=7)
+    PERMANENT_SESSION_LIFETIME=timedelta(days=7),
+    BOT_POOL_SIZE=int(os.environ.get('BOT_POOL_SIZE', '4'))
 )
 
+# Process-wide bot pool, built lazily so each gunicorn worker gets its own
+_bot_pool = None
+_shared_lock = threading.Lock()
+
+@app.before_request
+def start_request_trace():
+    """Start timing the request and collecting its spans"""
+    g.request_started = time.perf_counter()
+    g.trace = metrics.start_trace(f"{request.method} {request.path}")
+
+@app.after_request
+def record_request_metrics(response):
+    """Record the request's latency and status, and finish its trace"""
+    started, trace = g.get('request_started'), g.get('trace')
+    if started is None:
+        return response
+    method = request.method
+    # The route pattern, not the path, so ids don't explode the label set
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    status = response.status_code
+    
+    def finish():
+        metrics.observe_request(method, route, status, time.perf_counter() - started)
+        metrics.finish_trace(trace, method=method, route=route, status=status)
+    
+    if response.is_streamed:
+        # The body is produced after this hook returns; stop the clock once it has been sent
+        response.call_on_close(finish)
+    else:
+        finish()
+    return response
+
 def get_db_connection():
-    """Get database connection"""
+    """Check out a pooled database connection for the current request"""
     if 'db' not in g:
-        g.db = sqlite3.connect(
-            app.config['DATABASE'],
-            detect_types=sqlite3.PARSE_DECLTYPES
-        )
-        g.db.row_factory = sqlite3.Row
+        g.db = get_pool(app.config['DATABASE']).acquire()
     return g.db
 
 def init_db():
-    """Initialize the database"""
-    db = get_db_connection()
-    with app.open_resource('schema.sql') as f:
-        db.executescript(f.read().decode('utf8'))
+    """Apply any pending schema migrations"""
+    migrate(get_pool(app.config['DATABASE']))
+
+def get_bot_pool():
+    """Get the process-wide bot pool"""
+    global _bot_pool
+    if _bot_pool is None:
+        with _shared_lock:
+            if _bot_pool is None:
+                _bot_pool = BotPool(size=app.config['BOT_POOL_SIZE'])
+    return _bot_pool
+
+def get_tools():
+    """Get documentation tools bound to the logged-in user, for requests that don't need the agent"""
+    if 'tools' not in g:
+        g.tools = TherapyDocTools(user_id=session['username'])
+    return g.tools
+
+def get_chat_store():
+    """Get the server-side chat session store"""
+    return ChatSessionStore(get_pool(app.config['DATABASE']))
+
+def get_chat_session_id():
+    """Get the chat session id for the current user, creating a session if needed"""
+    store = get_chat_store()
+    session_id = session.get('chat_session_id')
+    if not session_id or not store.exists(session_id):
+        session_id = store.create()
+        session['chat_session_id'] = session_id
+    # Drop history serialized into the cookie by older versions
+    session.pop('chat_history', None)
+    return session_id
 
 def get_bot():
-    """Get or create bot instance"""
+    """Check out a bot from the pool for the current request"""
     if 'bot' not in g:
-        g.bot = TherapyDocumentationBot()
-        # Restore chat history from session if available
-        if 'chat_history' in session:
-            g.bot.chat_history = [
-                ChatMessage(
-                    role=MessageRole(msg['role']),
-                    content=msg['content']
-                )
-                for msg in session['chat_history']
-            ]
+        # Imported here so workers that only serve forms and data never load llama-index
+        from llama_index.core.base.llms.types import ChatMessage, MessageRole
+        
+        # Restore recent chat history and the rolling summary from the server-side store
+        history, summary = get_chat_store().load(get_chat_session_id())
+        chat_history = [
+            ChatMessage(
+                role=MessageRole(msg['role']),
+                content=msg['content']
+            )
+            for msg in history
+        ]
+        g.bot = get_bot_pool().acquire(
+            chat_history=chat_history,
+            summary=summary,
+            user_id=session['username']
+        )
     return g.bot
 
+def save_chat_turns(chat_session_id, messages):
+    """Persist new chat turns; the cookie carries just the session id"""
+    get_chat_store().append(chat_session_id, [
+        {
+            'role': msg.role.value,  # Convert enum to string
+            'content': msg.content
+        }
+        for msg in messages
+    ])
+
 @app.route('/start-chat', methods=['GET'])
 def start_chat():
     """Start a new chat session"""
@@ -70,26 +152,50 @@ def chat_message():
         return jsonify({"error": "No message provided"}), 400
     
     bot = get_bot()
+    turns_before = len(bot.chat_history)
     response = bot.process_message(data['message'])
-    # Save updated chat history to session in a serializable format
-    session['chat_history'] = [
-        {
-            'role': msg.role.value,  # Convert enum to string
-            'content': msg.content
-        }
-        for msg in bot.chat_history
-    ]
+    save_chat_turns(session['chat_session_id'], bot.chat_history[turns_before:])
     return jsonify(response)
 
+@app.route('/chat-stream', methods=['POST'])
+def chat_stream():
+    """Process a chat message, streaming tokens and tool calls as Server-Sent Events"""
+    if 'username' not in session:
+        return jsonify({"error": "Not logged in"}), 401
+    
+    data = request.get_json()
+    if not data or 'message' not in data:
+        return jsonify({"error": "No message provided"}), 400
+    
+    bot = get_bot()
+    chat_session_id = session['chat_session_id']
+    turns_before = len(bot.chat_history)
+    
+    def generate():
+        for event in bot.stream_message(data['message']):
+            yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        save_chat_turns(chat_session_id, bot.chat_history[turns_before:])
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'  # Stop reverse proxies from buffering the stream
+        }
+    )
+
 @app.route('/categories', methods=['GET'])
 def get_categories():
     """Get available categories"""
     if 'username' not in session:
         return jsonify({"error": "Not logged in"}), 401
     
-    bot = get_bot()
-    categories = bot.tools.get_categories()
-    return jsonify(categories)
+    # The registry is immutable, so the body and its ETag are computed once at import
+    response = Response(CATEGORIES_JSON, mimetype='application/json')
+    response.set_etag(CATEGORIES_ETAG)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
 
 @app.route('/')
 def index():
@@ -114,22 +220,88 @@ def chat():
 
 @app.route('/get-all-data')
 def get_all_data():
-    """Get all data for all categories"""
+    """Get all data for all categories.
+    
+    With ``cursor`` or ``limit``, returns one page of section history instead
+    (newest first, optionally bounded by ``since``/``until`` and filtered by
+    ``category_id``), with the ``next_cursor`` of the following page.
+    """
     if 'username' not in session:
         return jsonify({"error": "Not logged in"}), 401
     
-    bot = get_bot()
-    all_data = {}
-    
-    for category in bot.tools.get_categories():
+    if 'cursor' in request.args or 'limit' in request.args:
         try:
-            all_data[category['id']] = bot.tools.get_category_summary(category_id=category['id'])
-        except Exception as e:
-            print(f"Error getting data for category {category['id']}: {e}")
-            continue
+            page = get_tools().get_history(
+                category_id=request.args.get('category_id') or None,
+                since=request.args.get('since') or None,
+                until=request.args.get('until') or None,
+                cursor=request.args.get('cursor') or None,
+                limit=request.args.get('limit', 50, type=int)
+            )
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        return jsonify(page)
+    
+    try:
+        all_data = get_tools().get_all_summaries()
+    except Exception as e:
+        print(f"Error getting data for all categories: {e}")
+        return jsonify({"error": "Internal server error"}), 500
     
     return jsonify(all_data)
 
+@app.route('/notes/<category_id>')
+def get_notes(category_id):
+    """Get a page of notes for a category, newest first"""
+    if 'username' not in session:
+        return jsonify({"error": "Not logged in"}), 401
+    
+    try:
+        page = get_tools().get_category_notes(
+            category_id=category_id,
+            limit=request.args.get('limit', 50, type=int),
+            before_id=request.args.get('before', type=int)
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    return jsonify(page)
+
+@app.route('/search')
+def search():
+    """Search the user's observations and notes, best matches first"""
+    if 'username' not in session:
+        return jsonify({"error": "Not logged in"}), 401
+    
+    query = request.args.get('q', '')
+    try:
+        results = get_tools().search(
+            query,
+            category_id=request.args.get('category_id') or None,
+            since=request.args.get('since') or None,
+            limit=request.args.get('limit', 20, type=int)
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    return jsonify({"query": query, "results": results})
+
+@app.route('/trends')
+def trends():
+    """Get observation counts per category and section per day or week"""
+    if 'username' not in session:
+        return jsonify({"error": "Not logged in"}), 401
+    
+    try:
+        return jsonify(get_tools().get_trends(
+            days=request.args.get('days', 30, type=int),
+            category_id=request.args.get('category_id') or None,
+            period=request.args.get('period', 'day'),
+            until=request.args.get('until') or None
+        ))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
 @app.route('/submit', methods=['POST'])
 def submit_documentation():
     """Submit documentation for a category"""
@@ -140,25 +312,25 @@ def submit_documentation():
     if not data:
         return jsonify({"error": "No data provided"}), 400
     
-    bot = get_bot()
+    tools = get_tools()
     
     try:
         # Handle section observations
         if 'category_id' in data and 'section_name' in data and 'observations' in data:
-            bot.tools.set_category_section_observations(
+            tools.set_category_section_observations(
                 category_id=data['category_id'],
                 section_name=data['section_name'],
                 observations=data['observations']
             )
         # Handle next steps
         elif 'category_id' in data and 'next_steps' in data:
-            bot.tools.set_category_next_steps(
+            tools.set_category_next_steps(
                 category_id=data['category_id'],
                 next_steps=data['next_steps']
             )
         # Handle notes
         elif 'category_id' in data and 'notes' in data:
-            bot.tools.add_category_notes(
+            tools.add_category_notes(
                 category_id=data['category_id'],
                 notes=data['notes']
             )
@@ -198,10 +370,9 @@ def delete_entry(entry_id):
     if 'username' not in session:
         return jsonify({"error": "Not logged in"}), 401
     
-    db = get_db_connection()
     try:
-        db.execute('DELETE FROM category_sections WHERE id = ?', (entry_id,))
-        db.commit()
+        # Scoped to the user, so nobody can delete another user's entries by id
+        get_tools().delete_entry(entry_id)
         return jsonify({"status": "success"})
     except Exception as e:
         print(f"Error deleting entry: {e}")
@@ -211,20 +382,31 @@ def delete_entry(entry_id):
 def logout():
     """Log out the current user"""
     session.pop('username', None)
-    session.pop('chat_history', None)  # Also clear chat history on logout
+    session.pop('chat_history', None)
+    # Also clear chat history on logout
+    chat_session_id = session.pop('chat_session_id', None)
+    if chat_session_id:
+        get_chat_store().delete(chat_session_id)
     return jsonify({"status": "success"})
 
+@app.route('/metrics')
+def metrics_endpoint():
+    """Expose request, LLM, tool and database metrics in the Prometheus text format"""
+    if not metrics.METRICS_ENABLED:
+        return jsonify({"error": "Metrics are disabled"}), 404
+    return Response(metrics.REGISTRY.render(), mimetype=metrics.CONTENT_TYPE)
+
 @app.teardown_appcontext
 def teardown_db(exception):
     """Clean up database connection"""
     db = g.pop('db', None)
     if db is not None:
-        db.close()
+        get_pool(app.config['DATABASE']).release(db)
     
     bot = g.pop('bot', None)
     if bot is not None:
-        # Clean up any bot resources if needed
-        pass
+        # Hand the bot back to the pool for the next request
+        get_bot_pool().release(bot)
 
 def create_test_user():
     """Create default test user"""
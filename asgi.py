@@ -0,0 +1,221 @@
+import asyncio
+import contextvars
+import json
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+from asgiref.sync import ThreadSensitiveContext
+from asgiref.wsgi import WsgiToAsgi
+from flask import request
+from app import app as flask_app, get_bot_pool, get_chat_store, init_db
+from storage import close_pools, get_async_pool
+import metrics
+from llama_index.core.base.llms.types import ChatMessage, MessageRole
+
+# Chats no longer pin a worker while waiting on the LLM, so one process can
+# serve many more concurrent conversations than under sync gunicorn workers
+flask_app.config['BOT_POOL_SIZE'] = int(os.environ.get('BOT_POOL_SIZE', '32'))
+# How long a chat waits for a free bot before getting a 503
+BOT_ACQUIRE_TIMEOUT = float(os.environ.get('BOT_ACQUIRE_TIMEOUT', '30'))
+
+# Everything except the LLM-bound chat endpoints still runs through Flask
+wsgi_app = WsgiToAsgi(flask_app)
+
+SSE_HEADERS = [
+    (b'content-type', b'text/event-stream; charset=utf-8'),
+    (b'cache-control', b'no-cache'),
+    (b'x-accel-buffering', b'no'),  # Stop reverse proxies from buffering the stream
+]
+
+
+def get_db():
+    """Get the async front end of the app's connection pool"""
+    return get_async_pool(flask_app.config['DATABASE'])
+
+
+def open_session(scope: Dict):
+    """Load the Flask session from the request cookie"""
+    headers = [
+        (name.decode('latin-1'), value.decode('latin-1'))
+        for name, value in scope['headers']
+        if name == b'cookie'
+    ]
+    with flask_app.test_request_context(scope['path'], method=scope['method'], headers=headers):
+        return flask_app.session_interface.open_session(flask_app, request)
+
+
+def session_headers(scope: Dict, session) -> List[Tuple[bytes, bytes]]:
+    """Get the Set-Cookie headers Flask would send for a session"""
+    response = flask_app.response_class()
+    with flask_app.test_request_context(scope['path'], method=scope['method']):
+        flask_app.session_interface.save_session(flask_app, session, response)
+    headers = [(b'set-cookie', cookie.encode('latin-1')) for cookie in response.headers.getlist('Set-Cookie')]
+    if any(name == b'origin' for name, _ in scope['headers']):
+        # Match the header flask-cors adds to every other route
+        headers.append((b'access-control-allow-origin', b'*'))
+    return headers
+
+
+async def read_body(receive) -> bytes:
+    """Read the full request body"""
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body', False):
+            return body
+
+
+async def send_json(send, status: int, data: Dict, headers: Optional[List] = None):
+    """Send a complete JSON response"""
+    body = json.dumps(data).encode('utf-8')
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())]
+                   + (headers or []),
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def get_chat_session_id(session) -> str:
+    """Async version of app.get_chat_session_id"""
+    store = get_chat_store()
+    session_id = session.get('chat_session_id')
+    if not session_id or not await get_db().call(store.exists, session_id):
+        session_id = await get_db().call(store.create)
+        session['chat_session_id'] = session_id
+    # Drop history serialized into the cookie by older versions
+    session.pop('chat_history', None)
+    return session_id
+
+
+async def acquire_bot(chat_session_id: str, user_id: str):
+    """Check out a bot bound to a user and loaded with a session's chat history"""
+    history, summary = await get_db().call(get_chat_store().load, chat_session_id)
+    chat_history = [
+        ChatMessage(role=MessageRole(msg['role']), content=msg['content'])
+        for msg in history
+    ]
+    # Waits on the event loop, so queued chats hold no threads
+    return await get_bot_pool().aacquire(
+        chat_history=chat_history,
+        summary=summary,
+        timeout=BOT_ACQUIRE_TIMEOUT,
+        user_id=user_id
+    )
+
+
+async def save_chat_turns(chat_session_id: str, messages: List[ChatMessage]):
+    """Async version of app.save_chat_turns"""
+    await get_db().call(get_chat_store().append, chat_session_id, [
+        {'role': msg.role.value, 'content': msg.content}
+        for msg in messages
+    ])
+
+
+async def chat_endpoint(scope: Dict, receive, send, stream: bool):
+    """Handle /chat-message and /chat-stream without holding a thread for the LLM call"""
+    body = await read_body(receive)
+    session = open_session(scope)
+    if 'username' not in session:
+        await send_json(send, 401, {"error": "Not logged in"})
+        return
+
+    try:
+        data = json.loads(body) if body else None
+    except ValueError:
+        data = None
+    if not isinstance(data, dict) or 'message' not in data:
+        await send_json(send, 400, {"error": "No message provided"})
+        return
+
+    chat_session_id = await get_chat_session_id(session)
+    headers = session_headers(scope, session)
+    try:
+        bot = await acquire_bot(chat_session_id, session['username'])
+    except asyncio.TimeoutError:
+        await send_json(send, 503, {"error": "Too many chats in progress, try again shortly"},
+                        [(b'retry-after', b'1')] + headers)
+        return
+    try:
+        turns_before = len(bot.chat_history)
+        if not stream:
+            response = await bot.aprocess_message(data['message'])
+            await save_chat_turns(chat_session_id, bot.chat_history[turns_before:])
+            await send_json(send, 200, response, headers)
+            return
+
+        await send({'type': 'http.response.start', 'status': 200, 'headers': SSE_HEADERS + headers})
+        async for event in bot.astream_message(data['message']):
+            await send({
+                'type': 'http.response.body',
+                'body': f"event: {event['type']}\ndata: {json.dumps(event)}\n\n".encode('utf-8'),
+                'more_body': True,
+            })
+        await save_chat_turns(chat_session_id, bot.chat_history[turns_before:])
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        # Hand the bot back to the pool for the next request
+        get_bot_pool().release(bot)
+
+
+async def timed_chat_endpoint(scope: Dict, receive, send, stream: bool):
+    """Serve a chat endpoint, recording the same request metrics and trace as Flask routes"""
+    started = time.perf_counter()
+    trace = metrics.start_trace(f"POST {scope['path']}")
+    status = 500
+
+    async def send_and_capture(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+        await send(message)
+
+    try:
+        await chat_endpoint(scope, receive, send_and_capture, stream)
+    finally:
+        metrics.observe_request('POST', scope['path'], status, time.perf_counter() - started)
+        metrics.finish_trace(trace, method='POST', route=scope['path'], status=status)
+
+
+async def flask_endpoint(scope: Dict, receive, send):
+    """Serve a request through Flask on a thread of its own"""
+    # Without a per-request context asgiref runs every Flask request on one shared thread
+    async with ThreadSensitiveContext():
+        await wsgi_app(scope, receive, send)
+
+
+async def lifespan(receive, send):
+    """Migrate on startup and close pooled connections on shutdown"""
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            try:
+                await asyncio.to_thread(init_db)
+            except Exception as e:
+                await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                return
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            close_pools()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope: Dict, receive, send):
+    """ASGI entry point serving the chat endpoints natively and the rest through Flask"""
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+    if scope['type'] == 'http' and scope['method'] == 'POST':
+        if scope['path'] == '/chat-message':
+            await timed_chat_endpoint(scope, receive, send, stream=False)
+            return
+        if scope['path'] == '/chat-stream':
+            await timed_chat_endpoint(scope, receive, send, stream=True)
+            return
+    # uvicorn can start a keep-alive connection's next request inside the context
+    # of the previous one, where asgiref still marks its thread as busy, so each
+    # Flask request starts from an empty context
+    await contextvars.Context().run(asyncio.ensure_future, flask_endpoint(scope, receive, send))
@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+"""HTTP load test: drive the real app with concurrent users and a slow mock LLM.
+
+The app runs in this process on a throwaway database, served by a threaded
+werkzeug server (or uvicorn with ``--server asgi``). Its bots use
+LatencyMockLLM, which waits like a hosted model and makes real tool calls,
+so pooling, caching, locking and async behaviour show up as they would in
+production, without network access or an API key. Each virtual user logs in
+and then loops over a weighted mix of chat, submit, data and delete requests
+until the time is up.
+
+The report gives throughput and p50/p95/p99 latency per endpoint, plus LLM,
+SQLite write, pool wait and lock error figures taken from /metrics. Use
+``--json`` to save results and ``--compare`` to diff against an earlier run.
+
+    python benchmarks/load_test.py
+    python benchmarks/load_test.py --users 16 --duration 30 --json after.json --compare before.json
+"""
+import argparse
+import contextlib
+import csv
+import io
+import json
+import logging
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from categories import SECTIONS  # noqa: E402
+
+DEFAULT_MIX = 'chat=4,submit=3,data=2,delete=1'
+
+# Statement types that take SQLite's write lock
+WRITE_OPERATIONS = ('INSERT', 'UPDATE', 'DELETE', 'COMMIT')
+
+# Form submissions go to any section, like the form page allows
+SUBMIT_SECTIONS = sorted(SECTIONS)
+
+
+def parse_mix(mix):
+    """Parse 'chat=4,submit=3' into {operation: weight}"""
+    weights = {}
+    for part in mix.split(','):
+        name, _, weight = part.partition('=')
+        if name.strip() not in ('chat', 'submit', 'data', 'delete'):
+            raise ValueError(f"Unknown operation in --mix: {name}")
+        weights[name.strip()] = float(weight or 1)
+    return weights
+
+
+def load_messages(path):
+    """Load chat messages from the first column of a CSV file"""
+    with open(path, newline='') as f:
+        return [row[0].strip() for row in csv.reader(f) if row and row[0].strip()]
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered) + 0.5)) - 1))]
+
+
+def free_port():
+    """Find a free local TCP port"""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(kind, bots, llm):
+    """Serve the app on a background thread, returning (base url, stop function)"""
+    import app as app_module
+    from bot.core import TherapyDocumentationBot
+    from bot.pool import BotPool
+
+    app_module.init_db()
+    app_module._bot_pool = BotPool(size=bots, factory=lambda: TherapyDocumentationBot(test_mode=True, llm=llm))
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+    if kind == 'wsgi':
+        from werkzeug.serving import make_server
+        server = make_server('127.0.0.1', 0, app_module.app, threaded=True)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        return f"http://127.0.0.1:{server.server_port}", server.shutdown
+
+    import uvicorn
+    import asgi
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(asgi.app, host='127.0.0.1', port=port, log_level='warning'))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError("uvicorn failed to start")
+        time.sleep(0.05)
+
+    def stop():
+        server.should_exit = True
+        thread.join(timeout=10)
+    return f"http://127.0.0.1:{port}", stop
+
+
+def scrape_metrics(base_url):
+    """Read /metrics into {'name{labels}': value}"""
+    import requests
+    samples = {}
+    for line in requests.get(f"{base_url}/metrics", timeout=30).text.splitlines():
+        if line and not line.startswith('#'):
+            key, _, value = line.rpartition(' ')
+            samples[key] = float(value)
+    return samples
+
+
+def metric_delta(before, after, name, **labels):
+    """Sum how much every sample of a metric matching some labels grew during the run"""
+    total = 0.0
+    for key, value in after.items():
+        sample_name, _, label_text = key.partition('{')
+        if sample_name != name:
+            continue
+        sample_labels = dict(re.findall(r'(\w+)="((?:[^"\\]|\\.)*)"', label_text))
+        if all(sample_labels.get(label) == str(expected) for label, expected in labels.items()):
+            total += value - before.get(key, 0.0)
+    return total
+
+
+def bucket_quantile(before, after, name, fraction, **labels):
+    """Upper bound of the histogram bucket holding a quantile of the run's observations"""
+    bounds = sorted({
+        float(match) if match != '+Inf' else float('inf')
+        for key in after if key.startswith(f"{name}_bucket{{")
+        for match in re.findall(r'le="([^"]+)"', key)
+    })
+    total = metric_delta(before, after, f"{name}_count", **labels)
+    if not total:
+        return 0.0
+    for bound in bounds:
+        le = '+Inf' if bound == float('inf') else repr(bound)
+        if metric_delta(before, after, f"{name}_bucket", le=le, **labels) >= fraction * total:
+            return bound
+    return float('inf')
+
+
+def virtual_user(index, base_url, deadline, weights, messages, seed, samples, lock):
+    """Log in, then send a weighted mix of requests until the deadline"""
+    import requests
+    rng = random.Random(seed + index)
+    session = requests.Session()
+    known_ids = []
+    operations, operation_weights = list(weights), list(weights.values())
+
+    def timed(operation, method, path, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = session.request(method, f"{base_url}{path}", timeout=120, **kwargs)
+            status = response.status_code
+        except requests.RequestException:
+            response, status = None, 'error'
+        with lock:
+            samples[operation].append((time.perf_counter() - started, status))
+        return response
+
+    timed('login', 'POST', '/login', json={'username': 'test', 'password': 'test123'})
+    while time.perf_counter() < deadline:
+        operation = rng.choices(operations, operation_weights)[0]
+        if operation == 'delete' and not known_ids:
+            operation = 'data'
+        if operation == 'chat':
+            timed('chat', 'POST', '/chat-message', json={'message': rng.choice(messages)})
+        elif operation == 'submit':
+            category_id, section_name = rng.choice(SUBMIT_SECTIONS)
+            timed('submit', 'POST', '/submit', json={
+                'category_id': category_id,
+                'section_name': section_name,
+                'observations': f"user {index}: {rng.choice(messages)}",
+            })
+        elif operation == 'data':
+            if rng.random() < 0.5:
+                timed('data', 'GET', '/get-all-data')
+            else:
+                response = timed('data', 'GET', '/get-all-data?limit=20')
+                if response is not None and response.ok:
+                    known_ids.extend(entry['id'] for entry in response.json()['entries'])
+        else:
+            timed('delete', 'DELETE', f"/delete-entry/{known_ids.pop(rng.randrange(len(known_ids)))}")
+
+
+def run(args):
+    """Run the load test and return its results"""
+    # Configure the app before it is imported
+    tmp = tempfile.TemporaryDirectory()
+    os.environ['DATABASE'] = os.path.join(tmp.name, 'load.db')
+    os.environ['FAST_PATH'] = '1' if args.fast_path else '0'
+    os.environ['RESPONSE_CACHE_SIZE'] = str(args.cache_size)
+    os.environ['METRICS'] = '1'
+    from bot.llms import LatencyMockLLM
+
+    weights = parse_mix(args.mix)
+    messages = load_messages(args.messages)
+    llm = LatencyMockLLM(median_ms=args.llm_median_ms, p95_ms=args.llm_p95_ms,
+                         tool_call_rate=args.tool_call_rate, seed=args.seed)
+
+    # The app logs every turn; keep it out of the report unless asked for
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    with quiet:
+        base_url, stop = start_server(args.server, args.bots, llm)
+        try:
+            before = scrape_metrics(base_url)
+            samples, lock = defaultdict(list), threading.Lock()
+            started = time.perf_counter()
+            deadline = started + args.duration
+            users = [
+                threading.Thread(target=virtual_user,
+                                 args=(index, base_url, deadline, weights, messages, args.seed, samples, lock))
+                for index in range(args.users)
+            ]
+            for user in users:
+                user.start()
+            for user in users:
+                user.join()
+            elapsed = time.perf_counter() - started
+            after = scrape_metrics(base_url)
+        finally:
+            stop()
+            tmp.cleanup()
+
+    endpoints = {}
+    for operation, observations in sorted(samples.items()):
+        latencies = [seconds * 1000 for seconds, _ in observations]
+        statuses = defaultdict(int)
+        for _, status in observations:
+            statuses[str(status)] += 1
+        endpoints[operation] = {
+            'requests': len(observations),
+            'errors': sum(count for status, count in statuses.items() if not status.startswith(('2', '3'))),
+            'statuses': dict(statuses),
+            'mean_ms': sum(latencies) / len(latencies),
+            'p50_ms': percentile(latencies, 0.50),
+            'p95_ms': percentile(latencies, 0.95),
+            'p99_ms': percentile(latencies, 0.99),
+        }
+    total = sum(endpoint['requests'] for endpoint in endpoints.values())
+
+    def ms(seconds, count):
+        return seconds / count * 1000 if count else 0.0
+
+    llm_calls = metric_delta(before, after, 'llm_request_duration_seconds_count')
+    writes = sum(metric_delta(before, after, 'db_statement_duration_seconds_count', operation=op) for op in WRITE_OPERATIONS)
+    write_seconds = sum(metric_delta(before, after, 'db_statement_duration_seconds_sum', operation=op) for op in WRITE_OPERATIONS)
+    reads = metric_delta(before, after, 'db_statement_duration_seconds_count', operation='SELECT')
+    pool_waits = metric_delta(before, after, 'db_pool_wait_seconds_count')
+    pool_wait_seconds = metric_delta(before, after, 'db_pool_wait_seconds_sum')
+    turns = metric_delta(before, after, 'prompt_tokens_count')
+    return {
+        'commit': git_commit(),
+        'started_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'config': {
+            'server': args.server, 'users': args.users, 'bots': args.bots, 'duration_s': args.duration,
+            'mix': weights, 'llm_median_ms': args.llm_median_ms, 'llm_p95_ms': args.llm_p95_ms,
+            'tool_call_rate': args.tool_call_rate, 'fast_path': args.fast_path, 'cache_size': args.cache_size,
+            'db_pool_size': int(os.environ.get('DB_POOL_SIZE', '5')), 'seed': args.seed,
+        },
+        'elapsed_s': elapsed,
+        'requests': total,
+        'throughput_rps': total / elapsed if elapsed else 0.0,
+        'endpoints': endpoints,
+        'llm': {
+            'calls': llm_calls,
+            'mean_ms': ms(metric_delta(before, after, 'llm_request_duration_seconds_sum'), llm_calls),
+            'tool_calls': metric_delta(before, after, 'tool_call_duration_seconds_count'),
+            'prompt_tokens_per_turn': metric_delta(before, after, 'prompt_tokens_sum') / turns if turns else 0.0,
+        },
+        'db': {
+            'reads': reads,
+            'read_mean_ms': ms(metric_delta(before, after, 'db_statement_duration_seconds_sum', operation='SELECT'), reads),
+            'writes': writes,
+            # Write time is dominated by waiting for the write lock under contention
+            'write_mean_ms': ms(write_seconds, writes),
+            'write_p99_ms': 1000 * max(
+                bucket_quantile(before, after, 'db_statement_duration_seconds', 0.99, operation=op)
+                for op in WRITE_OPERATIONS
+            ),
+            'lock_errors': metric_delta(before, after, 'db_lock_errors_total'),
+            'pool_wait_mean_ms': ms(pool_wait_seconds, pool_waits),
+            'pool_wait_p99_ms': 1000 * bucket_quantile(before, after, 'db_pool_wait_seconds', 0.99),
+        },
+    }
+
+
+def git_commit():
+    """Get the commit being benchmarked, if this is a git checkout"""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(results):
+    """Print a human-readable report"""
+    config = results['config']
+    print(f"\n== {config['users']} users for {config['duration_s']:.0f}s on {config['server']}, "
+          f"{config['bots']} bots, LLM median {config['llm_median_ms']:.0f}ms / p95 {config['llm_p95_ms']:.0f}ms "
+          f"(commit {results['commit'] or 'unknown'}) ==")
+    print(f"{'endpoint':<10} {'requests':>9} {'errors':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, endpoint in results['endpoints'].items():
+        print(f"{name:<10} {endpoint['requests']:>9} {endpoint['errors']:>7} {endpoint['p50_ms']:>9.1f} "
+              f"{endpoint['p95_ms']:>9.1f} {endpoint['p99_ms']:>9.1f}")
+    print(f"total: {results['requests']} requests, {results['throughput_rps']:.1f} req/s")
+    llm, db = results['llm'], results['db']
+    print(f"LLM: {llm['calls']:.0f} calls, mean {llm['mean_ms']:.1f}ms, {llm['tool_calls']:.0f} tool calls, "
+          f"{llm['prompt_tokens_per_turn']:.0f} prompt tokens per turn")
+    print(f"SQLite: {db['reads']:.0f} reads (mean {db['read_mean_ms']:.2f}ms), {db['writes']:.0f} writes "
+          f"(mean {db['write_mean_ms']:.2f}ms, p99 <= {db['write_p99_ms']:.1f}ms), {db['lock_errors']:.0f} lock errors")
+    print(f"pool wait: mean {db['pool_wait_mean_ms']:.2f}ms, p99 <= {db['pool_wait_p99_ms']:.1f}ms")
+
+
+def print_comparison(old, new):
+    """Print how latency and throughput changed since an earlier run"""
+    def change(before, after):
+        return f"{before:9.1f} -> {after:9.1f} ({(after - before) / before * 100:+.0f}%)" if before else f"{after:9.1f}"
+
+    print(f"\n== compared with {old.get('commit') or 'earlier run'} ({old.get('started_at', '?')}) ==")
+    differences = [f"{key} {old['config'].get(key)} -> {value}" for key, value in new['config'].items()
+                   if old['config'].get(key) != value and key != 'seed']
+    if differences:
+        print(f"note: configs differ ({', '.join(differences)})")
+    print(f"throughput req/s: {change(old['throughput_rps'], new['throughput_rps'])}")
+    for name, endpoint in new['endpoints'].items():
+        previous = old['endpoints'].get(name)
+        if previous is None:
+            continue
+        for stat in ('p50_ms', 'p95_ms', 'p99_ms'):
+            print(f"{name:<10} {stat:<7} {change(previous[stat], endpoint[stat])}")
+    print(f"SQLite write mean ms: {change(old['db']['write_mean_ms'], new['db']['write_mean_ms'])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the app with concurrent users and a slow mock LLM')
+    parser.add_argument('--users', type=int, default=8, help='Concurrent virtual users (default: 8)')
+    parser.add_argument('--duration', type=float, default=15, help='Seconds to run (default: 15)')
+    parser.add_argument('--server', choices=('wsgi', 'asgi'), default='wsgi',
+                        help='Threaded werkzeug (wsgi) or uvicorn with the async chat endpoints (asgi)')
+    parser.add_argument('--bots', type=int, default=4, help='Bot pool size (default: 4)')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f'Operation weights (default: {DEFAULT_MIX})')
+    parser.add_argument('--messages', default=os.path.join(ROOT, 'sample_inputs.csv'),
+                        help='CSV whose first column holds chat messages (default: sample_inputs.csv)')
+    parser.add_argument('--llm-median-ms', type=float, default=600, help='Median LLM call latency (default: 600)')
+    parser.add_argument('--llm-p95-ms', type=float, default=2000, help='95th percentile LLM latency (default: 2000)')
+    parser.add_argument('--tool-call-rate', type=float, default=0.7,
+                        help='Share of chat messages the LLM documents with a tool call (default: 0.7)')
+    parser.add_argument('--no-fast-path', dest='fast_path', action='store_false',
+                        help='Send every chat message to the LLM')
+    parser.add_argument('--cache-size', type=int, default=1024, help='Response cache entries, 0 to disable (default: 1024)')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed for the workload and LLM latency')
+    parser.add_argument('--verbose', action='store_true', help="Show the app's own logging")
+    parser.add_argument('--json', metavar='FILE', help='Also write the results as JSON')
+    parser.add_argument('--compare', metavar='FILE', help='Compare with results saved by an earlier --json run')
+    args = parser.parse_args()
+
+    results = run(args)
+    print_report(results)
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(json.load(f), results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.json}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""Startup benchmark: wall time and per-module import time of the entry points.
+
+Each scenario runs in a fresh interpreter with ``-X importtime``. The report
+lists the slowest modules by cumulative import time and flags heavy
+libraries that were imported. Use ``--json`` to save results and compare
+them across changes.
+
+    python benchmarks/startup.py
+    python benchmarks/startup.py --runs 5 --top 15 --json startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = {
+    'cli --help': ['cli.py', '--help'],
+    'cli --summary': ['cli.py', '--summary'],
+    'import app': ['-c', 'import app'],
+}
+
+# Libraries that only conversational commands should pay for
+HEAVY_MODULES = ['llama_index.llms.openai', 'llama_index.core.agent', 'openai', 'tiktoken']
+
+
+def parse_importtime(stderr):
+    """Parse -X importtime output into {module: (self_us, cumulative_us)}"""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3:
+            continue
+        modules[fields[2].strip()] = (int(fields[0]), int(fields[1]))
+    return modules
+
+
+def run_scenario(args, env):
+    """Run one scenario in a fresh interpreter and time it"""
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime'] + args,
+        cwd=ROOT, env=env, capture_output=True, text=True
+    )
+    wall = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(f"{' '.join(args)} failed:\n{proc.stderr[-2000:]}")
+    return wall, parse_importtime(proc.stderr)
+
+
+def benchmark(runs, top):
+    """Run every scenario and summarize its fastest run"""
+    env = dict(os.environ)
+    with tempfile.TemporaryDirectory() as tmp:
+        # --summary reads the database, so give it a migrated empty one
+        env['DATABASE'] = os.path.join(tmp, 'startup.db')
+        subprocess.run([sys.executable, 'init_db.py'], cwd=ROOT, env=env, check=True, capture_output=True)
+
+        results = {}
+        for name, args in SCENARIOS.items():
+            samples = [run_scenario(args, env) for _ in range(runs)]
+            walls = [wall for wall, _ in samples]
+            # Report the module breakdown of the fastest run, the one least disturbed by noise
+            _, modules = min(samples, key=lambda sample: sample[0])
+            slowest = sorted(modules.items(), key=lambda item: item[1][1], reverse=True)[:top]
+            results[name] = {
+                'wall_s': {'min': min(walls), 'median': statistics.median(walls)},
+                'modules_imported': len(modules),
+                'import_us': sum(self_us for self_us, _ in modules.values()),
+                'heavy_modules': [module for module in HEAVY_MODULES if module in modules],
+                'slowest': [
+                    {'module': module, 'self_us': self_us, 'cumulative_us': cumulative_us}
+                    for module, (self_us, cumulative_us) in slowest
+                ],
+            }
+    return results
+
+
+def print_report(results):
+    """Print a human-readable report"""
+    for name, result in results.items():
+        print(f"\n== {name} ==")
+        print(f"wall: min {result['wall_s']['min']:.3f}s, median {result['wall_s']['median']:.3f}s")
+        print(f"imports: {result['modules_imported']} modules, {result['import_us'] / 1e6:.3f}s")
+        print(f"heavy modules: {', '.join(result['heavy_modules']) or 'none'}")
+        print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+        for entry in result['slowest']:
+            print(f"{entry['cumulative_us'] / 1000:14.1f} {entry['self_us'] / 1000:9.1f}  {entry['module']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure startup and import time of the entry points')
+    parser.add_argument('--runs', type=int, default=3, help='Runs per scenario (default: 3)')
+    parser.add_argument('--top', type=int, default=10, help='Slowest modules to list per scenario (default: 10)')
+    parser.add_argument('--json', metavar='FILE', help='Also write the results as JSON')
+    args = parser.parse_args()
+
+    results = benchmark(args.runs, args.top)
+    print_report(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.json}")
+
+
+if __name__ == '__main__':
+    main()
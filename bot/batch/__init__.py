@@ -0,0 +1,192 @@
+"""Micro-batched ingestion of independent journal lines.
+
+Instead of one agent conversation per line, K lines are packed into one
+structured request. The model answers with the documentation calls for every
+line as JSON, and all of them are written in a single transaction. The
+system prompt and category guide are sent once per batch instead of once per
+line. Lines the model's answer doesn't cover cleanly go through the regular
+agent one by one.
+"""
+import json
+import os
+import re
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+from llama_index.core.base.llms.types import ChatMessage, MessageRole
+from categories import render_category_guide
+from tools import TherapyDocTools
+from ..context import count_message_tokens
+from ..rules import FAST_PATH_ENABLED, classifier
+
+DEFAULT_MICRO_BATCH_SIZE = int(os.environ.get('MICRO_BATCH_SIZE', '10'))
+
+# Marks a batch request, so a mock LLM can tell it from a conversation
+BATCH_HEADER = "Journal lines:"
+
+BATCH_PROMPT = """You document therapy journal lines. Every numbered line is independent.
+For each line, decide which documentation calls to make. Only document what the line
+explicitly says; a line that needs no documentation gets an empty list of calls.
+
+Calls:
+- set_category_section_observations: {"category_id", "section_name", "observations"}
+- set_category_next_steps: {"category_id", "next_steps"}
+- add_category_notes: {"category_id", "notes"}
+
+Categories and sections:
+""" + render_category_guide() + """
+
+Reply with only a JSON object, with every line number exactly once:
+{"results": [{"line": 1, "calls": [{"tool": "set_category_section_observations",
+  "arguments": {"category_id": "sleep", "section_name": "General notes", "observations": "..."}}]}]}"""
+
+# A documentation call, as (tool name, arguments)
+Call = Tuple[str, Dict[str, str]]
+
+
+def build_batch_messages(lines: Sequence[str]) -> List[ChatMessage]:
+    """Build the request that documents a batch of lines"""
+    numbered = "\n".join(f"{number}. {' '.join(line.split())}" for number, line in enumerate(lines, 1))
+    return [
+        ChatMessage(role=MessageRole.SYSTEM, content=BATCH_PROMPT),
+        ChatMessage(role=MessageRole.USER, content=f"{BATCH_HEADER}\n{numbered}"),
+    ]
+
+
+def _valid_call(call: Any) -> Optional[Call]:
+    """Check one call from the model against the tools and the category registry"""
+    if not isinstance(call, dict) or not isinstance(call.get('arguments'), dict):
+        return None
+    tool_name, arguments = call.get('tool'), call['arguments']
+    if not all(isinstance(value, str) and value.strip() for value in arguments.values()):
+        return None
+    try:
+        TherapyDocTools._validate_write(tool_name, arguments)
+    except ValueError:
+        return None
+    return tool_name, arguments
+
+
+def parse_batch_response(text: str, count: int) -> Dict[int, List[Call]]:
+    """Get the calls for each line (numbered from 1) that the model answered cleanly.
+
+    Lines that are missing, repeated or have any invalid call are left out,
+    so the caller can fall back to processing them on their own.
+    """
+    # Models sometimes wrap JSON in a code fence despite being asked not to
+    text = re.sub(r'^\s*```(?:json)?\s*|\s*```\s*$', '', text or '')
+    try:
+        results = json.loads(text)['results']
+    except (ValueError, KeyError, TypeError):
+        return {}
+    if not isinstance(results, list):
+        return {}
+
+    parsed: Dict[int, List[Call]] = {}
+    seen = set()
+    for result in results:
+        if not isinstance(result, dict):
+            continue
+        line, calls = result.get('line'), result.get('calls')
+        if not isinstance(line, int) or not 1 <= line <= count or not isinstance(calls, list):
+            continue
+        if line in seen:
+            # Conflicting answers for one line; trust neither
+            parsed.pop(line, None)
+            continue
+        seen.add(line)
+        valid = [_valid_call(call) for call in calls]
+        if all(valid):
+            parsed[line] = valid
+    return parsed
+
+
+class MicroBatcher:
+    """Documents independent lines K at a time with one LLM call per batch"""
+
+    def __init__(self, llm, tools: TherapyDocTools, batch_size: int = DEFAULT_MICRO_BATCH_SIZE,
+                 fallback: Optional[Callable[[str], str]] = None):
+        """Initialize the batcher; fallback processes a single line and returns the reply"""
+        if batch_size < 1:
+            raise ValueError("batch_size must be positive")
+        self.llm = llm
+        self.tools = tools
+        self.batch_size = batch_size
+        self.fallback = fallback
+        self.stats = {
+            'lines': 0, 'batches': 0, 'llm_calls': 0, 'prompt_tokens': 0,
+            'fast_path': 0, 'fallback': 0, 'failed': 0, 'writes': 0
+        }
+
+    def run(self, lines: Sequence[str]) -> Iterator[Dict[str, Any]]:
+        """Document lines, yielding one result per line in input order"""
+        for start in range(0, len(lines), self.batch_size):
+            yield from self._run_batch(list(lines[start:start + self.batch_size]))
+
+    def _run_batch(self, lines: List[str]) -> List[Dict[str, Any]]:
+        """Document one batch of lines"""
+        started = time.monotonic()
+        self.stats['lines'] += len(lines)
+        self.stats['batches'] += 1
+        calls: Dict[int, List[Call]] = {}
+        sources: Dict[int, str] = {}
+
+        # Structured check-ins need no model at all
+        pending = []
+        for index, line in enumerate(lines):
+            entries = classifier.classify(line) if FAST_PATH_ENABLED else None
+            if entries is None:
+                pending.append(index)
+                continue
+            calls[index] = [
+                ('set_category_section_observations',
+                 {'category_id': category_id, 'section_name': section_name, 'observations': observations})
+                for category_id, section_name, observations in entries
+            ]
+            sources[index] = 'fast_path'
+            self.stats['fast_path'] += 1
+
+        if pending:
+            messages = build_batch_messages([lines[index] for index in pending])
+            self.stats['llm_calls'] += 1
+            self.stats['prompt_tokens'] += count_message_tokens(messages)
+            try:
+                response = self.llm.chat(messages)
+                parsed = parse_batch_response(str(response.message.content or ''), len(pending))
+            except Exception as e:
+                print(f"Micro-batch request failed: {e}")
+                parsed = {}
+            for number, line_calls in parsed.items():
+                calls[pending[number - 1]] = line_calls
+                sources[pending[number - 1]] = 'batch'
+
+        # Every cleanly answered line is written in one transaction
+        written = [call for index in sorted(calls) for call in calls[index]]
+        try:
+            self.tools.record_many(written)
+            self.stats['writes'] += len(written)
+        except Exception as e:
+            print(f"Micro-batch write failed, processing lines one by one: {e}")
+            calls, sources = {}, {}
+
+        latency = (time.monotonic() - started) / len(lines)
+        results = []
+        for index, line in enumerate(lines):
+            result = {'message': line, 'calls': calls.get(index, []), 'source': sources.get(index),
+                      'response': None, 'error': None, 'latency': latency}
+            if index not in calls:
+                result.update(self._fallback(line))
+            results.append(result)
+        return results
+
+    def _fallback(self, line: str) -> Dict[str, Any]:
+        """Process a line the batch couldn't document on its own"""
+        self.stats['fallback'] += 1
+        if self.fallback is None:
+            self.stats['failed'] += 1
+            return {'source': 'fallback', 'error': 'Not documented by the batch and no fallback configured'}
+        started = time.monotonic()
+        try:
+            return {'source': 'fallback', 'response': self.fallback(line), 'latency': time.monotonic() - started}
+        except Exception as e:
+            self.stats['failed'] += 1
+            return {'source': 'fallback', 'error': str(e), 'latency': time.monotonic() - started}
@@ -0,0 +1,148 @@
+import os
+from functools import lru_cache
+from typing import List, Optional, Sequence, Tuple
+from llama_index.core.base.llms.types import ChatMessage, MessageRole
+
+# Total prompt tokens per LLM call: system prompt, tool schemas, state block, history and message
+PROMPT_TOKEN_BUDGET = int(os.environ.get('PROMPT_TOKEN_BUDGET', '4000'))
+# Tokens the conversation state block (summary of older turns) may use
+STATE_TOKEN_BUDGET = int(os.environ.get('STATE_TOKEN_BUDGET', '400'))
+
+# Chat formatting overhead OpenAI adds per message (role and separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+# How much of each folded turn is kept in the state block
+FOLD_SNIPPET_CHARS = 160
+
+
+@lru_cache(maxsize=None)
+def _encoding(model: str):
+    """Load the tiktoken encoding for a model, or None when it isn't available"""
+    try:
+        import tiktoken
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding('cl100k_base')
+    except Exception as e:
+        # tiktoken downloads its encodings on first use, which fails offline
+        print(f"tiktoken unavailable ({type(e).__name__}); estimating token counts")
+        return None
+
+
+def count_tokens(text: str, model: str = 'gpt-4') -> int:
+    """Count the tokens in a piece of text"""
+    if not text:
+        return 0
+    encoding = _encoding(model)
+    if encoding is None:
+        # Roughly four characters per token for English text
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text))
+
+
+def tokenize(text: str, model: str = 'gpt-4') -> Sequence:
+    """Tokenizer function for llama-index memory buffers, which only use its length"""
+    encoding = _encoding(model)
+    if encoding is None:
+        return range(count_tokens(text, model))
+    return encoding.encode(text)
+
+
+def count_message_tokens(messages: Sequence[ChatMessage], model: str = 'gpt-4') -> int:
+    """Count the tokens a list of chat messages costs in a prompt"""
+    return sum(count_tokens(str(msg.content or ''), model) + MESSAGE_OVERHEAD_TOKENS for msg in messages)
+
+
+def truncate_to_tokens(text: str, max_tokens: int, model: str = 'gpt-4', keep: str = 'tail') -> str:
+    """Cut text down to at most max_tokens, keeping its head or its tail on line boundaries"""
+    if count_tokens(text, model) <= max_tokens:
+        return text
+    lines = text.split('\n')
+    if keep == 'tail':
+        lines.reverse()
+    kept = []
+    used = 0
+    for line in lines:
+        cost = count_tokens(line, model) + 1
+        if used + cost > max_tokens:
+            break
+        kept.append(line)
+        used += cost
+    if keep == 'tail':
+        kept.reverse()
+    return '\n'.join(kept)
+
+
+class ContextBuilder:
+    """Assembles each turn's prompt within a token budget.
+
+    Conversation history is sent once, as real chat messages from the agent's
+    memory. Turns that no longer fit the budget are folded into a compact
+    summary. The summary and the current documentation state go in a
+    "Conversation state" system message, which is capped at ``state_budget``.
+    """
+
+    def __init__(self, fixed_tokens: int, budget: int = PROMPT_TOKEN_BUDGET,
+                 state_budget: int = STATE_TOKEN_BUDGET, model: str = 'gpt-4'):
+        """Initialize the builder; fixed_tokens is the cost of the system prompt and tool schemas"""
+        self.fixed_tokens = fixed_tokens
+        self.budget = budget
+        self.state_budget = state_budget
+        self.model = model
+
+    def state_block(self, summary: str, current_category: Optional[str] = None) -> str:
+        """Render the conversation state block, or an empty string when there is no state"""
+        if not summary and not current_category:
+            return ""
+        header = "Conversation state:"
+        footer = f"Currently discussing: {current_category}" if current_category else ""
+        lines = [header]
+        if summary:
+            # The summary gets whatever the header and current category leave of the state budget
+            room = self.state_budget - count_tokens(header + footer, self.model) - 8
+            summary = truncate_to_tokens(summary, max(0, room), self.model)
+            if summary:
+                lines.append("Earlier in this conversation:")
+                lines.append(summary)
+        if footer:
+            lines.append(footer)
+        return "\n".join(lines)
+
+    def history_budget(self, state_block: str, message: str) -> int:
+        """Tokens left for conversation history after everything else in the prompt"""
+        used = (
+            self.fixed_tokens
+            + (count_tokens(state_block, self.model) + MESSAGE_OVERHEAD_TOKENS if state_block else 0)
+            + count_tokens(message, self.model) + MESSAGE_OVERHEAD_TOKENS
+        )
+        return max(0, self.budget - used)
+
+    def fit_history(self, messages: Sequence[ChatMessage], budget: int) -> Tuple[List[ChatMessage], List[ChatMessage]]:
+        """Split history into the newest messages that fit the budget and the older ones that don't"""
+        kept = []
+        used = 0
+        for index in range(len(messages) - 1, -1, -1):
+            cost = count_message_tokens([messages[index]], self.model)
+            if used + cost > budget:
+                break
+            kept.append(messages[index])
+            used += cost
+        kept.reverse()
+        dropped = list(messages[:len(messages) - len(kept)])
+        # Never start the window on a tool result or an assistant tool call whose request was dropped
+        while kept and kept[0].role != MessageRole.USER:
+            dropped.append(kept.pop(0))
+        return kept, dropped
+
+    def fold(self, summary: str, dropped: Sequence[ChatMessage]) -> str:
+        """Fold dropped user and assistant turns into the summary, keeping it within the state budget"""
+        lines = [summary] if summary else []
+        for msg in dropped:
+            if msg.role not in (MessageRole.USER, MessageRole.ASSISTANT) or not msg.content:
+                continue
+            role = 'User' if msg.role == MessageRole.USER else 'Assistant'
+            content = ' '.join(str(msg.content).split())
+            if len(content) > FOLD_SNIPPET_CHARS:
+                content = content[:FOLD_SNIPPET_CHARS - 3] + '...'
+            lines.append(f"{role}: {content}")
+        return truncate_to_tokens('\n'.join(lines), self.state_budget, self.model)
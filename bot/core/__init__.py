@@ -1,45 +1,67 @@
-from typing import Dict, List, Union, Callable, Any
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple, Callable, Any
+import asyncio
+import hashlib
+import json
 import os
+import re
+import time
 from llama_index.llms.openai import OpenAI
 from llama_index.core.agent.function_calling.base import FunctionCallingAgent
+from llama_index.core.agent.function_calling.step import DEFAULT_MAX_FUNCTION_CALLS, build_missing_tool_output
 from llama_index.core.tools import FunctionTool, ToolMetadata
+from llama_index.core.tools.calling import acall_tool_with_selection, call_tool_with_selection
 from llama_index.core.base.llms.types import ChatMessage, MessageRole
-from tools import TherapyDocTools
+from llama_index.core.memory import ChatMemoryBuffer
+from tools import DEFAULT_USER_ID, TherapyDocTools
+from categories import render_category_guide
+from response_cache import CONTEXT_MESSAGES, cache_key, get_response_cache, is_cacheable
+import metrics
+from ..context import ContextBuilder, count_message_tokens, count_tokens, tokenize
 from ..llms import MockLLM
+from ..rules import FAST_PATH_ENABLED, classifier
+from ..tracing import instrument_llm
 
 class TherapyDocumentationBot:
-    def __init__(self, test_mode=False):
+    def __init__(self, test_mode=False, llm=None, user_id=None):
         """Initialize the therapy documentation chatbot with llama-index"""
-        self.tools = TherapyDocTools()
+        self.tools = TherapyDocTools(user_id=user_id)
         self.test_mode = test_mode
         self.chat_history: List[ChatMessage] = []
+        self.conversation_summary = ""
+        # Tool calls made during the current turn, as (name, arguments, output)
+        self._turn_calls: List[Tuple[str, Dict, str]] = []
+        self.response_cache = get_response_cache(self.tools.db_path)
         
-        if self.test_mode:
-            # Use mock LLM in test mode
-            llm = MockLLM()
-        else:
-            # Use real OpenAI in production mode with new API
-            llm = OpenAI(
-                model="gpt-4",
-                temperature=0,
-                api_key=os.environ.get("OPENAI_API_KEY"),
-                additional_kwargs={} # Ensure no extra kwargs are passed
-            )
+        # The LLM client holds no per-conversation state, so pooled bots share one
+        if llm is None:
+            llm = self.create_llm(test_mode=test_mode)
+        instrument_llm(llm)
         
         # Convert tools to llama-index format
         self.llama_tools = []
+        self._tool_funcs: Dict[str, Callable] = {}
         for tool_info in self.tools.get_tools():
-            # Create a wrapper function that accepts kwargs
-            def create_tool_func(tool_func):
+            # Create a wrapper function that accepts kwargs and records the call for the response cache
+            def create_tool_func(tool_name, tool_func):
                 def wrapper(**kwargs) -> str:
+                    started = time.perf_counter()
                     try:
-                        return tool_func(**kwargs)
+                        output = tool_func(**kwargs)
                     except TypeError as e:
-                        return f"Error: Invalid arguments - {str(e)}"
+                        output = f"Error: Invalid arguments - {str(e)}"
+                    except Exception as e:
+                        self._turn_calls.append((tool_name, kwargs, f"Error: {str(e)}"))
+                        metrics.observe_tool(tool_name, time.perf_counter() - started, outcome='error')
+                        raise
+                    self._turn_calls.append((tool_name, kwargs, output))
+                    metrics.observe_tool(tool_name, time.perf_counter() - started,
+                                         outcome='error' if str(output).startswith('Error') else 'ok')
+                    return output
                 return wrapper
             
             # Bind the function to a new wrapper
-            bound_wrapper = create_tool_func(tool_info['func'])
+            bound_wrapper = create_tool_func(tool_info['name'], tool_info['func'])
+            self._tool_funcs[tool_info['name']] = bound_wrapper
             
             # Create tool metadata
             metadata = ToolMetadata(
@@ -68,47 +90,7 @@ class TherapyDocumentationBot:
 
         You can document information in these categories and their sections:
 
-        - journaling: Journaling
-          Sections: 
-          - 'Counting entries': Track number of journal entries
-          - 'Cognitive therapy': Document therapy-related journaling
-        
-        - sleep: Sleep
-          Sections:
-          - 'Length of sleep': Track sleep duration
-          - 'Schedule': Document sleep/wake times
-          - 'Dreams': Record any dream experiences
-        
-        - physical: Physical Activity
-          Sections:
-          - 'Fitbit heart rate zones': Ask user to share their Fitbit heart rate data
-          - 'Strength training': Document strength training activities
-        
-        - social: Social Engagement
-          Sections:
-          - 'In-person': Track face-to-face interactions
-          - 'Text': Document text-based communications
-          - 'VC': Record video call interactions
-        
-        - productivity: Productivity & Work
-          Sections:
-          - 'Cold Turkey': Ask user to share their Cold Turkey Blocker stats
-          - 'iOS Screen Time': Ask user to share their iOS Screen Time data
-        
-        - spiritual: Spiritual Practice
-          Sections:
-          - 'Solo': Document individual spiritual practices
-          - 'Group': Track group spiritual activities
-        
-        - self_care: Basic Self-Care
-          Sections:
-          - 'Meals hygiene meds': Track daily self-care routines
-          - 'budget checklist medical appts': Document appointments and financial care
-
-        IMPORTANT: Some sections require external data:
-        1. 'Fitbit heart rate zones': Always ask user to share their Fitbit data
-        2. 'Cold Turkey': Always ask user to share their Cold Turkey Blocker statistics
-        3. 'iOS Screen Time': Always ask user to share their iOS Screen Time data
+""" + render_category_guide(indent=" " * 8) + """
 
         For each category, you can use these tools:
         1. set_category_section_observations: Record observations for a specific section
@@ -151,21 +133,6 @@ class TherapyDocumentationBot:
             "observations": "Documented therapy session in journal"
         }
 
-        IMPORTANT: Always use proper JSON formatting with commas between properties:
-        CORRECT:
-        {
-            "category_id": "sleep",
-            "section_name": "Length of sleep",
-            "observations": "..."
-        }
-        
-        INCORRECT:
-        {
-            "category_id": "sleep"
-            "section_name": "Length of sleep"
-            "observations": "..."
-        }
-
         Behavior in different modes:
 
         In interactive mode:
@@ -180,12 +147,8 @@ class TherapyDocumentationBot:
         3. DO NOT ask follow-up questions
         4. Keep responses brief and focused on confirming what was documented
 
-        The context will include:
-        - Previous conversation history (up to 5 messages)
-        - Currently discussed category
-        - Previously documented observations
-        - Previously documented next steps
-        - Any additional notes
+        Earlier turns that no longer fit in the conversation are summarized in a
+        "Conversation state" message, along with the category currently being discussed.
 
         Remember:
         - Only document what is explicitly shared
@@ -193,61 +156,156 @@ class TherapyDocumentationBot:
         - Respond naturally to simple acknowledgments without using tools
         """
 
-        # Initialize the agent
-        self.agent = FunctionCallingAgent.from_llm(
+        self.llm = llm
+        # The indentation above is only for readability here; don't pay tokens for it every turn
+        self.system_prompt = re.sub(r'^ {8}', '', system_prompt, flags=re.MULTILINE).strip()
+
+        # The system prompt and tool schemas are sent on every call, so count them once
+        fixed_tokens = count_message_tokens([ChatMessage(role=MessageRole.SYSTEM, content=self.system_prompt)])
+        fixed_tokens += sum(count_tokens(json.dumps(tool.metadata.to_openai_tool())) for tool in self.llama_tools)
+        self.context_builder = ContextBuilder(fixed_tokens=fixed_tokens)
+
+        # Cached replies are only valid for the prompt, tools and model that produced them
+        self._cache_fingerprint = hashlib.sha256(json.dumps([
+            self.system_prompt,
+            [tool.metadata.to_openai_tool() for tool in self.llama_tools],
+            type(llm).__name__,
+            llm.metadata.model_name,
+        ]).encode('utf-8')).hexdigest()
+
+        # Initialize the agent. from_tools (rather than the from_llm inherited
+        # from AgentRunner) guarantees a FunctionCallingAgent for every LLM.
+        # The memory is the only copy of the history sent to the LLM; its limit
+        # is a backstop, since _prepare_turn folds old turns away first.
+        self.agent = FunctionCallingAgent.from_tools(
             tools=self.llama_tools,
             llm=llm,
-            system_prompt=system_prompt,
+            system_prompt=self.system_prompt,
+            memory=ChatMemoryBuffer.from_defaults(
+                token_limit=self.context_builder.budget,
+                tokenizer_fn=tokenize
+            ),
             verbose=True
         )
 
+    @staticmethod
+    def create_llm(test_mode=False):
+        """Create the LLM client used by the agent"""
+        if test_mode:
+            # Use mock LLM in test mode
+            return MockLLM()
+        # Use real OpenAI in production mode with new API
+        return OpenAI(
+            model="gpt-4",
+            temperature=0,
+            api_key=os.environ.get("OPENAI_API_KEY"),
+            additional_kwargs={} # Ensure no extra kwargs are passed
+        )
+
+    def reset(self, chat_history: List[ChatMessage] = None, summary: str = "", user_id: str = None):
+        """Reset per-conversation state so the bot can be reused for another user"""
+        self.agent.reset()
+        self.chat_history = list(chat_history) if chat_history else []
+        self.conversation_summary = summary or ""
+        # Restored turns become the agent's memory, so the LLM sees them as real messages
+        self.agent.memory.set(list(self.chat_history))
+        # The agent's tools are bound to self.tools, so rebinding it moves every tool call to this user
+        self.tools.user_id = user_id or DEFAULT_USER_ID
+        self.tools.current_category = None
+
     def start_documentation(self) -> Dict:
         """Start a new documentation session"""
         return {
             "response": "Hey! What's up? How have you been doing?"
         }
 
-    def process_message(self, message: str) -> Dict[str, str]:
-        """Process incoming user message"""
+    def _prepare_turn(self, message: str) -> List[ChatMessage]:
+        """Fit the agent's memory and state block into the prompt budget for a new message.
+
+        Returns the history to send. Older turns that don't fit are folded into
+        the conversation summary, and the prefix messages are updated with the
+        new state block. Logs the prompt token count.
+        """
+        builder = self.context_builder
+        memory = self.agent.memory
+        kept = memory.get_all()
+        state_block = builder.state_block(self.conversation_summary, self.tools.current_category)
+        while True:
+            kept, dropped = builder.fit_history(kept, builder.history_budget(state_block, message))
+            if not dropped:
+                break
+            # Folding grows the state block, so fit the remaining history again
+            self.conversation_summary = builder.fold(self.conversation_summary, dropped)
+            state_block = builder.state_block(self.conversation_summary, self.tools.current_category)
+            memory.set(kept)
+        
+        prefix_messages = [ChatMessage(role=MessageRole.SYSTEM, content=self.system_prompt)]
+        if state_block:
+            prefix_messages.append(ChatMessage(role=MessageRole.SYSTEM, content=state_block))
+        self.agent.agent_worker.prefix_messages = prefix_messages
+        
+        state_tokens = count_message_tokens(prefix_messages[1:])
+        history_tokens = count_message_tokens(kept)
+        message_tokens = count_message_tokens([ChatMessage(role=MessageRole.USER, content=message)])
+        total = builder.fixed_tokens + state_tokens + history_tokens + message_tokens
+        metrics.observe_prompt(total)
+        print(
+            f"Prompt tokens: {total} of {builder.budget} "
+            f"(fixed {builder.fixed_tokens}, state {state_tokens}, "
+            f"history {history_tokens} in {len(kept)} messages, message {message_tokens})"
+        )
+        return kept
+
+    def _record_turn(self, message: str, response_text: str):
+        """Update chat history with a completed turn"""
+        self.chat_history.append(ChatMessage(role=MessageRole.USER, content=message))
+        self.chat_history.append(ChatMessage(role=MessageRole.ASSISTANT, content=response_text))
+
+    def process_message(self, message: str, raise_errors: bool = False) -> Dict[str, str]:
+        """Process incoming user message; with raise_errors, LLM failures propagate to the caller.
+
+        The turn's documentation writes are buffered and committed together
+        when it ends. A turn that raises writes nothing, so retrying it
+        doesn't document anything twice.
+        """
+        with self.tools.batch():
+            result = self._process_message(message, raise_errors)
+            try:
+                self.tools.flush()
+            except Exception as e:
+                if raise_errors:
+                    raise
+                print(f"Error flushing process_message: {str(e)}")
+                return {"response": f"Error: {str(e)}"}
+        return result
+
+    def _process_message(self, message: str, raise_errors: bool) -> Dict[str, str]:
+        """Process one turn inside the tools' write batch"""
         if not message:
             return {
                 "response": "I'm sorry, I didn't understand that. Could you tell me more?"
             }
         
         try:
-            # Build context for the agent
-            context = ""
-            categories = self.tools.get_categories()
+            # Structured check-ins are documented directly, without calling the model
+            fast = self._fast_path_reply(message)
+            if fast is not None:
+                return {"response": fast}
             
-            # Add chat history to context
-            if self.chat_history:
-                context += "Previous conversation:\n"
-                for msg in self.chat_history[-5:]:  # Keep last 5 messages for context
-                    role = "User" if msg.role == MessageRole.USER else "Assistant"
-                    context += f"{role}: {msg.content}\n"
+            # Repeated messages replay their cached tool calls without calling the model
+            key, cached = self._cached_reply(message)
+            if cached is not None:
+                return {"response": cached}
             
-            # Add current documentation state to context
-            if self.tools.current_category:
-                context += f"\nCurrently discussing: {self.tools.current_category}\n"
-                if self.tools.current_category in self.tools.current_data:
-                    data = self.tools.current_data[self.tools.current_category]
-                    if data["observations"]:
-                        context += f"What you've shared: {data['observations']}\n"
-                    if data["next_steps"]:
-                        context += f"Next steps we discussed: {data['next_steps']}\n"
-                if self.tools.current_category in self.tools.notes:
-                    context += f"Additional notes: {self.tools.notes[self.tools.current_category]}\n"
+            # Fit history and state into the prompt budget
+            self._prepare_turn(message)
             
             print("\nDebug - process_message:")
             print(f"Input message: {message}")
-            print(f"Context: {context}")
             
             try:
-                # Combine context with user message
-                full_message = f"Context:\n{context}\n\nUser message: {message}"
-                
                 # Let the agent handle the conversation
-                response = self.agent.chat(full_message)
+                response = self.agent.chat(message)
                 
                 print(f"Agent response: {response}")
                 
@@ -255,14 +313,16 @@ class TherapyDocumentationBot:
                 response_text = str(response)
                 
                 # Update chat history
-                self.chat_history.append(ChatMessage(role=MessageRole.USER, content=message))
-                self.chat_history.append(ChatMessage(role=MessageRole.ASSISTANT, content=response_text))
+                self._record_turn(message, response_text)
+                self._cache_turn(key, response_text)
                 
                 result = {"response": response_text}
                 print(f"Final processed result: {result}")
                 return result
                 
             except Exception as e:
+                if raise_errors:
+                    raise
                 print(f"Error in process_message: {str(e)}")
                 print(f"Error type: {type(e)}")
                 import traceback
@@ -272,10 +332,339 @@ class TherapyDocumentationBot:
                 }
             
         except Exception as e:
+            if raise_errors:
+                raise
             return {
                 "response": f"I encountered an error: {str(e)}. Could you please try again?"
             }
 
+    async def aprocess_message(self, message: str) -> Dict[str, str]:
+        """Process incoming user message without blocking the event loop"""
+        with self.tools.batch():
+            result = await self._aprocess_message(message)
+            try:
+                await asyncio.to_thread(self.tools.flush)
+            except Exception as e:
+                print(f"Error flushing aprocess_message: {str(e)}")
+                return {"response": f"Error: {str(e)}"}
+        return result
+
+    async def _aprocess_message(self, message: str) -> Dict[str, str]:
+        """Process one turn inside the tools' write batch"""
+        if not message:
+            return {
+                "response": "I'm sorry, I didn't understand that. Could you tell me more?"
+            }
+        
+        try:
+            fast = await asyncio.to_thread(self._fast_path_reply, message)
+            if fast is not None:
+                return {"response": fast}
+            key, cached = await asyncio.to_thread(self._cached_reply, message)
+            if cached is not None:
+                return {"response": cached}
+            self._prepare_turn(message)
+            response = await self.agent.achat(message)
+            response_text = str(response)
+            self._record_turn(message, response_text)
+            await asyncio.to_thread(self._cache_turn, key, response_text)
+            return {"response": response_text}
+        except Exception as e:
+            print(f"Error in aprocess_message: {str(e)}")
+            return {
+                "response": f"Error: {str(e)}"
+            }
+
+    def stream_message(self, message: str) -> Iterator[Dict[str, Any]]:
+        """Process incoming user message, yielding events as the response is produced.
+
+        Yields ``token`` events for each chunk of response text, ``tool`` events
+        as each documentation tool call completes, and finally a ``done`` event
+        with the full response (or an ``error`` event). FunctionCallingAgent has
+        no streaming step, so this drives the LLM's streaming tool-calling API
+        directly and writes the finished turn back into the agent's memory.
+        The turn's documentation is committed just before the final event, or
+        when the client disconnects, since the tool events it was already sent
+        describe those writes.
+        """
+        with self.tools.batch():
+            try:
+                for event in self._stream_message(message):
+                    if event["type"] in ("done", "error"):
+                        event = self._flush_turn() or event
+                    yield event
+            except GeneratorExit:
+                self._flush_turn()
+                raise
+
+    def _stream_message(self, message: str) -> Iterator[Dict[str, Any]]:
+        """Stream one turn inside the tools' write batch"""
+        if not message:
+            yield {
+                "type": "done",
+                "response": "I'm sorry, I didn't understand that. Could you tell me more?"
+            }
+            return
+        
+        try:
+            fast = self._fast_path_reply(message)
+            if fast is not None:
+                yield from self._replayed_events(fast)
+                return
+            key, cached = self._cached_reply(message)
+            if cached is not None:
+                yield from self._replayed_events(cached)
+                return
+            
+            history = self._prepare_turn(message)
+            new_messages = [ChatMessage(role=MessageRole.USER, content=message)]
+            n_function_calls = 0
+            
+            while True:
+                final = None
+                for chunk in self.llm.stream_chat_with_tools(
+                    self.llama_tools,
+                    chat_history=self._prefix_messages() + history + new_messages,
+                    allow_parallel_tool_calls=True
+                ):
+                    if chunk.delta:
+                        yield {"type": "token", "delta": chunk.delta}
+                    final = chunk
+                
+                new_messages.append(final.message)
+                tool_calls = self.llm.get_tool_calls_from_response(final, error_on_no_tool_call=False)
+                if not tool_calls or n_function_calls >= DEFAULT_MAX_FUNCTION_CALLS:
+                    break
+                
+                for tool_call in tool_calls:
+                    if self._has_tool(tool_call.tool_name):
+                        tool_output = call_tool_with_selection(tool_call, self.llama_tools)
+                    else:
+                        tool_output = build_missing_tool_output(tool_call)
+                    n_function_calls += 1
+                    yield self._tool_event(tool_call, tool_output, new_messages)
+            
+            done = self._finish_stream(message, final, new_messages)
+            self._cache_turn(key, done["response"])
+            yield done
+        except Exception as e:
+            print(f"Error in stream_message: {str(e)}")
+            yield {"type": "error", "response": f"Error: {str(e)}"}
+
+    async def astream_message(self, message: str) -> AsyncIterator[Dict[str, Any]]:
+        """Async version of stream_message for the ASGI serving path"""
+        with self.tools.batch():
+            try:
+                async for event in self._astream_message(message):
+                    if event["type"] in ("done", "error"):
+                        event = await asyncio.to_thread(self._flush_turn) or event
+                    yield event
+            except (GeneratorExit, asyncio.CancelledError):
+                # A stream being torn down may not get to await again, so this blocks briefly
+                self._flush_turn()
+                raise
+
+    def _flush_turn(self) -> Optional[Dict[str, Any]]:
+        """Commit a streamed turn's writes, returning an error event if the commit fails"""
+        try:
+            self.tools.flush()
+        except Exception as e:
+            print(f"Error flushing stream_message: {str(e)}")
+            return {"type": "error", "response": f"Error: {str(e)}"}
+        return None
+
+    async def _astream_message(self, message: str) -> AsyncIterator[Dict[str, Any]]:
+        """Stream one turn inside the tools' write batch"""
+        if not message:
+            yield {
+                "type": "done",
+                "response": "I'm sorry, I didn't understand that. Could you tell me more?"
+            }
+            return
+        
+        try:
+            fast = await asyncio.to_thread(self._fast_path_reply, message)
+            if fast is not None:
+                for event in self._replayed_events(fast):
+                    yield event
+                return
+            key, cached = await asyncio.to_thread(self._cached_reply, message)
+            if cached is not None:
+                for event in self._replayed_events(cached):
+                    yield event
+                return
+            
+            history = self._prepare_turn(message)
+            new_messages = [ChatMessage(role=MessageRole.USER, content=message)]
+            n_function_calls = 0
+            
+            while True:
+                final = None
+                stream = await self.llm.astream_chat_with_tools(
+                    self.llama_tools,
+                    chat_history=self._prefix_messages() + history + new_messages,
+                    allow_parallel_tool_calls=True
+                )
+                async for chunk in stream:
+                    if chunk.delta:
+                        yield {"type": "token", "delta": chunk.delta}
+                    final = chunk
+                
+                new_messages.append(final.message)
+                tool_calls = self.llm.get_tool_calls_from_response(final, error_on_no_tool_call=False)
+                if not tool_calls or n_function_calls >= DEFAULT_MAX_FUNCTION_CALLS:
+                    break
+                
+                for tool_call in tool_calls:
+                    if self._has_tool(tool_call.tool_name):
+                        tool_output = await acall_tool_with_selection(tool_call, self.llama_tools)
+                    else:
+                        tool_output = build_missing_tool_output(tool_call)
+                    n_function_calls += 1
+                    yield self._tool_event(tool_call, tool_output, new_messages)
+            
+            done = self._finish_stream(message, final, new_messages)
+            await asyncio.to_thread(self._cache_turn, key, done["response"])
+            yield done
+        except Exception as e:
+            print(f"Error in astream_message: {str(e)}")
+            yield {"type": "error", "response": f"Error: {str(e)}"}
+
+    def _cache_context(self) -> str:
+        """Context a cached reply depends on besides the message itself.
+
+        Entries are per user, so a reply or plan never crosses to someone else's
+        records. A reply also depends on the recent turns ("same as yesterday",
+        an answer to a question) and on the conversation state block, so those
+        are hashed in. A fresh conversation has neither, which lets repeated
+        batch lines hit.
+        """
+        recent = [
+            [str(msg.role), str(msg.content or "")]
+            for msg in self.chat_history[-CONTEXT_MESSAGES:]
+        ]
+        state = [self.conversation_summary, self.tools.current_category]
+        context_hash = hashlib.sha256(
+            json.dumps([recent, state], ensure_ascii=False).encode('utf-8')
+        ).hexdigest()
+        return f"{self._cache_fingerprint}\0{self.tools.user_id}\0{context_hash}"
+
+    def _cached_reply(self, message: str) -> Tuple[Optional[str], Optional[str]]:
+        """Look up a message in the response cache, replaying its tool calls on a hit.
+
+        Returns the cache key (None when caching is off) and the cached
+        response (None on a miss). Starts recording the turn's tool calls.
+        """
+        self._turn_calls = []
+        if self.response_cache is None:
+            return None, None
+        key = cache_key(message, self._cache_context())
+        hit = self.response_cache.get(key)
+        if hit is None:
+            return key, None
+        
+        plan, response_text = hit
+        for tool_name, arguments in plan:
+            self._tool_funcs[tool_name](**arguments)
+        self._remember_turn(message, response_text)
+        print(f"Response cache hit: replayed {len(plan)} tool calls")
+        return key, response_text
+
+    def _fast_path_reply(self, message: str) -> Optional[str]:
+        """Document a structured check-in without the model, or return None to fall through"""
+        self._turn_calls = []
+        if not FAST_PATH_ENABLED:
+            return None
+        entries = classifier.classify(message)
+        if entries is None:
+            return None
+        
+        for category_id, section_name, observations in entries:
+            self._tool_funcs["set_category_section_observations"](
+                category_id=category_id,
+                section_name=section_name,
+                observations=observations
+            )
+        documented = ", ".join(f"{category_id}/{section_name}" for category_id, section_name, _ in entries)
+        response_text = f"Got it, I documented {documented}."
+        self._remember_turn(message, response_text)
+        print(f"Fast path: documented {documented} without the model")
+        return response_text
+
+    def _remember_turn(self, message: str, response_text: str):
+        """Add a turn answered without the agent to its memory and the chat history"""
+        self.agent.memory.put_messages([
+            ChatMessage(role=MessageRole.USER, content=message),
+            ChatMessage(role=MessageRole.ASSISTANT, content=response_text),
+        ])
+        self._record_turn(message, response_text)
+
+    def _cache_turn(self, key: Optional[str], response_text: str):
+        """Cache a completed turn if its tool calls can be replayed"""
+        if key is None:
+            return
+        plan = [(tool_name, arguments) for tool_name, arguments, _ in self._turn_calls]
+        outputs = [output for _, _, output in self._turn_calls]
+        if is_cacheable(plan, outputs):
+            self.response_cache.put(key, plan, response_text)
+
+    def _replayed_events(self, response_text: str) -> Iterator[Dict[str, Any]]:
+        """Stream events for a turn answered without the model"""
+        for tool_name, arguments, output in self._turn_calls:
+            yield {
+                "type": "tool",
+                "tool": tool_name,
+                "arguments": arguments,
+                "summary": self._describe_tool_call(tool_name, arguments),
+                "output": str(output)
+            }
+        yield {"type": "token", "delta": response_text}
+        yield {"type": "done", "response": response_text}
+
+    def _prefix_messages(self) -> List[ChatMessage]:
+        """Messages sent ahead of the conversation on every LLM call"""
+        return self.agent.agent_worker.prefix_messages
+
+    def _has_tool(self, tool_name: str) -> bool:
+        """Check whether the LLM asked for a tool that exists"""
+        return any(tool.metadata.name == tool_name for tool in self.llama_tools)
+
+    def _tool_event(self, tool_call, tool_output, new_messages: List[ChatMessage]) -> Dict[str, Any]:
+        """Record a tool result for the LLM and describe it for the client"""
+        new_messages.append(ChatMessage(
+            content=str(tool_output),
+            role=MessageRole.TOOL,
+            additional_kwargs={"name": tool_call.tool_name, "tool_call_id": tool_call.tool_id}
+        ))
+        return {
+            "type": "tool",
+            "tool": tool_call.tool_name,
+            "arguments": tool_call.tool_kwargs,
+            "summary": self._describe_tool_call(tool_call.tool_name, tool_call.tool_kwargs),
+            "output": str(tool_output)
+        }
+
+    def _finish_stream(self, message: str, final, new_messages: List[ChatMessage]) -> Dict[str, Any]:
+        """Save a streamed turn to agent memory and chat history"""
+        response_text = str(final.message.content or "")
+        self.agent.memory.put_messages(new_messages)
+        self._record_turn(message, response_text)
+        return {"type": "done", "response": response_text}
+
+    @staticmethod
+    def _describe_tool_call(tool_name: str, arguments: Dict[str, Any]) -> str:
+        """Describe a tool call in a few words for the action stream"""
+        category_id = arguments.get("category_id", "")
+        if tool_name == "set_category_section_observations":
+            return f"documented {category_id}/{arguments.get('section_name', '')}"
+        if tool_name == "set_category_next_steps":
+            return f"set next steps for {category_id}"
+        if tool_name == "add_category_notes":
+            return f"added notes to {category_id}"
+        if tool_name == "clear_category":
+            return f"cleared {category_id}"
+        return tool_name
+
     def get_current_data(self) -> Dict[str, Dict[str, str]]:
         """Get current documentation data"""
         return self.tools.current_data
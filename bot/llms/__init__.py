@@ -1,19 +1,34 @@
-from typing import Any, List, Optional, Sequence
+import asyncio
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Sequence, Union
 from llama_index.core.base.llms.types import (
     CompletionResponse,
     CompletionResponseGen,
+    CompletionResponseAsyncGen,
     LLMMetadata,
     ChatMessage,
     MessageRole,
     ChatResponse,
     ChatResponseGen,
+    ChatResponseAsyncGen,
 )
-from llama_index.core.base.llms.base import BaseLLM
+from llama_index.core.llms.function_calling import FunctionCallingLLM
+from llama_index.core.llms.llm import ToolSelection
 from llama_index.core.callbacks import CallbackManager
+from llama_index.core.llms.callbacks import llm_chat_callback
+from pydantic import PrivateAttr
+from categories import CATEGORIES
+from ..batch import BATCH_HEADER
+
+class MockLLM(FunctionCallingLLM):
+    """Mock LLM for testing that implements llama-index's function calling LLM interface"""
 
-class MockLLM(BaseLLM):
-    """Mock LLM for testing that implements llama-index's LLM interface"""
-    
     def __init__(self, callback_manager: Optional[CallbackManager] = None):
         super().__init__(callback_manager=callback_manager or CallbackManager())
 
@@ -25,6 +40,7 @@ class MockLLM(BaseLLM):
             num_output=256,  # max output length
             model_name="mock-llm",
             model_version="0.0.1",
+            is_chat_model=True,
             is_function_calling_model=True  # Enable function calling
         )
 
@@ -33,11 +49,6 @@ class MockLLM(BaseLLM):
         if "slept well" in prompt.lower():
             response = """I'll help document that information about your sleep.
 
-First, let me record your observation about sleeping well.
-
-I'll use the set_category_observations tool to document this:
-{"category_id": "sleep", "observations": "Had a good night's sleep with no dreams"}
-
 That's great to hear you slept well! Not remembering dreams is actually quite common and can sometimes indicate deep sleep. How do you feel after getting such good rest? Do you notice any difference in your energy levels today?"""
         else:
             response = "I understand. Let me help document that information."
@@ -46,15 +57,80 @@ That's great to hear you slept well! Not remembering dreams is actually quite co
 
     def stream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponseGen:
         """Stream complete the prompt."""
-        response = self.complete(prompt, formatted=formatted, **kwargs)
-        yield response
+        text = ""
+        for token in self._tokens(self.complete(prompt, formatted=formatted, **kwargs).text):
+            text += token
+            yield CompletionResponse(text=text, delta=token)
+
+    def _tool_calls_for(self, messages: Sequence[ChatMessage], tools: Sequence[Any]) -> List[ToolSelection]:
+        """Decide which tool calls to make for the latest user message"""
+        if not tools or not messages or messages[-1].role != MessageRole.USER:
+            # Either tools are unavailable or tool results are already in
+            return []
+        tool_names = {tool.metadata.name for tool in tools}
+        if "slept well" in str(messages[-1].content).lower() and "set_category_section_observations" in tool_names:
+            return [ToolSelection(
+                tool_id=f"call_{uuid.uuid4().hex[:8]}",
+                tool_name="set_category_section_observations",
+                tool_kwargs={
+                    "category_id": "sleep",
+                    "section_name": "General notes",
+                    "observations": "Had a good night's sleep with no dreams"
+                }
+            )]
+        return []
+
+    def _batch_response(self, request: str) -> str:
+        """Answer a micro-batch request with the calls _tool_calls_for would make for each line"""
+        results = []
+        for number, line in enumerate(request.split("\n")[1:], 1):
+            calls = []
+            if "slept well" in line.lower():
+                calls.append({
+                    "tool": "set_category_section_observations",
+                    "arguments": {
+                        "category_id": "sleep",
+                        "section_name": "General notes",
+                        "observations": "Had a good night's sleep with no dreams"
+                    }
+                })
+            results.append({"line": number, "calls": calls})
+        return json.dumps({"results": results})
 
+    # The public chat methods emit callback events like a real client, so
+    # handlers see one LLM event per call; the private ones do the work
+    @llm_chat_callback()
     def chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
         """Chat with the LLM."""
+        return self._chat(messages, **kwargs)
+
+    @llm_chat_callback()
+    def stream_chat(
+        self, messages: Sequence[ChatMessage], **kwargs: Any
+    ) -> ChatResponseGen:
+        """Stream chat with the LLM."""
+        return self._stream_chat(messages, **kwargs)
+
+    def _chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        """Build the response to a conversation"""
+        if messages and str(messages[-1].content or "").startswith(BATCH_HEADER):
+            return ChatResponse(message=ChatMessage(
+                role=MessageRole.ASSISTANT,
+                content=self._batch_response(str(messages[-1].content))
+            ))
+        tool_calls = self._tool_calls_for(messages, kwargs.get("tools", []))
+        if tool_calls:
+            return ChatResponse(
+                message=ChatMessage(
+                    role=MessageRole.ASSISTANT,
+                    content="",
+                    additional_kwargs={"tool_calls": tool_calls},
+                )
+            )
         # Combine all messages into a single prompt
         prompt = "\n".join([f"{msg.role}: {msg.content}" for msg in messages])
-        completion_response = self.complete(prompt, **kwargs)
-        
+        completion_response = self.complete(prompt)
+
         return ChatResponse(
             message=ChatMessage(
                 role=MessageRole.ASSISTANT,
@@ -63,9 +139,172 @@ That's great to hear you slept well! Not remembering dreams is actually quite co
             raw=completion_response,
         )
 
+    def _stream_chat(
+        self, messages: Sequence[ChatMessage], **kwargs: Any
+    ) -> ChatResponseGen:
+        """Stream the response to a conversation word by word"""
+        response = self._chat(messages, **kwargs)
+        content = ""
+        for token in self._tokens(response.message.content or ""):
+            content += token
+            yield ChatResponse(
+                message=ChatMessage(role=MessageRole.ASSISTANT, content=content),
+                delta=token,
+            )
+        # The final chunk carries the complete message, including any tool calls
+        yield ChatResponse(message=response.message, delta="")
+
+    @llm_chat_callback()
+    async def achat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        """Async chat with the LLM."""
+        return self._chat(messages, **kwargs)
+
+    async def acomplete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        """Async complete the prompt."""
+        return self.complete(prompt, formatted=formatted, **kwargs)
+
+    @llm_chat_callback()
+    async def astream_chat(
+        self, messages: Sequence[ChatMessage], **kwargs: Any
+    ) -> ChatResponseAsyncGen:
+        """Async stream chat with the LLM."""
+        async def gen() -> ChatResponseAsyncGen:
+            for response in self._stream_chat(messages, **kwargs):
+                yield response
+        return gen()
+
+    async def astream_complete(
+        self, prompt: str, formatted: bool = False, **kwargs: Any
+    ) -> CompletionResponseAsyncGen:
+        """Async stream complete the prompt."""
+        async def gen() -> CompletionResponseAsyncGen:
+            for response in self.stream_complete(prompt, formatted=formatted, **kwargs):
+                yield response
+        return gen()
+
+    def _prepare_chat_with_tools(
+        self,
+        tools: Sequence[Any],
+        user_msg: Optional[Union[str, ChatMessage]] = None,
+        chat_history: Optional[List[ChatMessage]] = None,
+        verbose: bool = False,
+        allow_parallel_tool_calls: bool = False,
+        **kwargs: Any,
+    ) -> Dict[str, Any]:
+        """Prepare the arguments needed to let the LLM chat with tools."""
+        messages = list(chat_history or [])
+        if isinstance(user_msg, str):
+            user_msg = ChatMessage(role=MessageRole.USER, content=user_msg)
+        if user_msg is not None:
+            messages.append(user_msg)
+        return {"messages": messages, "tools": tools}
+
+    def get_tool_calls_from_response(
+        self,
+        response: ChatResponse,
+        error_on_no_tool_call: bool = True,
+        **kwargs: Any,
+    ) -> List[ToolSelection]:
+        """Get the tool calls attached to a response."""
+        tool_calls = response.message.additional_kwargs.get("tool_calls", [])
+        if not tool_calls and error_on_no_tool_call:
+            raise ValueError("Expected at least one tool call, but got none.")
+        return list(tool_calls)
+
+    @staticmethod
+    def _tokens(text: str) -> List[str]:
+        """Split text into word-sized stream chunks"""
+        if not text:
+            return []
+        words = text.split(" ")
+        return [word + " " for word in words[:-1]] + [words[-1]]
+
+
+class LatencyMockLLM(MockLLM):
+    """MockLLM that takes as long as a hosted model and documents most messages.
+
+    Every call waits for a lognormally distributed time with the given median
+    and 95th percentile, which is roughly how hosted chat completions are
+    distributed. A ``tool_call_rate`` share of user messages gets a
+    set_category_section_observations call. Which messages get one, and for
+    which section, follows from a hash of the message, so a repeated message
+    always gets the same plan.
+    """
+
+    median_ms: float = 600.0
+    p95_ms: float = 2000.0
+    tool_call_rate: float = 0.7
+    _rng: random.Random = PrivateAttr()
+    _rng_lock: threading.Lock = PrivateAttr()
+
+    def __init__(self, median_ms: float = 600.0, p95_ms: float = 2000.0, tool_call_rate: float = 0.7,
+                 seed: Optional[int] = None, callback_manager: Optional[CallbackManager] = None):
+        super().__init__(callback_manager=callback_manager)
+        if median_ms < 0 or p95_ms < median_ms:
+            raise ValueError("Latency needs 0 <= median_ms <= p95_ms")
+        self.median_ms = median_ms
+        self.p95_ms = p95_ms
+        self.tool_call_rate = tool_call_rate
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+
+    def sample_latency(self) -> float:
+        """Draw one call's latency in seconds"""
+        if self.median_ms == 0:
+            return 0.0
+        # 1.645 standard deviations above the mean of the underlying normal is its 95th percentile
+        sigma = math.log(self.p95_ms / self.median_ms) / 1.645
+        with self._rng_lock:
+            return self._rng.lognormvariate(math.log(self.median_ms / 1000), sigma)
+
+    # Building a mock response takes no time, so only the public methods wait:
+    # the sync ones block their thread and the async ones only their coroutine
+    @llm_chat_callback()
+    def chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        """Chat with the LLM, waiting like a hosted model."""
+        time.sleep(self.sample_latency())
+        return self._chat(messages, **kwargs)
+
+    @llm_chat_callback()
     def stream_chat(
         self, messages: Sequence[ChatMessage], **kwargs: Any
     ) -> ChatResponseGen:
-        """Stream chat with the LLM."""
-        response = self.chat(messages, **kwargs)
-        yield response
+        """Stream chat with the LLM, waiting like a hosted model before the first token."""
+        time.sleep(self.sample_latency())
+        return self._stream_chat(messages, **kwargs)
+
+    @llm_chat_callback()
+    async def achat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        """Async chat with the LLM, waiting without holding a thread."""
+        await asyncio.sleep(self.sample_latency())
+        return self._chat(messages, **kwargs)
+
+    @llm_chat_callback()
+    async def astream_chat(
+        self, messages: Sequence[ChatMessage], **kwargs: Any
+    ) -> ChatResponseAsyncGen:
+        """Async stream chat with the LLM, waiting without holding a thread before the first token."""
+        await asyncio.sleep(self.sample_latency())
+
+        async def gen() -> ChatResponseAsyncGen:
+            for response in self._stream_chat(messages, **kwargs):
+                yield response
+        return gen()
+
+    def _tool_calls_for(self, messages: Sequence[ChatMessage], tools: Sequence[Any]) -> List[ToolSelection]:
+        """Document a share of user messages in a section picked by the message's hash"""
+        if not tools or not messages or messages[-1].role != MessageRole.USER:
+            return []
+        if "set_category_section_observations" not in {tool.metadata.name for tool in tools}:
+            return []
+        text = ' '.join(str(messages[-1].content or '').split())
+        digest = int(hashlib.sha256(text.encode('utf-8')).hexdigest()[:12], 16)
+        if (digest % 10000) / 10000 >= self.tool_call_rate:
+            return []
+        sections = [(category.id, section.name) for category in CATEGORIES for section in category.sections]
+        category_id, section_name = sections[digest % len(sections)]
+        return [ToolSelection(
+            tool_id=f"call_{uuid.uuid4().hex[:8]}",
+            tool_name="set_category_section_observations",
+            tool_kwargs={"category_id": category_id, "section_name": section_name, "observations": text[:500]}
+        )]
@@ -0,0 +1,162 @@
+import asyncio
+import os
+import queue
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, List, Optional, Tuple
+
+
+class BotPool:
+    """Process-wide pool of TherapyDocumentationBot instances.
+
+    Bots are expensive to build (tools, LLM client, FunctionTool wrappers and
+    the agent with its system prompt), so each worker process builds at most
+    ``size`` of them and hands them out per request. Per-user chat state is
+    loaded into a bot on checkout and wiped again before the next checkout.
+
+    Threads wait for a free bot with ``acquire`` and coroutines with
+    ``aacquire``. A waiting coroutine holds no thread, so requests queued for
+    a bot can never starve the executor that running requests need to finish.
+    Released bots go to waiting coroutines first.
+    """
+
+    def __init__(self, size: int = 4, factory: Optional[Callable] = None, test_mode: bool = False):
+        """Initialize an empty pool; bots are created lazily on first checkout"""
+        if size < 1:
+            raise ValueError(f"Invalid pool size: {size}")
+        self.size = size
+        self.test_mode = test_mode
+        self._factory = factory or self._default_factory
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._llm = None
+        self._pid = os.getpid()
+        # (event loop, future) of each coroutine waiting in aacquire, oldest first
+        self._waiters: deque = deque()
+
+    def _default_factory(self):
+        """Build a bot that shares this pool's LLM client"""
+        from bot.core import TherapyDocumentationBot
+
+        if self._llm is None:
+            self._llm = TherapyDocumentationBot.create_llm(test_mode=self.test_mode)
+        return TherapyDocumentationBot(test_mode=self.test_mode, llm=self._llm)
+
+    def _check_pid(self):
+        """Drop bots inherited from a parent process after a fork"""
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._idle = queue.LifoQueue()
+                    self._waiters = deque()
+                    self._created = 0
+                    self._llm = None
+                    self._pid = os.getpid()
+
+    def _take(self) -> Tuple[Optional[object], bool]:
+        """Take an idle bot, or reserve room to build one; returns (bot, whether to build)"""
+        try:
+            return self._idle.get_nowait(), False
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                return None, True
+        return None, False
+
+    def _build(self):
+        """Build a bot in a reserved slot, giving the slot back if that fails"""
+        try:
+            return self._factory()
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+
+    def acquire(self, chat_history: Optional[List] = None, summary: str = "",
+                timeout: Optional[float] = None, user_id: Optional[str] = None):
+        """Check out a bot bound to a user, building one if the pool is not yet full"""
+        self._check_pid()
+        bot, build = self._take()
+        if build:
+            bot = self._build()
+        elif bot is None:
+            bot = self._idle.get(timeout=timeout)
+        bot.reset(chat_history=chat_history, summary=summary, user_id=user_id)
+        return bot
+
+    async def aacquire(self, chat_history: Optional[List] = None, summary: str = "",
+                       timeout: Optional[float] = None, user_id: Optional[str] = None):
+        """Async version of acquire; raises asyncio.TimeoutError if no bot frees up in time"""
+        self._check_pid()
+        bot, build = self._take()
+        if build:
+            bot = await asyncio.to_thread(self._build)
+        elif bot is None:
+            bot = await self._wait(timeout)
+        bot.reset(chat_history=chat_history, summary=summary, user_id=user_id)
+        return bot
+
+    async def _wait(self, timeout: Optional[float]):
+        """Wait on the event loop until release hands this coroutine a bot"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._lock:
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                self._waiters.append((loop, future))
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except BaseException:
+            with self._lock:
+                if (loop, future) in self._waiters:
+                    self._waiters.remove((loop, future))
+            # Cancelled just after a bot arrived: give it back rather than lose it
+            if future.done() and not future.cancelled():
+                self._put(future.result())
+            raise
+
+    def _hand_off(self, future, bot):
+        """Pass a released bot to a waiting coroutine, on that coroutine's event loop"""
+        if future.done():
+            # The waiter timed out or was cancelled meanwhile
+            self._put(bot)
+        else:
+            future.set_result(bot)
+
+    def _put(self, bot):
+        """Give a bot to the oldest waiting coroutine, or make it idle"""
+        with self._lock:
+            while self._waiters:
+                loop, future = self._waiters.popleft()
+                try:
+                    loop.call_soon_threadsafe(self._hand_off, future, bot)
+                    return
+                except RuntimeError:
+                    # That waiter's event loop is closed
+                    continue
+            self._idle.put(bot)
+
+    def release(self, bot):
+        """Return a bot to the pool, discarding its per-user state"""
+        bot.reset()
+        self._put(bot)
+
+    @contextmanager
+    def checkout(self, chat_history: Optional[List] = None, summary: str = "",
+                 timeout: Optional[float] = None, user_id: Optional[str] = None):
+        """Context manager that acquires a bot and always releases it"""
+        bot = self.acquire(chat_history=chat_history, summary=summary, timeout=timeout, user_id=user_id)
+        try:
+            yield bot
+        finally:
+            self.release(bot)
+
+    @property
+    def created(self) -> int:
+        """Number of bots built by this process so far"""
+        return self._created
@@ -0,0 +1,147 @@
+"""Deterministic fast path for trivially structured check-ins.
+
+Messages like "slept 8 hours, bed at 10pm", "3 journal entries today" or
+"45 min strength training" map directly onto a category section. The
+classifier splits a message into clauses and only answers when every
+clause matches a rule; anything else falls through to the agent. The
+per-section rules are compiled once from the category registry.
+"""
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Pattern, Tuple
+from categories import CATEGORIES, GENERAL_NOTES
+
+# Set to 0 to send every message to the model
+FAST_PATH_ENABLED = os.environ.get('FAST_PATH', '1') != '0'
+
+NUMBER = r'(?:\d+(?:\.\d+)?|an?|one|two|three|four|five|six|seven|eight|nine|ten|half an?)'
+HOURS = r'(?:h|hr|hrs|hour|hours)'
+DURATION = rf'{NUMBER} ?(?:h|hr|hrs|hours?|m|min|mins|minutes?)'
+TIME = r'(?:\d{1,2}(?::\d{2})? ?(?:am|pm)?|midnight|noon)'
+APPROX = r'(?:about |around |roughly |~)?'
+WHEN = r'(?:today|yesterday|last night|this morning|tonight)'
+# A time that reads as one on its own; a bare number ("up 3") could be anything
+CLOCK_TIME = r'(?:\d{1,2}(?::\d{2})? ?(?:am|pm)|\d{1,2}:\d{2}|midnight|noon)'
+# Bare numbers only count as times after "at" or "by"
+AT_TIME = rf'(?:(?:at|by) {APPROX}{TIME}|{APPROX}{CLOCK_TIME})'
+
+# Extra phrasings for sections whose names people don't say verbatim
+SECTION_ALIASES: Dict[Tuple[str, str], Tuple[str, ...]] = {
+    ('physical', 'Strength training'): ('strength', 'weights', 'weight training', 'lifting'),
+    ('social', 'In-person'): ('in person',),
+    ('social', 'VC'): ('video call', 'video calls', 'video chat'),
+    ('productivity', 'iOS Screen Time'): ('screen time',),
+    ('journaling', 'Cognitive therapy'): ('cbt',),
+    ('spiritual', 'Solo'): ('solo meditation', 'solo practice'),
+    ('spiritual', 'Group'): ('group meditation', 'group practice'),
+    ('social', 'Text'): ('texting', 'text messages'),
+}
+
+# Section names too generic to stand for their section on their own ("45 min
+# solo" could be a run), so only their aliases match
+AMBIGUOUS_SECTIONS = {
+    ('spiritual', 'Solo'),
+    ('spiritual', 'Group'),
+    ('social', 'Text'),
+    ('sleep', 'Schedule'),
+    ('sleep', 'Dreams'),
+}
+
+# Rules with their own phrasing, beyond "<duration> <section>"
+SPECIAL_RULES: List[Tuple[str, str, str]] = [
+    ('sleep', 'Length of sleep', rf'(?:i )?slept (?:for )?{APPROX}{NUMBER} ?{HOURS}'),
+    ('sleep', 'Length of sleep', rf'{APPROX}{NUMBER} ?{HOURS} (?:of )?sleep'),
+    ('sleep', 'Length of sleep', rf'sleep:? {APPROX}{NUMBER} ?{HOURS}'),
+    ('sleep', 'Schedule', rf'(?:i )?(?:went to bed|in bed|bed|bedtime|fell asleep|asleep):? {AT_TIME}'),
+    ('sleep', 'Schedule', rf'(?:i )?(?:woke up|woke|got up|up|wake up|wakeup):? {AT_TIME}'),
+    ('journaling', 'Counting entries', rf'(?:i )?(?:wrote )?{NUMBER} journal entr(?:y|ies)'),
+    ('journaling', 'Counting entries', rf'(?:i )?journal(?:ed)? {NUMBER} times?'),
+]
+
+CLAUSE_SPLIT = re.compile(r'\s*(?:[,;+]|\band\b|\bthen\b)\s*', re.IGNORECASE)
+# The CLI tells the agent which mode it is in; the fast path answers the same in both
+MODE_PREFIX = re.compile(r'^\s*\[[a-z -]+ mode\]\s*', re.IGNORECASE)
+
+
+def _section_rules() -> List[Tuple[str, str, str]]:
+    """Build "<duration> <section>" rules from every section in the registry"""
+    rules = []
+    for category in CATEGORIES:
+        for section in category.sections:
+            if section is GENERAL_NOTES:
+                continue
+            names = SECTION_ALIASES.get((category.id, section.name), ())
+            if (category.id, section.name) not in AMBIGUOUS_SECTIONS:
+                names = (section.name.lower(),) + names
+            if not names:
+                continue
+            keyword = '(?:' + '|'.join(re.escape(name) for name in names) + ')'
+            rules.append((category.id, section.name, rf'(?:i )?(?:did )?{APPROX}{DURATION} (?:of )?{keyword}'))
+            rules.append((category.id, section.name, rf'{keyword}:? {APPROX}{DURATION}'))
+    return rules
+
+
+def _compile(rules: List[Tuple[str, str, str]]) -> List[Tuple[str, str, Pattern]]:
+    """Compile rules to match a whole clause, optionally dated"""
+    return [
+        (category_id, section_name, re.compile(rf'(?:{WHEN},? )?{pattern}(?: {WHEN})?', re.IGNORECASE))
+        for category_id, section_name, pattern in rules
+    ]
+
+
+class RuleClassifier:
+    """Maps structured check-ins onto category sections, counting how much traffic it handles"""
+
+    def __init__(self):
+        """Compile the rule tables"""
+        self.rules = _compile(SPECIAL_RULES + _section_rules())
+        self._lock = threading.Lock()
+        self._handled = 0
+        self._total = 0
+
+    def classify(self, message: str) -> Optional[List[Tuple[str, str, str]]]:
+        """Get (category_id, section_name, observations) for a message, or None if unsure"""
+        text = MODE_PREFIX.sub('', message).strip().rstrip('.!')
+        observations: Dict[Tuple[str, str], List[str]] = {}
+        clauses = [clause for clause in CLAUSE_SPLIT.split(text) if clause]
+        for clause in clauses:
+            match = self._match(clause)
+            if match is None:
+                observations = {}
+                break
+            observations.setdefault(match, []).append(clause[0].upper() + clause[1:])
+
+        with self._lock:
+            self._total += 1
+            if observations:
+                self._handled += 1
+        if not observations:
+            return None
+        return [
+            (category_id, section_name, '; '.join(parts))
+            for (category_id, section_name), parts in observations.items()
+        ]
+
+    def _match(self, clause: str) -> Optional[Tuple[str, str]]:
+        """Find the section a clause documents; ambiguous clauses don't match"""
+        matches = {
+            (category_id, section_name)
+            for category_id, section_name, pattern in self.rules
+            if pattern.fullmatch(clause)
+        }
+        return matches.pop() if len(matches) == 1 else None
+
+    def stats(self) -> Dict[str, float]:
+        """Get how many messages were seen and handled without the model"""
+        with self._lock:
+            handled, total = self._handled, self._total
+        return {
+            'handled': handled,
+            'total': total,
+            'handled_fraction': handled / total if total else 0.0
+        }
+
+
+# The rules are immutable, so one classifier serves every bot in the process
+classifier = RuleClassifier()
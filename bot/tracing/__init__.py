@@ -0,0 +1,76 @@
+"""LLM spans for request traces and /metrics.
+
+The handler listens to the LLM events llama-index emits around every chat
+call, including the agent's internal calls and streamed responses, and
+records their latency and token counts through ``metrics``.
+"""
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+from llama_index.core.callbacks import CBEventType, EventPayload
+from llama_index.core.callbacks.base_handler import BaseCallbackHandler
+import metrics
+from ..context import count_message_tokens, count_tokens
+
+
+def _token_counts(messages, response) -> Tuple[int, int]:
+    """Get (prompt, completion) tokens, from the provider's usage when it reports one"""
+    usage = getattr(response, 'additional_kwargs', None) or {}
+    if 'prompt_tokens' in usage and 'completion_tokens' in usage:
+        return int(usage['prompt_tokens']), int(usage['completion_tokens'])
+    # Streamed responses carry no usage; estimate like the context builder does
+    message = getattr(response, 'message', None)
+    return (
+        count_message_tokens(messages or []),
+        count_tokens(str(getattr(message, 'content', '') or ''))
+    )
+
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """Times every call to one LLM and counts its tokens"""
+
+    def __init__(self, model: str):
+        """Initialize the handler for an LLM; only LLM events are handled"""
+        ignored = [event_type for event_type in CBEventType if event_type != CBEventType.LLM]
+        super().__init__(event_starts_to_ignore=ignored, event_ends_to_ignore=ignored)
+        self.model = model
+        self._started: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def on_event_start(self, event_type: CBEventType, payload: Optional[Dict[str, Any]] = None,
+                       event_id: str = "", parent_id: str = "", **kwargs: Any) -> str:
+        """Remember when an LLM call started"""
+        with self._lock:
+            self._started[event_id] = time.perf_counter()
+        return event_id
+
+    def on_event_end(self, event_type: CBEventType, payload: Optional[Dict[str, Any]] = None,
+                     event_id: str = "", **kwargs: Any) -> None:
+        """Record a finished LLM call"""
+        with self._lock:
+            started = self._started.pop(event_id, None)
+        if started is None:
+            return
+        seconds = time.perf_counter() - started
+        payload = payload or {}
+        if EventPayload.EXCEPTION in payload:
+            metrics.observe_llm(self.model, seconds, outcome='error')
+            return
+        prompt_tokens, completion_tokens = _token_counts(
+            payload.get(EventPayload.MESSAGES), payload.get(EventPayload.RESPONSE)
+        )
+        metrics.observe_llm(self.model, seconds, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+
+    def start_trace(self, trace_id: Optional[str] = None) -> None:
+        """Traces are kept per request by metrics, not per llama-index trace"""
+
+    def end_trace(self, trace_id: Optional[str] = None, trace_map: Optional[Dict] = None) -> None:
+        """Traces are kept per request by metrics, not per llama-index trace"""
+
+
+def instrument_llm(llm):
+    """Attach a metrics handler to an LLM's callback manager, once; pooled bots share their LLM"""
+    handlers = llm.callback_manager.handlers
+    if metrics.METRICS_ENABLED and not any(isinstance(handler, MetricsCallbackHandler) for handler in handlers):
+        llm.callback_manager.add_handler(MetricsCallbackHandler(llm.metadata.model_name))
+    return llm
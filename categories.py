@@ -1,32 +1,137 @@
-def get_categories():
+"""Registry of therapy documentation categories.
+
+This is the single definition of the categories and their sections. It is
+built once at import time and is immutable. The tools validate against it,
+the system prompt's category guide is rendered from it, and ``/categories``
+serves a pre-serialized copy of it.
+"""
+import hashlib
+import json
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Dict, List, Mapping, Optional, Tuple
+
+
+@dataclass(frozen=True)
+class Section:
+    """A section of a category that observations are recorded under"""
+    name: str
+    description: str
+    # Prompt the user to share data from an external app for this section
+    external_data: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class Category:
+    """A therapy documentation category"""
+    id: str
+    name: str
+    sections: Tuple[Section, ...]
+
+    @property
+    def section_names(self) -> Tuple[str, ...]:
+        """Names of this category's sections, in display order"""
+        return tuple(section.name for section in self.sections)
+
+
+GENERAL_NOTES = Section('General notes', 'Anything that does not fit another section')
+
+CATEGORIES: Tuple[Category, ...] = (
+    Category('journaling', 'Journaling', (
+        GENERAL_NOTES,
+        Section('Counting entries', 'Track number of journal entries'),
+        Section('Cognitive therapy', 'Document therapy-related journaling'),
+    )),
+    Category('sleep', 'Sleep', (
+        GENERAL_NOTES,
+        Section('Length of sleep', 'Track sleep duration'),
+        Section('Schedule', 'Document sleep/wake times'),
+        Section('Dreams', 'Record any dream experiences'),
+    )),
+    Category('physical', 'Physical Activity', (
+        GENERAL_NOTES,
+        Section('Fitbit heart rate zones', 'Ask user to share their Fitbit heart rate data',
+                external_data='their Fitbit data'),
+        Section('Strength training', 'Document strength training activities'),
+    )),
+    Category('social', 'Social Engagement', (
+        GENERAL_NOTES,
+        Section('In-person', 'Track face-to-face interactions'),
+        Section('Text', 'Document text-based communications'),
+        Section('VC', 'Record video call interactions'),
+    )),
+    Category('productivity', 'Productivity & Work', (
+        GENERAL_NOTES,
+        Section('Cold Turkey', 'Ask user to share their Cold Turkey Blocker stats',
+                external_data='their Cold Turkey Blocker statistics'),
+        Section('iOS Screen Time', 'Ask user to share their iOS Screen Time data',
+                external_data='their iOS Screen Time data'),
+    )),
+    Category('spiritual', 'Spiritual Practice', (
+        GENERAL_NOTES,
+        Section('Solo', 'Document individual spiritual practices'),
+        Section('Group', 'Track group spiritual activities'),
+    )),
+    Category('self_care', 'Basic Self-Care', (
+        GENERAL_NOTES,
+        Section('Meals hygiene meds', 'Track daily self-care routines'),
+        Section('budget checklist medical appts', 'Document appointments and financial care'),
+    )),
+)
+
+# Frozen indexes for O(1) validation
+CATEGORIES_BY_ID: Mapping[str, Category] = MappingProxyType({
+    category.id: category for category in CATEGORIES
+})
+SECTIONS: Mapping[Tuple[str, str], Section] = MappingProxyType({
+    (category.id, section.name): section
+    for category in CATEGORIES
+    for section in category.sections
+})
+
+# The public list shape used by the tools, CLI and /categories
+CATEGORY_LIST: Tuple[Mapping, ...] = tuple(
+    MappingProxyType({'id': category.id, 'name': category.name, 'sections': category.section_names})
+    for category in CATEGORIES
+)
+CATEGORIES_JSON = json.dumps([dict(category) for category in CATEGORY_LIST])
+CATEGORIES_ETAG = hashlib.sha256(CATEGORIES_JSON.encode('utf-8')).hexdigest()[:16]
+
+
+def get_categories() -> List[Dict]:
     """Return list of therapy documentation categories"""
-    return [
-        {
-            "id": "journaling",
-            "name": "Journaling (Counting entries / Cognitive therapy)"
-        },
-        {
-            "id": "sleep",
-            "name": "Sleep (Fitbit data / Dreaming)"
-        },
-        {
-            "id": "physical",
-            "name": "Physical Activity (Fitbit HR / Steps)"
-        },
-        {
-            "id": "meditation",
-            "name": "Meditation (Apple Health / Calm)"
-        },
-        {
-            "id": "productivity",
-            "name": "Productivity & Work (Cold Turkey / iOS Screen Time)"
-        },
-        {
-            "id": "spiritual",
-            "name": "Spiritual Practice (Solo practice / Group events)"
-        },
-        {
-            "id": "self_care",
-            "name": "Basic Self-Care (Meals, hygiene, meds / Budget / Appts)"
-        }
-    ]
+    return [{**category, 'sections': list(category['sections'])} for category in CATEGORY_LIST]
+
+
+def validate_category(category_id: str) -> Category:
+    """Get a category, raising ValueError for unknown ids"""
+    category = CATEGORIES_BY_ID.get(category_id)
+    if category is None:
+        raise ValueError(f"Invalid category: {category_id}")
+    return category
+
+
+def validate_section(category_id: str, section_name: str) -> Section:
+    """Get a category's section, raising ValueError for unknown categories or sections"""
+    validate_category(category_id)
+    section = SECTIONS.get((category_id, section_name))
+    if section is None:
+        raise ValueError(f"Invalid section: {section_name}")
+    return section
+
+
+def render_category_guide(indent: str = '') -> str:
+    """Render the categories and sections as a guide for the system prompt"""
+    lines = []
+    for category in CATEGORIES:
+        lines.append(f"- {category.id}: {category.name}")
+        lines.append("  Sections:")
+        for section in category.sections:
+            lines.append(f"  - '{section.name}': {section.description}")
+        lines.append("")
+    external = [section for section in SECTIONS.values() if section.external_data]
+    if external:
+        lines.append("IMPORTANT: Some sections require external data:")
+        for number, section in enumerate(external, 1):
+            lines.append(f"{number}. '{section.name}': Always ask user to share {section.external_data}")
+    return '\n'.join(f"{indent}{line}" if line else '' for line in lines)
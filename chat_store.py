@@ -0,0 +1,112 @@
+import os
+import secrets
+from typing import Dict, List, Optional, Sequence, Tuple
+from storage import ConnectionPool, get_pool
+
+DEFAULT_MAX_TURNS = int(os.environ.get('CHAT_HISTORY_TURNS', '20'))
+DEFAULT_MAX_SUMMARY_CHARS = int(os.environ.get('CHAT_SUMMARY_CHARS', '2000'))
+
+# How much of each evicted message is folded into the rolling summary
+SUMMARY_SNIPPET_CHARS = 200
+
+
+class ChatSessionStore:
+    """Server-side conversation state keyed by an opaque session id.
+
+    Each session keeps a ring buffer of its most recent ``max_turns`` messages.
+    Older messages are folded into a bounded rolling summary as they are
+    evicted, so both storage and load cost stay constant however long the
+    conversation runs.
+    """
+
+    def __init__(self, pool: Optional[ConnectionPool] = None, max_turns: int = DEFAULT_MAX_TURNS,
+                 max_summary_chars: int = DEFAULT_MAX_SUMMARY_CHARS):
+        """Initialize the store"""
+        self.pool = pool or get_pool()
+        self.max_turns = max_turns
+        self.max_summary_chars = max_summary_chars
+
+    def create(self) -> str:
+        """Create an empty session and return its id"""
+        session_id = secrets.token_urlsafe(16)
+        with self.pool.connection() as db:
+            db.execute("INSERT INTO chat_sessions (id) VALUES (?)", (session_id,))
+        return session_id
+
+    def exists(self, session_id: str) -> bool:
+        """Check whether a session id refers to a stored session"""
+        with self.pool.connection() as db:
+            row = db.execute("SELECT 1 FROM chat_sessions WHERE id = ?", (session_id,)).fetchone()
+        return row is not None
+
+    def load(self, session_id: str) -> Tuple[List[Dict[str, str]], str]:
+        """Get the recent messages (oldest first) and rolling summary for a session"""
+        with self.pool.connection() as db:
+            row = db.execute("SELECT summary FROM chat_sessions WHERE id = ?", (session_id,)).fetchone()
+            if row is None:
+                return [], ''
+            turns = db.execute("""
+                SELECT role, content FROM chat_turns
+                WHERE session_id = ?
+                ORDER BY id DESC
+                LIMIT ?
+            """, (session_id, self.max_turns)).fetchall()
+        history = [{'role': turn[0], 'content': turn[1]} for turn in reversed(turns)]
+        return history, row[0]
+
+    def append(self, session_id: str, messages: Sequence[Dict[str, str]]):
+        """Append messages to a session, evicting the oldest into the summary"""
+        if not messages:
+            return
+        with self.pool.connection() as db:
+            db.execute("INSERT OR IGNORE INTO chat_sessions (id) VALUES (?)", (session_id,))
+            db.executemany(
+                "INSERT INTO chat_turns (session_id, role, content) VALUES (?, ?, ?)",
+                [(session_id, msg['role'], msg['content']) for msg in messages]
+            )
+            evicted = db.execute("""
+                SELECT id, role, content FROM chat_turns
+                WHERE session_id = ?
+                ORDER BY id DESC
+                LIMIT -1 OFFSET ?
+            """, (session_id, self.max_turns)).fetchall()
+            if evicted:
+                summary = db.execute(
+                    "SELECT summary FROM chat_sessions WHERE id = ?", (session_id,)
+                ).fetchone()[0]
+                summary = self._fold(summary, reversed(evicted))
+                db.execute(
+                    "DELETE FROM chat_turns WHERE session_id = ? AND id <= ?",
+                    (session_id, evicted[0][0])
+                )
+                db.execute(
+                    "UPDATE chat_sessions SET summary = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                    (summary, session_id)
+                )
+            else:
+                db.execute(
+                    "UPDATE chat_sessions SET updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                    (session_id,)
+                )
+
+    def delete(self, session_id: str):
+        """Delete a session and all of its messages"""
+        with self.pool.connection() as db:
+            db.execute("DELETE FROM chat_sessions WHERE id = ?", (session_id,))
+
+    def _fold(self, summary: str, turns) -> str:
+        """Fold evicted messages into the summary, keeping only its most recent tail"""
+        lines = [summary] if summary else []
+        for turn in turns:
+            role = 'User' if turn[1] == 'user' else 'Assistant'
+            content = ' '.join(turn[2].split())
+            if len(content) > SUMMARY_SNIPPET_CHARS:
+                content = content[:SUMMARY_SNIPPET_CHARS - 3] + '...'
+            lines.append(f"{role}: {content}")
+        summary = '\n'.join(lines)
+        if len(summary) > self.max_summary_chars:
+            summary = summary[-self.max_summary_chars:]
+            # Don't start the summary halfway through a line
+            if '\n' in summary:
+                summary = summary.split('\n', 1)[1]
+        return summary
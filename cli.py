@@ -1,21 +1,39 @@
 #!/usr/bin/env python3
 import sys
+import math
+import time
+import random
 import argparse
 import fileinput
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from rich.console import Console
-from rich.markdown import Markdown
 from rich.prompt import Prompt
 from rich.panel import Panel
+from rich.table import Table
+from rich.markup import escape
 from rich import print as rprint
-from bot.core import TherapyDocumentationBot
+from bot.pool import BotPool
+from response_cache import get_response_cache
+from tools import TherapyDocTools
 
 console = Console()
 
 class TherapyDocCLI:
-    def __init__(self, base_url="http://localhost:5000", interactive=False):
-        """Initialize CLI with bot in production mode"""
-        self.chatbot = TherapyDocumentationBot(test_mode=False)
+    def __init__(self, base_url="http://localhost:5000", interactive=False, user_id=None):
+        """Initialize CLI documenting as user_id (default: DEFAULT_USER_ID); the production bot is built on first use"""
+        self.test_mode = False
+        self.tools = TherapyDocTools(user_id=user_id)
         self.interactive = interactive
+        self._chatbot = None
+
+    @property
+    def chatbot(self):
+        """Get the bot, deferring the LLM and agent imports until a conversation needs them"""
+        if self._chatbot is None:
+            from bot.core import TherapyDocumentationBot
+            self._chatbot = TherapyDocumentationBot(test_mode=self.test_mode, user_id=self.tools.user_id)
+        return self._chatbot
 
     def start_chat(self):
         """Start a new chat session"""
@@ -73,7 +91,7 @@ class TherapyDocCLI:
     def get_categories(self):
         """Get available categories"""
         try:
-            return self.chatbot.tools.get_categories()
+            return self.tools.get_categories()
         except Exception as e:
             console.print(f"[red]Error getting categories: {e}[/red]")
             return []
@@ -127,7 +145,7 @@ class TherapyDocCLI:
                 sections = categories[category].get('sections', [])
                 if len(sections) == 1:
                     # If only one section, use all observations for it
-                    self.chatbot.tools.set_category_section_observations(
+                    self.tools.set_category_section_observations(
                         category_id=category,
                         section_name=sections[0],
                         observations=observations
@@ -153,16 +171,16 @@ class TherapyDocCLI:
                     
                     # Save each section's observations
                     for section, obs in section_data.items():
-                        self.chatbot.tools.set_category_section_observations(
+                        self.tools.set_category_section_observations(
                             category_id=category,
                             section_name=section,
                             observations=obs.strip()
                         )
             
             if next_steps:
-                self.chatbot.tools.set_category_next_steps(category, next_steps)
+                self.tools.set_category_next_steps(category_id=category, next_steps=next_steps)
             if notes:
-                self.chatbot.tools.add_category_notes(category, notes)
+                self.tools.add_category_notes(category_id=category, notes=notes)
             console.print("[green]Documentation saved successfully![/green]")
         except Exception as e:
             console.print(f"[red]Error saving documentation: {e}[/red]")
@@ -225,18 +243,27 @@ def interactive_mode(cli):
         except Exception as e:
             console.print(f"[red]Error: {e}[/red]")
 
-def batch_mode(cli, input_file=None, csv_mode=False):
-    """Run in batch mode, reading from stdin or file"""
-    # Start chat session quietly
-    cli.start_chat()
-    
+def read_batch_messages(input_file=None, csv_mode=False):
+    """Read batch messages from a CSV file (first column), a text file or stdin"""
     if csv_mode:
         import csv
         with open(input_file, 'r') as f:
             reader = csv.reader(f)
-            messages = [row[0] for row in reader if row]  # Get first column
-    else:
-        messages = [line.strip() for line in fileinput.input(files=input_file if input_file else ['-']) if line.strip()]
+            return [row[0] for row in reader if row]  # Get first column
+    return [line.strip() for line in fileinput.input(files=input_file if input_file else ['-']) if line.strip()]
+
+def batch_mode(cli, input_file=None, csv_mode=False, parallel=1, micro_batch=0):
+    """Run in batch mode, reading from stdin or file"""
+    # Start chat session quietly
+    cli.start_chat()
+    
+    messages = read_batch_messages(input_file, csv_mode)
+    if micro_batch > 0:
+        micro_batch_mode(cli, messages, micro_batch)
+        return
+    if parallel > 1:
+        parallel_batch_mode(cli, messages, parallel)
+        return
     
     for message in messages:
         # Show the input message
@@ -257,15 +284,219 @@ def batch_mode(cli, input_file=None, csv_mode=False):
         if not input_file:
             if not Prompt.ask("Continue? [y/n]", default="y").lower().startswith('y'):
                 break
+    
+    fast = fast_path_stats()
+    if fast['total']:
+        console.print(f"[dim]Fast path: {fast['handled']} of {fast['total']} messages "
+                      f"({fast['handled_fraction']:.0%}) documented without the model[/dim]")
+    stats = cache_stats(cli)
+    if stats and stats['hits'] + stats['misses']:
+        console.print(f"[dim]Response cache: {stats['hits']} hits, {stats['misses']} misses "
+                      f"({stats['hit_rate']:.0%} hit rate)[/dim]")
+
+def fast_path_stats():
+    """Get how much of this process's traffic the rule-based fast path handled"""
+    # Imported here because bot.rules is only loaded once a conversation starts
+    from bot.rules import classifier
+    return classifier.stats()
+
+def cache_stats(cli):
+    """Get the response cache counters of this process, or None when caching is off"""
+    cache = get_response_cache(cli.tools.db_path)
+    return cache.stats() if cache is not None else None
+
+def is_rate_limit_error(error):
+    """Check whether an LLM error means we are being rate limited"""
+    if getattr(error, 'status_code', None) == 429 or type(error).__name__ == 'RateLimitError':
+        return True
+    text = str(error).lower()
+    return '429' in text or 'rate limit' in text
+
+class RateLimitBackoff:
+    """Backoff shared by all batch workers, so one rate-limited call pauses them all"""
+    def __init__(self, retries=5, base_delay=1.0, max_delay=60.0):
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._resume_at = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        """Sleep until the current backoff window has passed"""
+        while True:
+            with self._lock:
+                delay = self._resume_at - time.monotonic()
+            if delay <= 0:
+                return
+            time.sleep(delay)
+
+    def backoff(self, attempt, error=None):
+        """Start a backoff window, honoring Retry-After when the API sends one"""
+        delay = None
+        response = getattr(error, 'response', None)
+        if response is not None:
+            try:
+                delay = float(response.headers.get('retry-after'))
+            except (AttributeError, TypeError, ValueError):
+                delay = None
+        if delay is None:
+            # Exponential backoff with jitter so workers don't retry in lockstep
+            delay = min(self.max_delay, self.base_delay * 2 ** attempt) * (0.5 + random.random() / 2)
+        with self._lock:
+            self._resume_at = max(self._resume_at, time.monotonic() + delay)
+        return delay
+
+def process_batch_message(pool, backoff, message, interactive=False, user_id=None):
+    """Process one batch message on its own pooled bot, retrying when rate limited"""
+    mode_message = f"[{'interactive' if interactive else 'non-interactive'} mode] {message}"
+    start = time.monotonic()
+    attempt = 0
+    while True:
+        backoff.wait()
+        try:
+            with pool.checkout(user_id=user_id) as bot:
+                response = bot.process_message(mode_message, raise_errors=True)
+            error = None
+        except Exception as e:
+            if is_rate_limit_error(e) and attempt < backoff.retries:
+                backoff.backoff(attempt, e)
+                attempt += 1
+                continue
+            response, error = None, str(e)
+        return {
+            "message": message,
+            "response": response,
+            "error": error,
+            "retries": attempt,
+            "latency": time.monotonic() - start
+        }
+
+def run_parallel_batch(messages, pool, workers, backoff=None, interactive=False, user_id=None):
+    """Process messages on a bounded worker pool, yielding results in input order"""
+    backoff = backoff or RateLimitBackoff()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(process_batch_message, pool, backoff, message, interactive, user_id)
+            for message in messages
+        ]
+        for future in futures:
+            yield future.result()
+
+def percentile(values, pct):
+    """Get a nearest-rank percentile of a list of numbers"""
+    ordered = sorted(values)
+    index = max(0, math.ceil(pct / 100 * len(ordered)) - 1)
+    return ordered[index]
+
+def parallel_batch_mode(cli, messages, workers):
+    """Run batch messages concurrently, each in its own conversation"""
+    # Bots are isolated per message but share one LLM client
+    pool = BotPool(size=workers, test_mode=cli.test_mode)
+    started = time.monotonic()
+    latencies = []
+    retries = 0
+    failures = 0
+    
+    for result in run_parallel_batch(messages, pool, workers, interactive=cli.interactive,
+                                     user_id=cli.tools.user_id):
+        latencies.append(result["latency"])
+        retries += result["retries"]
+        console.print(Panel(
+            result["message"],
+            title="Input",
+            border_style="yellow",
+            padding=(1, 2)
+        ))
+        if result["error"]:
+            failures += 1
+            console.print(f"[red]Error sending message: {result['error']}[/red]")
+        else:
+            cli._display_bot_message(result["response"].get("response", ""))
+        console.print(f"[dim]{result['latency']:.2f}s, {result['retries']} retries[/dim]")
+        console.print("=" * 80 + "\n")
+    
+    if not latencies:
+        return
+    elapsed = time.monotonic() - started
+    table = Table(title=f"Batch of {len(latencies)} messages, {workers} workers")
+    table.add_column("Metric")
+    table.add_column("Value", justify="right")
+    table.add_row("Wall time", f"{elapsed:.2f}s")
+    table.add_row("Throughput", f"{len(latencies) / elapsed:.2f} msg/s")
+    table.add_row("Latency p50", f"{percentile(latencies, 50):.2f}s")
+    table.add_row("Latency p95", f"{percentile(latencies, 95):.2f}s")
+    table.add_row("Latency max", f"{max(latencies):.2f}s")
+    table.add_row("Rate-limit retries", str(retries))
+    table.add_row("Failures", str(failures))
+    fast = fast_path_stats()
+    table.add_row("Fast path", f"{fast['handled']} ({fast['handled_fraction']:.0%})")
+    stats = cache_stats(cli)
+    if stats:
+        table.add_row("Response cache hits", f"{stats['hits']} ({stats['hit_rate']:.0%})")
+    console.print(table)
+
+def micro_batch_mode(cli, messages, size):
+    """Document independent lines several at a time, with one LLM call per batch"""
+    from bot.batch import MicroBatcher
+    
+    def fallback(message):
+        # Lines the batch couldn't document get their own conversation, as in parallel mode
+        cli.chatbot.reset(user_id=cli.tools.user_id)
+        mode_message = f"[{'interactive' if cli.interactive else 'non-interactive'} mode] {message}"
+        return cli.chatbot.process_message(mode_message, raise_errors=True)["response"]
+    
+    batcher = MicroBatcher(cli.chatbot.llm, cli.tools, batch_size=size, fallback=fallback)
+    started = time.monotonic()
+    for result in batcher.run(messages):
+        console.print(Panel(
+            result["message"],
+            title="Input",
+            border_style="yellow",
+            padding=(1, 2)
+        ))
+        if result["error"]:
+            console.print(f"[red]Error sending message: {result['error']}[/red]")
+        elif result["response"] is not None:
+            cli._display_bot_message(result["response"])
+        elif result["calls"]:
+            for tool_name, arguments in result["calls"]:
+                console.print(f"[green]{tool_name}[/green] {arguments}")
+        else:
+            console.print("[dim]Nothing to document[/dim]")
+        console.print(f"[dim]{result['source']}[/dim]")
+        console.print("=" * 80 + "\n")
+    
+    stats = batcher.stats
+    if not stats["lines"]:
+        return
+    elapsed = time.monotonic() - started
+    table = Table(title=f"Micro-batch of {stats['lines']} lines, {size} per LLM call")
+    table.add_column("Metric")
+    table.add_column("Value", justify="right")
+    table.add_row("Wall time", f"{elapsed:.2f}s")
+    table.add_row("Throughput", f"{stats['lines'] / elapsed:.2f} lines/s")
+    table.add_row("Batch LLM calls", str(stats["llm_calls"]))
+    table.add_row("Batch prompt tokens", f"{stats['prompt_tokens']} ({stats['prompt_tokens'] / stats['lines']:.0f}/line)")
+    table.add_row("Fast path", str(stats["fast_path"]))
+    table.add_row("Fallback to agent", str(stats["fallback"]))
+    table.add_row("Writes", str(stats["writes"]))
+    table.add_row("Failures", str(stats["failed"]))
+    console.print(table)
 
 def get_history_summary(cli, days=14):
     """Get summary of documentation from the last N days"""
     categories = cli.get_categories()
     summaries = []
     
+    try:
+        all_summaries = cli.tools.get_all_summaries(days=days)
+    except Exception as e:
+        console.print(f"[red]Error getting summaries: {e}[/red]")
+        return
+    
     for category in categories:
         try:
-            summary = cli.chatbot.tools.get_category_summary(category_id=category['id'])
+            summary = all_summaries.get(category['id'])
             if summary and summary.get('sections'):
                 has_content = False
                 category_lines = []
@@ -300,11 +531,72 @@ def get_history_summary(cli, days=14):
             console.print(f"[red]Error getting summary for {category['name']}: {e}[/red]")
     
     if summaries:
-        console.print("\n[bold blue]Documentation Summary (Last 2 Weeks):[/bold blue]")
+        console.print(f"\n[bold blue]Documentation Summary (Last {days} Days):[/bold blue]")
         console.print("\n".join(summaries))
     else:
         console.print("[yellow]No documentation found for the specified period.[/yellow]")
 
+def search_mode(cli, query, category_id=None, since=None, limit=20):
+    """Search documentation history and show the best matches"""
+    try:
+        results = cli.tools.search(query, category_id=category_id, since=since, limit=limit)
+    except ValueError as e:
+        console.print(f"[red]Error searching: {e}[/red]")
+        return
+    
+    if not results:
+        console.print(f"[yellow]No documentation matches '{query}'.[/yellow]")
+        return
+    table = Table(title=f"Documentation matching '{query}'")
+    table.add_column("When")
+    table.add_column("Category")
+    table.add_column("Section")
+    table.add_column("Match")
+    for result in results:
+        table.add_row(
+            result['timestamp'],
+            result['category_id'],
+            result['section_name'] or 'Notes',
+            # Snippets mark matches with [brackets], which rich would read as markup
+            escape(result['snippet'])
+        )
+    console.print(table)
+
+def trends_mode(cli, days=30, category_id=None, period='day'):
+    """Show how many observations were logged per category over the last N days"""
+    try:
+        trends = cli.tools.get_trends(days=days, category_id=category_id, period=period)
+    except ValueError as e:
+        console.print(f"[red]Error getting trends: {e}[/red]")
+        return
+    
+    names = {category['id']: category['name'] for category in cli.get_categories()}
+    table = Table(title=f"Observations per {period}, {trends['start']} to {trends['end']}")
+    table.add_column("Category")
+    table.add_column("Total", justify="right")
+    table.add_column(f"Per {period}")
+    table.add_column("Days without entries", justify="right")
+    table.add_column("Most logged section")
+    for cat_id, trend in trends['categories'].items():
+        counts = [point['entries'] for point in trend['series']]
+        top = max(trend['sections'].items(), key=lambda item: item[1], default=None)
+        table.add_row(
+            names.get(cat_id, cat_id),
+            str(trend['total']),
+            sparkline(counts),
+            str(len(trend['empty_days'])),
+            f"{top[0]} ({top[1]})" if top else "-"
+        )
+    console.print(table)
+
+def sparkline(counts):
+    """Render counts as a row of block characters scaled to the largest count"""
+    blocks = "·▁▂▃▄▅▆▇█"
+    peak = max(counts, default=0)
+    if not peak:
+        return blocks[0] * len(counts)
+    return ''.join(blocks[0] if not count else blocks[max(1, round(count / peak * 8))] for count in counts)
+
 def single_message_mode(cli, message):
     """Process a single message and exit"""
     # Start chat session
@@ -326,22 +618,41 @@ def main():
     parser.add_argument('message', nargs='?', help='Single message to process')
     parser.add_argument('--batch', '-b', help='Process messages from file (use - for stdin)', metavar='FILE')
     parser.add_argument('--csv', '-c', help='Process messages from CSV file (first column)', metavar='FILE')
-    parser.add_argument('--summary', '-s', action='store_true', help='Show documentation summary for last 2 weeks')
+    parser.add_argument('--summary', '-s', action='store_true', help='Show documentation summary for the last --days days')
+    parser.add_argument('--trends', action='store_true', help='Show observation counts per category for the last --days days')
+    parser.add_argument('--period', choices=('day', 'week'), default='day', help='Group --trends by day or week')
+    parser.add_argument('--days', type=int, metavar='N', help='Days covered by --summary (default: 14) or --trends (default: 30)')
     parser.add_argument('--url', default='http://localhost:5000', help='Server URL')
+    parser.add_argument('--user', '-u', metavar='NAME',
+                        help='Document as, and read the documentation of, this web login (default: DEFAULT_USER_ID)')
     parser.add_argument('--interactive', '-i', action='store_true', help='Continue in interactive mode after processing message')
+    parser.add_argument('--parallel', '-p', type=int, default=1, metavar='N',
+                        help='Process batch/CSV messages on N concurrent workers, each message in its own conversation')
+    parser.add_argument('--micro-batch', '-m', type=int, default=0, metavar='K',
+                        help='Document batch/CSV lines K at a time with one LLM call per K lines')
+    parser.add_argument('--search', metavar='QUERY', help='Search documentation history, best matches first')
+    parser.add_argument('--category', metavar='ID', help='Limit --search or --trends to one category')
+    parser.add_argument('--since', metavar='DATE', help='Limit --search to entries on or after an ISO date')
     args = parser.parse_args()
 
-    cli = TherapyDocCLI(base_url=args.url, interactive=bool(args.interactive))
+    cli = TherapyDocCLI(base_url=args.url, interactive=bool(args.interactive), user_id=args.user)
 
     if args.summary:
         # Summary mode
-        get_history_summary(cli)
+        get_history_summary(cli, days=args.days or 14)
+    elif args.trends:
+        # Trends mode
+        trends_mode(cli, days=args.days or 30, category_id=args.category, period=args.period)
+    elif args.search:
+        # Search mode
+        search_mode(cli, args.search, category_id=args.category, since=args.since)
     elif args.csv:
         # CSV mode
-        batch_mode(cli, args.csv, csv_mode=True)
+        batch_mode(cli, args.csv, csv_mode=True, parallel=args.parallel, micro_batch=args.micro_batch)
     elif args.batch:
         # Batch mode
-        batch_mode(cli, args.batch if args.batch != '-' else None)
+        batch_mode(cli, args.batch if args.batch != '-' else None, parallel=args.parallel,
+                   micro_batch=args.micro_batch)
     elif args.message:
         # Single message mode
         single_message_mode(cli, args.message)
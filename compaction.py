@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""Archive or purge documentation hidden by clear_category.
+
+Clearing a category only moves its clear marker, so cleared observations and
+notes stay on disk until this job moves them to the archive tables (or
+deletes them with --purge). Rows are moved a chunk at a time, each chunk in
+its own short write transaction, so the app's writers are never locked out
+for long. Deleting the rows also drops them from the search index; the daily
+rollup already dropped them when the category was cleared.
+"""
+import argparse
+import os
+import time
+from typing import Dict, List, Optional
+from shards import get_router, shard_mode
+from storage import ConnectionPool, default_db_path, get_pool
+
+COMPACTION_CHUNK_SIZE = int(os.environ.get('COMPACTION_CHUNK_SIZE', '500'))
+
+# (table, archive table, clear marker column, keyset order, archived columns).
+# Each keyset order is the tail of an index that leads with (user_id, category_id).
+TABLES = [
+    ('category_sections', 'archived_category_sections', 'section_id', ('timestamp', 'id'),
+     'id, user_id, category_id, section_name, observations, timestamp'),
+    ('category_notes', 'archived_category_notes', 'note_id', ('id',),
+     'id, user_id, category_id, note, timestamp'),
+]
+
+
+def compact(pool: Optional[ConnectionPool] = None, *, chunk_size: int = COMPACTION_CHUNK_SIZE,
+            archive: bool = True, pause: float = 0.0) -> Dict[str, int]:
+    """Archive (or delete) every cleared row in a database, returning how many rows left each table"""
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be positive")
+    pool = pool or get_pool()
+    with pool.connection() as db:
+        markers = db.execute("SELECT user_id, category_id, section_id, note_id FROM category_clears").fetchall()
+
+    moved = {table: 0 for table, *_ in TABLES}
+    for table, archive_table, marker_column, order, columns in TABLES:
+        key = ', '.join(order)
+        for user_id, category_id, section_id, note_id in markers:
+            marker = section_id if marker_column == 'section_id' else note_id
+            after = None
+            while True:
+                sql = f"SELECT {key} FROM {table} WHERE user_id = ? AND category_id = ? AND id <= ?"
+                params = [user_id, category_id, marker]
+                if after is not None:
+                    sql += f" AND ({key}) > ({', '.join('?' * len(order))})"
+                    params.extend(after)
+                sql += f" ORDER BY {key} LIMIT ?"
+                params.append(chunk_size)
+                with pool.connection() as db:
+                    rows = db.execute(sql, params).fetchall()
+                    if not rows:
+                        break
+                    # id is the last column of every keyset order
+                    ids = [row[-1] for row in rows]
+                    placeholders = ', '.join('?' * len(ids))
+                    if archive:
+                        db.execute(f"""
+                            INSERT OR REPLACE INTO {archive_table} ({columns})
+                            SELECT {columns} FROM {table} WHERE id IN ({placeholders})
+                        """, ids)
+                    db.execute(f"DELETE FROM {table} WHERE id IN ({placeholders})", ids)
+                moved[table] += len(ids)
+                if len(rows) < chunk_size:
+                    break
+                after = tuple(rows[-1])
+                if pause:
+                    # Let queued writers in between chunks
+                    time.sleep(pause)
+    return moved
+
+
+def database_paths(db_path: Optional[str] = None) -> List[str]:
+    """List the database files holding documentation: the main one, or every shard"""
+    if shard_mode() == 'off':
+        return [db_path or default_db_path()]
+    return get_router(db_path).shard_paths()
+
+
+def main():
+    """Compact every database from the command line"""
+    parser = argparse.ArgumentParser(description='Archive or purge documentation hidden by clearing categories')
+    parser.add_argument('--purge', action='store_true', help='Delete cleared rows instead of archiving them')
+    parser.add_argument('--chunk-size', type=int, default=COMPACTION_CHUNK_SIZE, metavar='N',
+                        help=f'Rows moved per transaction (default: {COMPACTION_CHUNK_SIZE})')
+    parser.add_argument('--pause', type=float, default=0.05, metavar='SECONDS',
+                        help='Pause between chunks so the app can write (default: 0.05)')
+    args = parser.parse_args()
+
+    for path in database_paths():
+        # Opened outside the shard LRU, like query_all_shards, so the job never evicts the app's pools
+        pool = ConnectionPool(path, size=1)
+        try:
+            moved = compact(pool, chunk_size=args.chunk_size, archive=not args.purge, pause=args.pause)
+        finally:
+            pool.close()
+        action = 'Purged' if args.purge else 'Archived'
+        print(f"{action} {moved['category_sections']} observations and {moved['category_notes']} notes in {path}")
+
+
+if __name__ == "__main__":
+    main()
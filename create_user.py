@@ -1,21 +1,13 @@
 #!/usr/bin/env python3
 import os
 import sqlite3
+from migrations import migrate
+from storage import get_pool
 
 def get_db():
-    """Get database connection, initializing only if needed"""
+    """Get database connection, migrating the schema first if needed"""
     db_path = os.environ.get('DATABASE', 'therapy.db')
-    init_db = os.environ.get('INIT_DB', 'false').lower() == 'true'
-    
-    # If database doesn't exist or INIT_DB is true, initialize it
-    if not os.path.exists(db_path) or init_db:
-        print("Initializing database...")
-        db = sqlite3.connect(db_path)
-        with open('schema.sql', 'r') as f:
-            db.executescript(f.read())
-        return db
-    
-    # Otherwise just connect to existing database
+    migrate(get_pool(db_path))
     return sqlite3.connect(db_path)
 
 def create_user(username, password):
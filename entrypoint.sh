@@ -1,12 +1,15 @@
 #!/bin/bash
 set -e
 
-# Initialize the database if it doesn't exist
-if [ ! -f "$DATABASE" ]; then
-    echo "Initializing database..."
-    python3 -c "from app import init_db; init_db()"
-fi
+# Apply schema migrations once, before any worker starts
+echo "Migrating database..."
+python3 init_db.py
 
 # Start the application
 echo "Starting application..."
-gunicorn --bind 0.0.0.0:5000 app:app
+if [ "$SERVER_MODE" = "asgi" ]; then
+    # Async workers: chat requests await the LLM instead of pinning a worker each
+    gunicorn -k uvicorn.workers.UvicornWorker --bind 0.0.0.0:5000 asgi:app
+else
+    gunicorn --bind 0.0.0.0:5000 app:app
+fi
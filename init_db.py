@@ -1,27 +1,72 @@
 #!/usr/bin/env python3
-import sqlite3
+import argparse
 import os
+from typing import Dict
+from compaction import compact
+from migrations import drop_all, migrate
+from shards import shard_mode
+from storage import ConnectionPool, get_pool
+
+# Tables whose rows are moved when one user's documentation is given to another
+USER_TABLES = ('category_sections', 'category_notes', 'archived_category_sections', 'archived_category_notes')
 
 def init_db():
-    """Initialize the database"""
+    """Bring the database schema up to date"""
     db_path = os.environ.get('DATABASE', 'therapy.db')
     
-    # Check if we should initialize the database
+    # INIT_DB=true wipes existing data and rebuilds the schema from scratch
     init_db = os.environ.get('INIT_DB', 'false').lower() == 'true'
     
-    # If database exists and INIT_DB is false, skip initialization
-    if os.path.exists(db_path) and not init_db:
-        print(f"Database {db_path} exists and INIT_DB=false, skipping initialization")
-        return
-    
-    print(f"Initializing database {db_path}...")
-    db = sqlite3.connect(db_path)
-    
-    with open('schema.sql', 'r') as f:
-        db.executescript(f.read())
+    pool = get_pool(db_path)
+    if os.path.exists(db_path) and init_db:
+        print(f"INIT_DB=true, dropping existing tables in {db_path}...")
+        drop_all(pool)
     
-    db.close()
-    print("Database initialized successfully")
+    print(f"Migrating database {db_path}...")
+    version = migrate(pool)
+    print(f"Database schema at version {version}")
+
+def reassign_user(pool: ConnectionPool, from_user: str, to_user: str) -> Dict[str, int]:
+    """Give all of one user's documentation to another, returning how many rows moved per table.
+
+    Meant for upgrades, where rows written before documentation was
+    partitioned by user went to DEFAULT_USER_ID rather than to the account
+    that logs in. Run it with the app stopped.
+    """
+    if from_user == to_user:
+        raise ValueError("Cannot reassign a user to itself")
+    # With every cleared row archived, no row is at or below either user's clear
+    # markers, so the markers can be dropped instead of merged
+    compact(pool)
+    with pool.connection() as db:
+        db.execute("DELETE FROM category_clears WHERE user_id IN (?, ?)", (from_user, to_user))
+        # The triggers on category_sections and category_notes move the search
+        # index and daily rollup rows along with them
+        moved = {
+            table: db.execute(f"UPDATE {table} SET user_id = ? WHERE user_id = ?", (to_user, from_user)).rowcount
+            for table in USER_TABLES
+        }
+        # Where both users have next steps for a category, the target user's are kept
+        moved['category_data'] = db.execute(
+            "UPDATE OR IGNORE category_data SET user_id = ? WHERE user_id = ?", (to_user, from_user)
+        ).rowcount
+        db.execute("DELETE FROM category_data WHERE user_id = ?", (from_user,))
+    return moved
+
+def main():
+    """Migrate the database, or reassign documentation between users"""
+    parser = argparse.ArgumentParser(description='Migrate the database schema')
+    parser.add_argument('--reassign-user', nargs=2, metavar=('FROM', 'TO'),
+                        help='Give all documentation of user FROM to user TO, e.g. after upgrading: test <username>')
+    args = parser.parse_args()
 
-if __name__ == "__main__":
     init_db()
+    if args.reassign_user:
+        if shard_mode() != 'off':
+            parser.error("--reassign-user only works with DB_SHARD_MODE=off")
+        from_user, to_user = args.reassign_user
+        moved = reassign_user(get_pool(os.environ.get('DATABASE', 'therapy.db')), from_user, to_user)
+        print(f"Reassigned {from_user} to {to_user}: " + ', '.join(f"{count} {table}" for table, count in moved.items()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+"""Request metrics in the Prometheus text format, and optional per-request traces.
+
+Counters and histograms are kept in memory per process; under gunicorn every
+worker serves its own ``/metrics``. Each request also collects a trace of
+its spans (LLM calls, tool calls, SQLite statements and pool waits). With
+``TRACE_REQUESTS=1`` the traces are logged as one JSON line per request, so
+a slow request shows whether its time went to the model, to lock waits or
+to a bloated prompt.
+"""
+import bisect
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Set to 0 to skip all instrumentation
+METRICS_ENABLED = os.environ.get('METRICS', '1') != '0'
+# Set to 1 to log a trace of every request
+TRACE_REQUESTS = os.environ.get('TRACE_REQUESTS', '0') == '1'
+# Only log traces of requests at least this slow
+TRACE_SLOW_MS = float(os.environ.get('TRACE_SLOW_MS', '0'))
+# Spans kept per trace; a request running thousands of statements still logs one bounded line
+MAX_TRACE_SPANS = 200
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOKEN_BUCKETS = (100, 250, 500, 1000, 1500, 2000, 3000, 4000, 6000, 8000, 16000)
+
+
+def _format_value(value: float) -> str:
+    """Format a sample value the way Prometheus clients do"""
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    """Render a label set, escaping values"""
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (
+        f'{name}="' + str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+        for name, value in pairs
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+class Counter:
+    """Monotonic counter with labels"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        """Initialize the counter"""
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        """Add to the counter for a label set"""
+        if not METRICS_ENABLED:
+            return
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        """Get the current value for a label set"""
+        with self._lock:
+            return self._values.get(tuple(str(labels[name]) for name in self.labelnames), 0)
+
+    def render(self) -> List[str]:
+        """Render the counter's samples"""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    """Histogram with cumulative buckets, a sum and a count per label set"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        """Initialize the histogram"""
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [per-bucket counts (last is +Inf), sum, count]
+        self._values: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        """Record one observation for a label set"""
+        if not METRICS_ENABLED:
+            return
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def count(self, **labels) -> int:
+        """Get how many observations a label set has"""
+        with self._lock:
+            entry = self._values.get(tuple(str(labels[name]) for name in self.labelnames))
+            return entry[2] if entry else 0
+
+    def render(self) -> List[str]:
+        """Render the histogram's samples"""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            values = sorted((key, [list(entry[0]), entry[1], entry[2]]) for key, entry in self._values.items())
+        for key, (counts, total, count) in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, (('le', _format_value(bound)),))
+                lines.append(f"{self.name}_bucket{labels} {_format_value(cumulative)}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {_format_value(count)}")
+        return lines
+
+
+class Registry:
+    """The set of metrics exposed on /metrics"""
+
+    def __init__(self):
+        """Initialize an empty registry"""
+        self._metrics: List = []
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        """Create and register a counter"""
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        """Create and register a histogram"""
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text exposition format"""
+        return '\n'.join(line for metric in self._metrics for line in metric.render()) + '\n'
+
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.counter('http_requests_total', 'HTTP requests served', ('method', 'route', 'status'))
+HTTP_DURATION = REGISTRY.histogram('http_request_duration_seconds', 'Time to produce a response', ('method', 'route'))
+LLM_DURATION = REGISTRY.histogram('llm_request_duration_seconds', 'LLM calls made by the agent', ('model', 'outcome'))
+LLM_TOKENS = REGISTRY.counter('llm_tokens_total', 'Tokens sent to and received from the LLM', ('model', 'kind'))
+PROMPT_TOKENS = REGISTRY.histogram('prompt_tokens', 'Prompt tokens per chat turn', buckets=TOKEN_BUCKETS)
+TOOL_DURATION = REGISTRY.histogram('tool_call_duration_seconds', 'Tool calls made by the agent', ('tool', 'outcome'))
+DB_DURATION = REGISTRY.histogram(
+    'db_statement_duration_seconds',
+    'SQLite statements and commits; write time includes waiting for the write lock',
+    ('operation',)
+)
+DB_LOCK_ERRORS = REGISTRY.counter('db_lock_errors_total', 'Statements that gave up waiting for a SQLite lock')
+DB_POOL_WAIT = REGISTRY.histogram('db_pool_wait_seconds', 'Time spent waiting to check out a pooled connection')
+
+
+class Trace:
+    """Spans recorded while serving one request"""
+
+    def __init__(self, name: str):
+        """Start a trace"""
+        self.id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.started = time.perf_counter()
+        self.spans: List[Dict] = []
+        self.totals: Dict[str, float] = {}
+        self.attributes: Dict = {}
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def add(self, kind: str, name: str, seconds: float, **attributes):
+        """Record a finished span"""
+        with self._lock:
+            self.totals[kind] = self.totals.get(kind, 0.0) + seconds
+            if len(self.spans) >= MAX_TRACE_SPANS:
+                self.dropped += 1
+                return
+            self.spans.append(dict(
+                kind=kind,
+                name=name,
+                start_ms=round((time.perf_counter() - self.started - seconds) * 1000, 3),
+                duration_ms=round(seconds * 1000, 3),
+                **attributes
+            ))
+
+    def to_dict(self, **extra) -> Dict:
+        """Get the trace as a JSON-serializable dict"""
+        with self._lock:
+            return dict(
+                trace=self.id,
+                name=self.name,
+                duration_ms=round((time.perf_counter() - self.started) * 1000, 3),
+                totals_ms={kind: round(seconds * 1000, 3) for kind, seconds in self.totals.items()},
+                spans=list(self.spans),
+                dropped_spans=self.dropped,
+                **self.attributes,
+                **extra
+            )
+
+
+_current_trace: contextvars.ContextVar = contextvars.ContextVar('trace', default=None)
+
+
+def start_trace(name: str) -> Optional[Trace]:
+    """Start collecting spans for the current request"""
+    if not METRICS_ENABLED:
+        return None
+    trace = Trace(name)
+    _current_trace.set(trace)
+    return trace
+
+
+def current_trace() -> Optional[Trace]:
+    """Get the trace of the current request, if any"""
+    return _current_trace.get()
+
+
+def finish_trace(trace: Optional[Trace], **extra) -> Optional[Dict]:
+    """Stop collecting spans for a request, logging its trace when tracing is on.
+
+    Streamed responses finish when the server closes them, so this takes the
+    trace itself rather than relying on still being in the request's context.
+    """
+    if trace is None:
+        return None
+    if _current_trace.get() is trace:
+        _current_trace.set(None)
+    result = trace.to_dict(**extra)
+    if TRACE_REQUESTS and result['duration_ms'] >= TRACE_SLOW_MS:
+        print(f"Trace: {json.dumps(result, default=str)}")
+    return result
+
+
+def _span(kind: str, name: str, seconds: float, **attributes):
+    """Add a span to the current trace"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(kind, name, seconds, **attributes)
+
+
+def annotate(**attributes):
+    """Attach attributes to the current trace"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.attributes.update(attributes)
+
+
+def observe_request(method: str, route: str, status: int, seconds: float):
+    """Record a served HTTP request"""
+    HTTP_REQUESTS.inc(method=method, route=route, status=status)
+    HTTP_DURATION.observe(seconds, method=method, route=route)
+
+
+def observe_llm(model: str, seconds: float, outcome: str = 'ok', prompt_tokens: int = 0, completion_tokens: int = 0):
+    """Record an LLM call and its token counts"""
+    LLM_DURATION.observe(seconds, model=model, outcome=outcome)
+    LLM_TOKENS.inc(prompt_tokens, model=model, kind='prompt')
+    LLM_TOKENS.inc(completion_tokens, model=model, kind='completion')
+    _span('llm', model, seconds, outcome=outcome, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+
+
+def observe_prompt(tokens: int):
+    """Record the prompt size of a chat turn"""
+    PROMPT_TOKENS.observe(tokens)
+    annotate(prompt_tokens=tokens)
+
+
+def observe_tool(tool: str, seconds: float, outcome: str = 'ok'):
+    """Record a tool call"""
+    TOOL_DURATION.observe(seconds, tool=tool, outcome=outcome)
+    _span('tool', tool, seconds, outcome=outcome)
+
+
+def observe_statement(operation: str, seconds: float, locked: bool = False):
+    """Record a SQLite statement or commit"""
+    DB_DURATION.observe(seconds, operation=operation)
+    if locked:
+        DB_LOCK_ERRORS.inc()
+    _span('db', operation, seconds, **({'locked': True} if locked else {}))
+
+
+def observe_pool_wait(seconds: float):
+    """Record the wait for a pooled connection"""
+    DB_POOL_WAIT.observe(seconds)
+    # Checkouts that didn't wait would only clutter the trace
+    if seconds >= 0.001:
+        _span('pool_wait', 'acquire', seconds)
@@ -0,0 +1,494 @@
+#!/usr/bin/env python3
+"""Versioned schema migrations.
+
+This module is the single source of truth for the database schema. Each
+migration is a ``(version, description, steps)`` tuple, where every step is
+either an SQL statement or a callable taking the open connection. Migrations
+run in order, each inside its own write transaction, and the applied version
+is recorded in ``schema_version``. Run them once at startup through
+``init_db.py``; nothing else in the app creates tables.
+"""
+import os
+import sqlite3
+from typing import Callable, List, Tuple, Union
+from storage import ConnectionPool, get_pool
+
+Step = Union[str, Callable[[sqlite3.Connection], None]]
+
+# Owner of rows written before documentation was partitioned by user, and of
+# everything the CLI writes unless told otherwise. Defaults to the web app's
+# login, so both show the same documentation
+DEFAULT_USER_ID = os.environ.get('DEFAULT_USER_ID', 'test')
+
+
+def _split_category_notes(db: sqlite3.Connection):
+    """Rebuild category_notes as one row per note, splitting legacy blobs on newlines"""
+    db.execute("ALTER TABLE category_notes RENAME TO category_notes_blob")
+    db.execute("""
+        CREATE TABLE category_notes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            category_id TEXT NOT NULL,
+            note TEXT NOT NULL,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    rows = [
+        (category_id, line)
+        for category_id, notes in db.execute("SELECT category_id, notes FROM category_notes_blob")
+        for line in (notes or '').split('\n')
+        if line.strip()
+    ]
+    db.executemany("INSERT INTO category_notes (category_id, note) VALUES (?, ?)", rows)
+    db.execute("DROP TABLE category_notes_blob")
+
+
+def _partition_sections_by_user(db: sqlite3.Connection):
+    """Rebuild category_sections with an owner column, giving existing rows to DEFAULT_USER_ID.
+
+    Databases created by the old schema.sql have UNIQUE(category_id,
+    section_name, timestamp), which stops two users (or one batched turn)
+    from documenting a section in the same second, so the table is rebuilt
+    rather than altered. Ids and the AUTOINCREMENT counter carry over, since
+    clear markers rely on ids never being reused.
+    """
+    sequence = db.execute("SELECT seq FROM sqlite_sequence WHERE name = 'category_sections'").fetchone()
+    db.execute("ALTER TABLE category_sections RENAME TO category_sections_legacy")
+    db.execute("""
+        CREATE TABLE category_sections (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            category_id TEXT NOT NULL,
+            section_name TEXT NOT NULL,
+            observations TEXT,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            user_id TEXT NOT NULL DEFAULT 'default'
+        )
+    """)
+    db.execute("""
+        INSERT INTO category_sections (id, category_id, section_name, observations, timestamp, user_id)
+        SELECT id, category_id, section_name, observations, timestamp, ? FROM category_sections_legacy
+    """, (DEFAULT_USER_ID,))
+    # Dropping the old table drops its indexes; the migration recreates them
+    db.execute("DROP TABLE category_sections_legacy")
+    if sequence is not None:
+        updated = db.execute(
+            "UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'category_sections'", (sequence[0],)
+        ).rowcount
+        if not updated:
+            db.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('category_sections', ?)", (sequence[0],))
+
+
+def _assign_legacy_rows(db: sqlite3.Connection):
+    """Give notes and next steps written before user partitioning to DEFAULT_USER_ID"""
+    db.execute("UPDATE category_notes SET user_id = ?", (DEFAULT_USER_ID,))
+    db.execute("""
+        INSERT INTO category_data_by_user (user_id, category_id, next_steps)
+        SELECT ?, category_id, next_steps FROM category_data
+    """, (DEFAULT_USER_ID,))
+
+
+MIGRATIONS: List[Tuple[int, str, List[Step]]] = [
+    (1, 'Initial documentation schema', [
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            password TEXT NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS category_data (
+            category_id TEXT PRIMARY KEY,
+            next_steps TEXT
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS category_sections (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            category_id TEXT NOT NULL,
+            section_name TEXT NOT NULL,
+            observations TEXT,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS category_notes (
+            category_id TEXT PRIMARY KEY,
+            notes TEXT
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_category_sections ON category_sections(category_id)",
+        "CREATE INDEX IF NOT EXISTS idx_category_sections_timestamp ON category_sections(timestamp)",
+    ]),
+    (2, 'Server-side chat sessions', [
+        """
+        CREATE TABLE chat_sessions (
+            id TEXT PRIMARY KEY,
+            summary TEXT NOT NULL DEFAULT '',
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE chat_turns (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id TEXT NOT NULL REFERENCES chat_sessions(id) ON DELETE CASCADE,
+            role TEXT NOT NULL,
+            content TEXT NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        "CREATE INDEX idx_chat_turns_session ON chat_turns(session_id, id)",
+    ]),
+    (3, 'Append-only category notes', [
+        _split_category_notes,
+        "CREATE INDEX idx_category_notes ON category_notes(category_id, id)",
+    ]),
+    (4, 'Composite and partial indexes for section observations', [
+        # Superseded by the composite index, which has category_id as its prefix
+        "DROP INDEX IF EXISTS idx_category_sections",
+        "CREATE INDEX idx_category_sections_category_time ON category_sections(category_id, timestamp)",
+        # Covers the summary queries, which only ever read non-empty observations,
+        # so cleared rows never enter the range scan
+        """
+        CREATE INDEX idx_category_sections_live
+        ON category_sections(category_id, timestamp, section_name, observations)
+        WHERE observations != ''
+        """,
+    ]),
+    (5, 'Partition documentation by user', [
+        # Rows written before users were tracked belong to DEFAULT_USER_ID
+        _partition_sections_by_user,
+        "ALTER TABLE category_notes ADD COLUMN user_id TEXT NOT NULL DEFAULT 'default'",
+        """
+        CREATE TABLE category_data_by_user (
+            user_id TEXT NOT NULL DEFAULT 'default',
+            category_id TEXT NOT NULL,
+            next_steps TEXT,
+            PRIMARY KEY (user_id, category_id)
+        )
+        """,
+        _assign_legacy_rows,
+        "DROP TABLE category_data",
+        "ALTER TABLE category_data_by_user RENAME TO category_data",
+        # Every index leads with user_id, so one user's queries never range over other users' rows
+        "DROP INDEX IF EXISTS idx_category_sections_timestamp",
+        "DROP INDEX IF EXISTS idx_category_sections_category_time",
+        "DROP INDEX IF EXISTS idx_category_sections_live",
+        "DROP INDEX IF EXISTS idx_category_notes",
+        "CREATE INDEX idx_category_sections_category_time ON category_sections(user_id, category_id, timestamp)",
+        """
+        CREATE INDEX idx_category_sections_live
+        ON category_sections(user_id, category_id, timestamp, section_name, observations)
+        WHERE observations != ''
+        """,
+        """
+        CREATE INDEX idx_category_sections_user_time
+        ON category_sections(user_id, timestamp)
+        WHERE observations != ''
+        """,
+        "CREATE INDEX idx_category_notes ON category_notes(user_id, category_id, id)",
+    ]),
+    (6, 'Response and tool-plan cache', [
+        """
+        CREATE TABLE response_cache (
+            key TEXT PRIMARY KEY,
+            plan TEXT NOT NULL,
+            response TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            hits INTEGER NOT NULL DEFAULT 0
+        )
+        """,
+        "CREATE INDEX idx_response_cache_created ON response_cache(created_at)",
+    ]),
+    (7, 'Full-text search over observations and notes', [
+        # Rowids encode the source row: 2 * id for sections, 2 * id + 1 for
+        # notes, so the triggers update the index by rowid instead of scanning it
+        """
+        CREATE VIRTUAL TABLE doc_search USING fts5(
+            body,
+            kind UNINDEXED,
+            user_id UNINDEXED,
+            category_id UNINDEXED,
+            section_name UNINDEXED,
+            timestamp UNINDEXED,
+            tokenize = 'porter unicode61'
+        )
+        """,
+        """
+        CREATE TRIGGER doc_search_sections_insert AFTER INSERT ON category_sections
+        WHEN new.observations != ''
+        BEGIN
+            INSERT INTO doc_search (rowid, body, kind, user_id, category_id, section_name, timestamp)
+            VALUES (new.id * 2, new.observations, 'observation', new.user_id, new.category_id,
+                    new.section_name, new.timestamp);
+        END
+        """,
+        """
+        CREATE TRIGGER doc_search_sections_update AFTER UPDATE ON category_sections
+        BEGIN
+            DELETE FROM doc_search WHERE rowid = old.id * 2;
+            INSERT INTO doc_search (rowid, body, kind, user_id, category_id, section_name, timestamp)
+            SELECT new.id * 2, new.observations, 'observation', new.user_id, new.category_id,
+                   new.section_name, new.timestamp
+            WHERE new.observations != '';
+        END
+        """,
+        """
+        CREATE TRIGGER doc_search_sections_delete AFTER DELETE ON category_sections
+        BEGIN
+            DELETE FROM doc_search WHERE rowid = old.id * 2;
+        END
+        """,
+        """
+        CREATE TRIGGER doc_search_notes_insert AFTER INSERT ON category_notes
+        BEGIN
+            INSERT INTO doc_search (rowid, body, kind, user_id, category_id, section_name, timestamp)
+            VALUES (new.id * 2 + 1, new.note, 'note', new.user_id, new.category_id, NULL, new.timestamp);
+        END
+        """,
+        """
+        CREATE TRIGGER doc_search_notes_update AFTER UPDATE ON category_notes
+        BEGIN
+            DELETE FROM doc_search WHERE rowid = old.id * 2 + 1;
+            INSERT INTO doc_search (rowid, body, kind, user_id, category_id, section_name, timestamp)
+            VALUES (new.id * 2 + 1, new.note, 'note', new.user_id, new.category_id, NULL, new.timestamp);
+        END
+        """,
+        """
+        CREATE TRIGGER doc_search_notes_delete AFTER DELETE ON category_notes
+        BEGIN
+            DELETE FROM doc_search WHERE rowid = old.id * 2 + 1;
+        END
+        """,
+        """
+        INSERT INTO doc_search (rowid, body, kind, user_id, category_id, section_name, timestamp)
+        SELECT id * 2, observations, 'observation', user_id, category_id, section_name, timestamp
+        FROM category_sections WHERE observations != ''
+        """,
+        """
+        INSERT INTO doc_search (rowid, body, kind, user_id, category_id, section_name, timestamp)
+        SELECT id * 2 + 1, note, 'note', user_id, category_id, NULL, timestamp
+        FROM category_notes
+        """,
+    ]),
+    (8, 'Daily rollup of section observations', [
+        # One row per user, day and section that has live observations. Trend
+        # queries range over (user_id, day) and never touch category_sections.
+        """
+        CREATE TABLE daily_section_counts (
+            user_id TEXT NOT NULL,
+            day TEXT NOT NULL,
+            category_id TEXT NOT NULL,
+            section_name TEXT NOT NULL,
+            entries INTEGER NOT NULL,
+            PRIMARY KEY (user_id, day, category_id, section_name)
+        ) WITHOUT ROWID
+        """,
+        """
+        CREATE TRIGGER daily_section_counts_insert AFTER INSERT ON category_sections
+        WHEN new.observations != ''
+        BEGIN
+            INSERT INTO daily_section_counts (user_id, day, category_id, section_name, entries)
+            VALUES (new.user_id, date(new.timestamp), new.category_id, new.section_name, 1)
+            ON CONFLICT DO UPDATE SET entries = entries + 1;
+        END
+        """,
+        # Clearing blanks observations, so an update can take a row out of the
+        # rollup, put one back, or move it to another day or section
+        """
+        CREATE TRIGGER daily_section_counts_update AFTER UPDATE ON category_sections
+        BEGIN
+            UPDATE daily_section_counts SET entries = entries - 1
+            WHERE old.observations != ''
+            AND user_id = old.user_id AND day = date(old.timestamp)
+            AND category_id = old.category_id AND section_name = old.section_name;
+            INSERT INTO daily_section_counts (user_id, day, category_id, section_name, entries)
+            SELECT new.user_id, date(new.timestamp), new.category_id, new.section_name, 1
+            WHERE new.observations != ''
+            ON CONFLICT DO UPDATE SET entries = entries + 1;
+            DELETE FROM daily_section_counts
+            WHERE user_id = old.user_id AND day = date(old.timestamp)
+            AND category_id = old.category_id AND section_name = old.section_name
+            AND entries <= 0;
+        END
+        """,
+        """
+        CREATE TRIGGER daily_section_counts_delete AFTER DELETE ON category_sections
+        WHEN old.observations != ''
+        BEGIN
+            UPDATE daily_section_counts SET entries = entries - 1
+            WHERE user_id = old.user_id AND day = date(old.timestamp)
+            AND category_id = old.category_id AND section_name = old.section_name;
+            DELETE FROM daily_section_counts
+            WHERE user_id = old.user_id AND day = date(old.timestamp)
+            AND category_id = old.category_id AND section_name = old.section_name
+            AND entries <= 0;
+        END
+        """,
+        """
+        INSERT INTO daily_section_counts (user_id, day, category_id, section_name, entries)
+        SELECT user_id, date(timestamp), category_id, section_name, COUNT(*)
+        FROM category_sections WHERE observations != ''
+        GROUP BY user_id, date(timestamp), category_id, section_name
+        """,
+    ]),
+    (9, 'Clear categories with generation markers', [
+        # Clearing a category records the highest observation and note ids at
+        # that moment; rows at or below the marker are cleared and every read
+        # skips them. compaction.py archives or purges them later, in chunks.
+        """
+        CREATE TABLE category_clears (
+            user_id TEXT NOT NULL,
+            category_id TEXT NOT NULL,
+            section_id INTEGER NOT NULL DEFAULT 0,
+            note_id INTEGER NOT NULL DEFAULT 0,
+            cleared_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, category_id)
+        ) WITHOUT ROWID
+        """,
+        """
+        CREATE TABLE archived_category_sections (
+            id INTEGER PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            category_id TEXT NOT NULL,
+            section_name TEXT NOT NULL,
+            observations TEXT,
+            timestamp DATETIME,
+            archived_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE archived_category_notes (
+            id INTEGER PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            category_id TEXT NOT NULL,
+            note TEXT NOT NULL,
+            timestamp DATETIME,
+            archived_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        "CREATE INDEX idx_archived_category_sections ON archived_category_sections(user_id, category_id, timestamp)",
+        "CREATE INDEX idx_archived_category_notes ON archived_category_notes(user_id, category_id, id)",
+        # A clear drops the category's rollup rows itself, so compacting the
+        # cleared rows away must not take them out of the rollup a second time
+        "DROP TRIGGER daily_section_counts_update",
+        "DROP TRIGGER daily_section_counts_delete",
+        """
+        CREATE TRIGGER daily_section_counts_update AFTER UPDATE ON category_sections
+        BEGIN
+            UPDATE daily_section_counts SET entries = entries - 1
+            WHERE old.observations != ''
+            AND old.id > COALESCE((SELECT section_id FROM category_clears AS clears
+                                   WHERE clears.user_id = old.user_id AND clears.category_id = old.category_id), 0)
+            AND user_id = old.user_id AND day = date(old.timestamp)
+            AND category_id = old.category_id AND section_name = old.section_name;
+            INSERT INTO daily_section_counts (user_id, day, category_id, section_name, entries)
+            SELECT new.user_id, date(new.timestamp), new.category_id, new.section_name, 1
+            WHERE new.observations != ''
+            AND new.id > COALESCE((SELECT section_id FROM category_clears AS clears
+                                   WHERE clears.user_id = new.user_id AND clears.category_id = new.category_id), 0)
+            ON CONFLICT DO UPDATE SET entries = entries + 1;
+            DELETE FROM daily_section_counts
+            WHERE user_id = old.user_id AND day = date(old.timestamp)
+            AND category_id = old.category_id AND section_name = old.section_name
+            AND entries <= 0;
+        END
+        """,
+        """
+        CREATE TRIGGER daily_section_counts_delete AFTER DELETE ON category_sections
+        WHEN old.observations != ''
+        AND old.id > COALESCE((SELECT section_id FROM category_clears AS clears
+                               WHERE clears.user_id = old.user_id AND clears.category_id = old.category_id), 0)
+        BEGIN
+            UPDATE daily_section_counts SET entries = entries - 1
+            WHERE user_id = old.user_id AND day = date(old.timestamp)
+            AND category_id = old.category_id AND section_name = old.section_name;
+            DELETE FROM daily_section_counts
+            WHERE user_id = old.user_id AND day = date(old.timestamp)
+            AND category_id = old.category_id AND section_name = old.section_name
+            AND entries <= 0;
+        END
+        """,
+    ]),
+]
+
+
+def _ensure_version_table(db: sqlite3.Connection):
+    """Create the schema_version bookkeeping table"""
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+def current_version(db: sqlite3.Connection) -> int:
+    """Get the highest applied migration version (0 for an empty database)"""
+    exists = db.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'schema_version'"
+    ).fetchone()
+    if not exists:
+        return 0
+    row = db.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+
+def latest_version() -> int:
+    """Get the version the schema will be at once all migrations are applied"""
+    return MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+
+def migrate(pool: ConnectionPool = None) -> int:
+    """Apply all pending migrations and return the resulting schema version"""
+    pool = pool or get_pool()
+    db = pool.acquire()
+    try:
+        _ensure_version_table(db)
+        for version, description, steps in MIGRATIONS:
+            if version <= current_version(db):
+                continue
+            # BEGIN IMMEDIATE takes the write lock up front, so when several
+            # workers boot at once only one applies each migration
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                if version <= current_version(db):
+                    db.rollback()
+                    continue
+                for step in steps:
+                    if callable(step):
+                        step(db)
+                    else:
+                        db.execute(step)
+                db.execute(
+                    "INSERT INTO schema_version (version, description) VALUES (?, ?)",
+                    (version, description)
+                )
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+            print(f"Applied migration {version}: {description}")
+        return current_version(db)
+    finally:
+        pool.release(db)
+
+
+def drop_all(pool: ConnectionPool = None):
+    """Drop every table so the next migrate() rebuilds the schema from scratch"""
+    pool = pool or get_pool()
+    with pool.connection() as db:
+        tables = [
+            row[0] for row in db.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' "
+                # Virtual tables go first so they drop their own shadow tables
+                "ORDER BY sql LIKE 'CREATE VIRTUAL%' DESC"
+            )
+        ]
+        for table in tables:
+            db.execute(f'DROP TABLE IF EXISTS "{table}"')
+
+
+if __name__ == "__main__":
+    print(f"Database schema at version {migrate()}")
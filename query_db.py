@@ -1,34 +1,36 @@
 #!/usr/bin/env python3
-import sqlite3
-import os
+from collections import Counter
+from shards import query_all_shards, shard_mode
+from storage import default_db_path
 
 def query_db():
-    """Query the database tables and show their contents"""
-    db_path = '/app/data/therapy.db'
-    
-    print(f"Querying database at {db_path}")
-    
-    with sqlite3.connect(db_path) as db:
-        # Query category_data table
-        print("\nExecuting: SELECT * FROM category_data")
-        cur = db.execute("SELECT * FROM category_data")
-        rows = cur.fetchall()
-        print("\nCategory Data:")
-        for row in rows:
-            print(f"category_id: {row[0]}")
-            print(f"observations: {row[1]}")
-            print(f"next_steps: {row[2]}")
-            print("---")
-            
-        # Query category_notes table
-        print("\nExecuting: SELECT * FROM category_notes")
-        cur = db.execute("SELECT * FROM category_notes")
-        rows = cur.fetchall()
-        print("\nCategory Notes:")
-        for row in rows:
-            print(f"category_id: {row[0]}")
-            print(f"notes: {row[1]}")
-            print("---")
+    """Query the documentation tables of every shard and show their contents"""
+    db_path = default_db_path()
+
+    print(f"Querying database at {db_path} (sharding: {shard_mode()})")
+
+    # Query category_data table
+    print("\nExecuting: SELECT user_id, category_id, next_steps FROM category_data")
+    print("\nCategory Data:")
+    for shard, row in query_all_shards("SELECT user_id, category_id, next_steps FROM category_data", db_path=db_path):
+        print(f"shard: {shard}")
+        print(f"user_id: {row['user_id']}")
+        print(f"category_id: {row['category_id']}")
+        print(f"next_steps: {row['next_steps']}")
+        print("---")
+
+    # Count rows per user across shards instead of dumping every note
+    print("\nExecuting: SELECT user_id, category_id, COUNT(*) FROM category_notes GROUP BY user_id, category_id")
+    print("\nCategory Notes:")
+    totals = Counter()
+    for shard, row in query_all_shards(
+        "SELECT user_id, category_id, COUNT(*) AS notes FROM category_notes GROUP BY user_id, category_id",
+        db_path=db_path
+    ):
+        totals[row['user_id']] += row['notes']
+        print(f"user_id: {row['user_id']}, category_id: {row['category_id']}, notes: {row['notes']}")
+    for user_id, count in sorted(totals.items()):
+        print(f"Total notes for {user_id}: {count}")
 
 if __name__ == "__main__":
     query_db()
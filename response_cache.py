@@ -0,0 +1,160 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from storage import ConnectionPool, get_pool
+
+# Entries kept in memory per process; 0 turns the cache off
+DEFAULT_CACHE_SIZE = int(os.environ.get('RESPONSE_CACHE_SIZE', '1024'))
+# How long a cached reply stays valid, in seconds
+DEFAULT_CACHE_TTL = float(os.environ.get('RESPONSE_CACHE_TTL', '86400'))
+
+# Trailing chat messages a cached reply depends on, besides the conversation state
+CONTEXT_MESSAGES = 4
+
+# Expired rows are pruned from the table after this many stores
+PRUNE_EVERY = 256
+
+# Tools whose calls may be replayed. Reads are excluded because a reply built
+# from their results goes stale, and clears because replaying them is destructive.
+REPLAYABLE_TOOLS = frozenset({
+    'set_category_section_observations',
+    'set_category_next_steps',
+    'add_category_notes',
+})
+
+# A tool plan is a list of (tool name, arguments) pairs
+Plan = List[Tuple[str, Dict]]
+
+
+def normalize_message(message: str) -> str:
+    """Normalize a message so trivially different phrasings share a cache entry"""
+    text = ' '.join(message.lower().split())
+    text = text.replace('’', "'").replace('‘', "'")
+    # Trailing punctuation and emphasis ("thanks!!", "bye.") don't change what gets documented
+    return re.sub(r'[\s.!?,;:~]+$', '', text)
+
+
+def cache_key(message: str, context: str = '') -> str:
+    """Build the cache key for a message in a context"""
+    return hashlib.sha256(f"{context}\0{normalize_message(message)}".encode('utf-8')).hexdigest()
+
+
+def is_cacheable(plan: Plan, outputs: List[str]) -> bool:
+    """Check whether a turn's tool calls can safely be replayed later"""
+    return (
+        all(name in REPLAYABLE_TOOLS for name, _ in plan)
+        and not any(str(output).startswith('Error') for output in outputs)
+    )
+
+
+class ResponseCache:
+    """Replies and tool-call plans of previous turns, keyed by normalized message and context.
+
+    Lookups go to an in-memory LRU first and then to the ``response_cache``
+    table, so entries survive restarts and are shared between worker
+    processes. Entries expire ``ttl`` seconds after they were stored.
+    """
+
+    def __init__(self, pool: Optional[ConnectionPool] = None, max_entries: int = DEFAULT_CACHE_SIZE,
+                 ttl: float = DEFAULT_CACHE_TTL):
+        """Initialize the cache"""
+        self.pool = pool or get_pool()
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: 'OrderedDict[str, Tuple[float, Plan, str]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'memory_hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+
+    def get(self, key: str) -> Optional[Tuple[Plan, str]]:
+        """Get the (plan, response) cached under a key, or None"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if now - entry[0] < self.ttl:
+                    self._entries.move_to_end(key)
+                    self._stats['hits'] += 1
+                    self._stats['memory_hits'] += 1
+                    return entry[1], entry[2]
+                del self._entries[key]
+
+        with self.pool.connection() as db:
+            row = db.execute(
+                "SELECT created_at, plan, response FROM response_cache WHERE key = ? AND created_at > ?",
+                (key, now - self.ttl)
+            ).fetchone()
+            if row is not None:
+                db.execute("UPDATE response_cache SET hits = hits + 1 WHERE key = ?", (key,))
+
+        with self._lock:
+            if row is None:
+                self._stats['misses'] += 1
+                return None
+            self._stats['hits'] += 1
+            plan = [(name, arguments) for name, arguments in json.loads(row[1])]
+            self._remember(key, (row[0], plan, row[2]))
+            return plan, row[2]
+
+    def put(self, key: str, plan: Plan, response: str):
+        """Cache a turn's plan and response"""
+        now = time.time()
+        with self.pool.connection() as db:
+            db.execute("""
+                INSERT OR REPLACE INTO response_cache (key, plan, response, created_at)
+                VALUES (?, ?, ?, ?)
+            """, (key, json.dumps(plan), response, now))
+            with self._lock:
+                self._remember(key, (now, list(plan), response))
+                self._stats['stores'] += 1
+                prune = self._stats['stores'] % PRUNE_EVERY == 0
+            if prune:
+                db.execute("DELETE FROM response_cache WHERE created_at <= ?", (now - self.ttl,))
+
+    def clear(self):
+        """Drop every cached entry"""
+        with self.pool.connection() as db:
+            db.execute("DELETE FROM response_cache")
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        """Get hit/miss counters and the hit rate for this process"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+    def _remember(self, key: str, entry: Tuple[float, Plan, str]):
+        """Add an entry to the in-memory LRU; the caller holds the lock"""
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats['evictions'] += 1
+
+
+_caches: Dict[tuple, ResponseCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_response_cache(db_path: Optional[str] = None) -> Optional[ResponseCache]:
+    """Get the process-wide response cache for a database, or None when caching is off"""
+    if DEFAULT_CACHE_SIZE <= 0:
+        return None
+    pool = get_pool(db_path)
+    key = (os.getpid(), pool.db_path)
+    cache = _caches.get(key)
+    if cache is None:
+        with _caches_lock:
+            cache = _caches.get(key)
+            if cache is None:
+                cache = ResponseCache(pool)
+                _caches[key] = cache
+    return cache
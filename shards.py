@@ -0,0 +1,162 @@
+"""Optional database-per-tenant storage.
+
+With ``DB_SHARD_MODE=user`` every user's documentation lives in its own
+SQLite file. With ``DB_SHARD_MODE=hash`` users are spread over
+``DB_SHARD_COUNT`` files by a stable hash of their id. Either way, writers
+for users on different shards never wait on the same SQLite lock. Shard
+files are created and migrated lazily on first use. Only a bounded LRU of
+shard pools stays open per process. The default mode, ``off``, keeps
+everything in the main database.
+"""
+import glob
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Optional, Tuple
+from migrations import migrate
+from storage import ConnectionPool, default_db_path, get_pool
+
+SHARD_MODES = ('off', 'user', 'hash')
+
+# Shards see one user (or a few) each, so they need far fewer connections than the main pool
+SHARD_POOL_SIZE = 2
+
+
+def shard_mode() -> str:
+    """Get the configured sharding mode"""
+    mode = os.environ.get('DB_SHARD_MODE', 'off')
+    if mode not in SHARD_MODES:
+        raise ValueError(f"Invalid DB_SHARD_MODE: {mode}")
+    return mode
+
+
+class ShardRouter:
+    """Maps user ids to shard files and keeps an LRU of open shard pools"""
+
+    def __init__(self, shard_dir: str, mode: str = 'user', shard_count: int = 16, max_open: int = 64):
+        """Initialize the router; no files are created until a shard is used"""
+        if mode not in ('user', 'hash'):
+            raise ValueError(f"Invalid shard mode: {mode}")
+        if shard_count < 1 or max_open < 1:
+            raise ValueError("shard_count and max_open must be positive")
+        self.shard_dir = shard_dir
+        self.mode = mode
+        self.shard_count = shard_count
+        self.max_open = max_open
+        self._pools: 'OrderedDict[str, ConnectionPool]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def shard_path(self, user_id: str) -> str:
+        """Get the file that holds a user's data"""
+        digest = hashlib.sha256(user_id.encode('utf-8')).hexdigest()
+        if self.mode == 'hash':
+            name = f"shard-{int(digest[:16], 16) % self.shard_count:04d}.db"
+        else:
+            # Readable prefix for operators, digest suffix so distinct ids never collide
+            slug = re.sub(r'[^A-Za-z0-9_-]', '_', user_id)[:32]
+            name = f"user-{slug}-{digest[:12]}.db"
+        return os.path.join(self.shard_dir, name)
+
+    def pool_for(self, user_id: str) -> ConnectionPool:
+        """Get the connection pool of a user's shard, creating the shard if needed"""
+        path = self.shard_path(user_id)
+        with self._lock:
+            pool = self._pools.get(path)
+            if pool is not None:
+                self._pools.move_to_end(path)
+                return pool
+
+        # Migrate outside the lock so opening one new shard doesn't stall every other user
+        os.makedirs(self.shard_dir, exist_ok=True)
+        pool = ConnectionPool(path, size=SHARD_POOL_SIZE)
+        migrate(pool)
+
+        with self._lock:
+            existing = self._pools.get(path)
+            if existing is not None:
+                # Another thread opened the same shard first
+                pool.close()
+                self._pools.move_to_end(path)
+                return existing
+            self._pools[path] = pool
+            while len(self._pools) > self.max_open:
+                # Callers may still hold the evicted pool, so it keeps serving them
+                # and closes each connection as it is released
+                _, evicted = self._pools.popitem(last=False)
+                evicted.retire()
+        return pool
+
+    def shard_paths(self) -> List[str]:
+        """List the shard files that exist on disk"""
+        pattern = 'shard-*.db' if self.mode == 'hash' else 'user-*.db'
+        return sorted(glob.glob(os.path.join(self.shard_dir, pattern)))
+
+    @property
+    def open_shards(self) -> int:
+        """Number of shard pools currently open"""
+        return len(self._pools)
+
+    def close(self):
+        """Close every open shard pool"""
+        with self._lock:
+            while self._pools:
+                self._pools.popitem()[1].close()
+
+
+_routers: Dict[tuple, ShardRouter] = {}
+_routers_lock = threading.Lock()
+
+
+def get_router(db_path: Optional[str] = None) -> ShardRouter:
+    """Get the process-wide router for the configured sharding mode"""
+    db_path = db_path or default_db_path()
+    if db_path == ':memory:':
+        raise ValueError("Sharding needs a database on disk")
+    mode = shard_mode()
+    shard_dir = os.environ.get('DB_SHARD_DIR') or os.path.join(os.path.dirname(os.path.abspath(db_path)), 'shards')
+    shard_count = int(os.environ.get('DB_SHARD_COUNT', '16'))
+    # Key on the pid so a forked worker never reuses its parent's connections
+    key = (os.getpid(), mode, shard_dir, shard_count)
+    router = _routers.get(key)
+    if router is None:
+        with _routers_lock:
+            router = _routers.get(key)
+            if router is None:
+                router = ShardRouter(
+                    shard_dir,
+                    mode=mode,
+                    shard_count=shard_count,
+                    max_open=int(os.environ.get('DB_SHARD_CACHE', '64'))
+                )
+                _routers[key] = router
+    return router
+
+
+def get_user_pool(user_id: str, db_path: Optional[str] = None) -> ConnectionPool:
+    """Get the pool that holds a user's documentation"""
+    if shard_mode() == 'off':
+        return get_pool(db_path)
+    return get_router(db_path).pool_for(user_id)
+
+
+def query_all_shards(sql: str, params: Tuple = (), db_path: Optional[str] = None) -> Iterator[Tuple[str, sqlite3.Row]]:
+    """Run a read-only query on every shard, yielding (shard file, row) pairs.
+
+    Shards are opened read-only one at a time, outside the LRU, so admin
+    queries neither create shards nor evict the app's open pools.
+    """
+    if shard_mode() == 'off':
+        paths = [db_path or default_db_path()]
+    else:
+        paths = get_router(db_path).shard_paths()
+    for path in paths:
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        conn.row_factory = sqlite3.Row
+        try:
+            for row in conn.execute(sql, params):
+                yield path, row
+        finally:
+            conn.close()
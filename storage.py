@@ -0,0 +1,264 @@
+import functools
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+import metrics
+
+# Pragmas applied to every pooled connection. WAL lets readers proceed while a
+# writer holds the lock, and busy_timeout makes writers wait instead of failing
+# immediately with "database is locked".
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -16000,  # negative means KiB, so ~16MB of page cache
+    'mmap_size': 268435456,  # 256MB
+    'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', '5000')),
+    'temp_store': 'MEMORY',
+    'foreign_keys': 'ON',
+}
+
+DEFAULT_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', '5'))
+
+
+def default_db_path() -> str:
+    """Get the database path configured for this process"""
+    return os.environ.get('DATABASE', '/app/data/therapy.db')
+
+
+def _operation(sql: str) -> str:
+    """Get the statement keyword (SELECT, INSERT, ...) a query is labeled with in metrics"""
+    words = sql.split(None, 1)
+    return words[0].upper() if words else 'EMPTY'
+
+
+class TimedConnection(sqlite3.Connection):
+    """Connection that records how long each statement and commit takes.
+
+    A SELECT is timed up to its first row. A write includes the time spent
+    waiting for the database's write lock (up to busy_timeout).
+    """
+
+    def execute(self, sql, parameters=()):
+        """Run a statement, timing it"""
+        return self._timed(_operation(sql), super().execute, sql, parameters)
+
+    def executemany(self, sql, parameters):
+        """Run a statement for every parameter set, timing the whole batch"""
+        return self._timed(_operation(sql), super().executemany, sql, parameters)
+
+    def commit(self):
+        """Commit the open transaction, timing it"""
+        return self._timed('COMMIT', super().commit)
+
+    @staticmethod
+    def _timed(operation: str, fn: Callable, *args):
+        """Call fn, recording its duration and whether it failed on a lock"""
+        started = time.perf_counter()
+        locked = False
+        try:
+            return fn(*args)
+        except sqlite3.OperationalError as e:
+            locked = 'locked' in str(e) or 'busy' in str(e)
+            raise
+        finally:
+            metrics.observe_statement(operation, time.perf_counter() - started, locked)
+
+
+class ConnectionPool:
+    """Thread-safe pool of SQLite connections to a single database file"""
+
+    def __init__(self, db_path: str, size: int = DEFAULT_POOL_SIZE, timeout: float = 30.0,
+                 pragmas: Optional[Dict] = None):
+        """Initialize the pool; connections are opened lazily"""
+        self.db_path = db_path
+        # Every connection to :memory: is a separate database, so share exactly one
+        self.size = 1 if db_path == ':memory:' else size
+        self.timeout = timeout
+        self.pragmas = dict(DEFAULT_PRAGMAS if pragmas is None else pragmas)
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._closed = False
+        self._retired = False
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open and configure a new connection"""
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.timeout,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            check_same_thread=False,
+            factory=TimedConnection if metrics.METRICS_ENABLED else sqlite3.Connection
+        )
+        conn.row_factory = sqlite3.Row
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    def acquire(self, timeout: Optional[float] = None) -> sqlite3.Connection:
+        """Check out a connection, opening one if the pool is not yet full"""
+        started = time.perf_counter()
+        conn = self._acquire(timeout)
+        metrics.observe_pool_wait(time.perf_counter() - started)
+        return conn
+
+    def _acquire(self, timeout: Optional[float]) -> sqlite3.Connection:
+        """Check out a connection without timing the wait"""
+        if self._closed:
+            raise RuntimeError(f"Connection pool for {self.db_path} is closed")
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            build = self._created < self.size
+            if build:
+                self._created += 1
+        if build:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        return self._idle.get(timeout=self.timeout if timeout is None else timeout)
+
+    def release(self, conn: sqlite3.Connection):
+        """Return a connection to the pool, rolling back anything left uncommitted"""
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            if self._retired:
+                # A retired pool keeps no idle connections; a late checkout opens a new one
+                self._created -= 1
+            elif not self._closed:
+                self._idle.put(conn)
+                return
+        conn.close()
+
+    @contextmanager
+    def connection(self):
+        """Check out a connection for one unit of work.
+
+        Commits when the block exits normally and rolls back if it raises.
+        """
+        conn = self.acquire()
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            self.release(conn)
+
+    def retire(self):
+        """Close idle connections now and checked-out ones as they are released.
+
+        Unlike close(), later checkouts still succeed, so callers that got the
+        pool before it was dropped from a cache (like the shard LRU) finish
+        their work instead of failing.
+        """
+        with self._lock:
+            self._retired = True
+            while True:
+                try:
+                    conn = self._idle.get_nowait()
+                except queue.Empty:
+                    break
+                self._created -= 1
+                conn.close()
+
+    def close(self):
+        """Close all idle connections and refuse further checkouts"""
+        self._closed = True
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+
+
+class AsyncConnectionPool:
+    """Asyncio front end for a ConnectionPool.
+
+    sqlite3 has no async API, so calls run on a dedicated executor sized to
+    the pool. The event loop never blocks on disk I/O or lock waits, and at
+    most ``pool.size`` queries are in flight at once.
+    """
+
+    def __init__(self, pool: ConnectionPool):
+        """Initialize the executor for a pool"""
+        self.pool = pool
+        self._executor = ThreadPoolExecutor(
+            max_workers=pool.size,
+            thread_name_prefix='sqlite'
+        )
+
+    async def call(self, fn: Callable, *args, **kwargs) -> Any:
+        """Run a blocking storage function on the executor"""
+        # Imported here so sync entry points don't pay for asyncio at startup
+        import asyncio
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+
+    async def execute(self, sql: str, params: tuple = ()) -> List[sqlite3.Row]:
+        """Run one statement as its own unit of work and return all rows"""
+        def run():
+            with self.pool.connection() as db:
+                return db.execute(sql, params).fetchall()
+        return await self.call(run)
+
+    def close(self):
+        """Shut down the executor"""
+        self._executor.shutdown(wait=False)
+
+
+_pools: Dict[tuple, ConnectionPool] = {}
+_async_pools: Dict[tuple, AsyncConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path: Optional[str] = None) -> ConnectionPool:
+    """Get the process-wide connection pool for a database path"""
+    db_path = db_path or default_db_path()
+    # Key on the pid so a forked worker never reuses its parent's connections
+    key = (os.getpid(), db_path)
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = ConnectionPool(db_path)
+                _pools[key] = pool
+    return pool
+
+
+def get_async_pool(db_path: Optional[str] = None) -> AsyncConnectionPool:
+    """Get the process-wide async front end for a database path"""
+    pool = get_pool(db_path)
+    key = (os.getpid(), pool.db_path)
+    async_pool = _async_pools.get(key)
+    if async_pool is None:
+        with _pools_lock:
+            async_pool = _async_pools.get(key)
+            if async_pool is None:
+                async_pool = AsyncConnectionPool(pool)
+                _async_pools[key] = async_pool
+    return async_pool
+
+
+def close_pools():
+    """Close every pool owned by this process"""
+    with _pools_lock:
+        for key in [key for key in _async_pools if key[0] == os.getpid()]:
+            _async_pools.pop(key).close()
+        for key in [key for key in _pools if key[0] == os.getpid()]:
+            _pools.pop(key).close()
@@ -1,4 +1,3 @@
-import os
 import pytest
 
 @pytest.fixture(autouse=True)
@@ -16,3 +15,13 @@ def mock_openai():
     import openai
     openai.api_key = 'test-key-123'
     return openai
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    """Migrated on-disk database for tests that exercise real SQL."""
+    from migrations import migrate
+    from storage import get_pool
+    path = str(tmp_path / 'therapy.db')
+    monkeypatch.setenv('DATABASE', path)
+    migrate(get_pool(path))
+    return path
@@ -196,3 +196,162 @@ def test_categories_endpoint(client):
     assert len(data) > 0
     assert all(isinstance(cat, dict) for cat in data)
     assert all("id" in cat and "name" in cat for cat in data)
+
+
+class PooledBotStub:
+    """Stand-in for a pooled TherapyDocumentationBot"""
+    def __init__(self):
+        self.chat_history = []
+        self.conversation_summary = ""
+
+    def reset(self, chat_history=None, summary="", user_id=None):
+        self.chat_history = list(chat_history) if chat_history else []
+        self.conversation_summary = summary
+
+    def start_documentation(self):
+        return {"response": "Hey! What's up? How have you been doing?"}
+
+    def process_message(self, message):
+        from llama_index.core.base.llms.types import ChatMessage, MessageRole
+        reply = f"Noted: {message}"
+        self.chat_history.append(ChatMessage(role=MessageRole.USER, content=message))
+        self.chat_history.append(ChatMessage(role=MessageRole.ASSISTANT, content=reply))
+        return {"response": reply}
+
+    def stream_message(self, message):
+        yield {"type": "tool", "tool": "set_category_section_observations", "summary": "documented sleep/Dreams"}
+        for word in ["Noted: ", message]:
+            yield {"type": "token", "delta": word}
+        self.process_message(message)
+        yield {"type": "done", "response": f"Noted: {message}"}
+
+@pytest.fixture
+def pooled_client(db_path, monkeypatch):
+    """Test client backed by a migrated database and a pool of stub bots"""
+    import app as app_module
+    from bot.pool import BotPool
+    monkeypatch.setitem(app.config, "DATABASE", db_path)
+    monkeypatch.setattr(app_module, "_bot_pool", BotPool(size=1, factory=PooledBotStub))
+    app.config["TESTING"] = True
+    with app.test_client() as test_client:
+        test_client.post('/login', json={'username': 'test', 'password': 'test123'})
+        yield test_client
+
+def test_chat_history_stays_server_side(pooled_client):
+    """The session cookie carries only an id, however long the chat runs"""
+    for i in range(30):
+        response = pooled_client.post('/chat-message', json={"message": f"message {i} " + "x" * 200})
+        assert response.status_code == 200
+    with pooled_client.session_transaction() as sess:
+        assert 'chat_history' not in sess
+        assert 'chat_session_id' in sess
+    cookie = pooled_client.get_cookie(app.config.get('SESSION_COOKIE_NAME', 'session'))
+    assert len(cookie.value) < 300
+
+def test_chat_history_restored_between_requests(pooled_client):
+    """A later request sees the turns of earlier ones"""
+    import app as app_module
+    pooled_client.post('/chat-message', json={"message": "slept well"})
+    with pooled_client.session_transaction() as sess:
+        session_id = sess['chat_session_id']
+    history, _ = app_module.get_chat_store().load(session_id)
+    assert [msg['content'] for msg in history] == ["slept well", "Noted: slept well"]
+
+def test_categories_and_data_without_agent(pooled_client):
+    """Read-only endpoints never check a bot out of the pool"""
+    import app as app_module
+    assert pooled_client.get('/categories').status_code == 200
+    assert pooled_client.get('/get-all-data').status_code == 200
+    assert app_module._bot_pool.created == 0
+
+def test_chat_stream_emits_server_sent_events(pooled_client):
+    """/chat-stream sends tool, token and done events and stores the turn"""
+    import json
+    import app as app_module
+    response = pooled_client.post('/chat-stream', json={"message": "no dreams"})
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    events = [
+        json.loads(block.split('data: ', 1)[1])
+        for block in response.get_data(as_text=True).strip().split('\n\n')
+    ]
+    assert [event['type'] for event in events] == ['tool', 'token', 'token', 'done']
+    assert events[-1]['response'] == "Noted: no dreams"
+    with pooled_client.session_transaction() as sess:
+        history, _ = app_module.get_chat_store().load(sess['chat_session_id'])
+    assert [msg['content'] for msg in history] == ["no dreams", "Noted: no dreams"]
+
+def test_notes_endpoint_paginates(pooled_client):
+    """/notes/<category_id> returns pages of notes with a cursor to older ones"""
+    for note in ["one", "two", "three"]:
+        pooled_client.post('/submit', json={"category_id": "sleep", "notes": note})
+    page = pooled_client.get('/notes/sleep?limit=2').get_json()
+    assert [note['note'] for note in page['notes']] == ["three", "two"]
+    page = pooled_client.get(f"/notes/sleep?limit=2&before={page['next_before_id']}").get_json()
+    assert [note['note'] for note in page['notes']] == ["one"]
+    assert pooled_client.get('/notes/nope').status_code == 400
+
+def test_categories_etag(pooled_client):
+    """/categories is served from the registry with an ETag clients can revalidate"""
+    from categories import get_categories
+    response = pooled_client.get('/categories')
+    assert response.get_json() == get_categories()
+    etag = response.headers['ETag']
+    response = pooled_client.get('/categories', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+
+def test_documentation_is_scoped_to_logged_in_user(pooled_client):
+    """Each login reads and writes only its own documentation"""
+    pooled_client.post('/submit', json={"category_id": "sleep", "next_steps": "Bed by 10"})
+    assert pooled_client.get('/get-all-data').get_json()['sleep']['next_steps'] == "Bed by 10"
+    pooled_client.post('/logout')
+    # Only 'test' can log in through /login, so sign a second user in through the session
+    with pooled_client.session_transaction() as sess:
+        sess['username'] = 'other'
+    assert pooled_client.get('/get-all-data').get_json()['sleep']['next_steps'] == ""
+
+def test_search_endpoint(pooled_client):
+    """/search returns ranked matches from observations and notes"""
+    pooled_client.post('/submit', json={"category_id": "sleep", "section_name": "Dreams",
+                                        "observations": "Dreamt about the ocean"})
+    pooled_client.post('/submit', json={"category_id": "social", "notes": "Called mom"})
+    data = pooled_client.get('/search?q=ocean').get_json()
+    assert [result['category_id'] for result in data['results']] == ["sleep"]
+    assert data['results'][0]['snippet'] == "Dreamt about the [ocean]"
+    assert pooled_client.get('/search?q=mom&category_id=sleep').get_json()['results'] == []
+    assert pooled_client.get('/search?q=mom&since=yesterday').status_code == 400
+
+def test_get_all_data_pages_history(pooled_client):
+    """/get-all-data with limit returns keyset pages of history"""
+    for value in ["one", "two", "three"]:
+        pooled_client.post('/submit', json={"category_id": "sleep", "section_name": "Dreams", "observations": value})
+    page = pooled_client.get('/get-all-data?limit=2').get_json()
+    assert [entry['observation'] for entry in page['entries']] == ["three", "two"]
+    page = pooled_client.get(f"/get-all-data?limit=2&cursor={page['next_cursor']}").get_json()
+    assert [entry['observation'] for entry in page['entries']] == ["one"]
+    assert page['next_cursor'] is None
+    assert pooled_client.get('/get-all-data?cursor=bogus').status_code == 400
+    # Without paging parameters the summary shape is unchanged
+    assert "sleep" in pooled_client.get('/get-all-data').get_json()
+
+def test_trends_endpoint(pooled_client):
+    """/trends reports per-category counts from the rollup"""
+    pooled_client.post('/submit', json={"category_id": "sleep", "section_name": "Dreams", "observations": "Flying"})
+    trends = pooled_client.get('/trends?days=7').get_json()
+    assert trends['categories']['sleep']['total'] == 1
+    assert len(trends['categories']['sleep']['series']) == 7
+    assert pooled_client.get('/trends?period=month').status_code == 400
+
+def test_metrics_endpoint(pooled_client):
+    """/metrics reports request, database and pool timings by route pattern"""
+    pooled_client.get('/notes/sleep')
+    pooled_client.post('/submit', json={"category_id": "sleep", "notes": "one"})
+    response = pooled_client.get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    body = response.get_data(as_text=True)
+    assert 'http_requests_total{method="GET",route="/notes/<category_id>",status="200"}' in body
+    assert 'http_request_duration_seconds_count{method="POST",route="/submit"}' in body
+    assert 'db_statement_duration_seconds_count{operation="INSERT"}' in body
+    assert 'db_pool_wait_seconds_count' in body
@@ -0,0 +1,169 @@
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+import pytest
+from asgiref.sync import SyncToAsync
+from llama_index.core.base.llms.types import ChatMessage, MessageRole
+import app as app_module
+from app import app
+from asgi import app as asgi_app
+from bot.pool import BotPool
+
+class AsyncBotStub:
+    """Stand-in for a pooled TherapyDocumentationBot on the async path"""
+    def __init__(self):
+        self.chat_history = []
+        self.conversation_summary = ""
+
+    def reset(self, chat_history=None, summary="", user_id=None):
+        self.chat_history = list(chat_history) if chat_history else []
+        self.conversation_summary = summary
+
+    async def aprocess_message(self, message):
+        await asyncio.sleep(0.05)  # Simulate waiting on the LLM
+        reply = f"Noted: {message}"
+        self.chat_history.append(ChatMessage(role=MessageRole.USER, content=message))
+        self.chat_history.append(ChatMessage(role=MessageRole.ASSISTANT, content=reply))
+        return {"response": reply}
+
+    async def astream_message(self, message):
+        yield {"type": "token", "delta": "Noted: "}
+        yield {"type": "token", "delta": message}
+        await self.aprocess_message(message)
+        yield {"type": "done", "response": f"Noted: {message}"}
+
+@pytest.fixture
+def asgi_env(db_path, monkeypatch):
+    """Point the app at a migrated database and a pool of async stub bots"""
+    monkeypatch.setitem(app.config, "DATABASE", db_path)
+    monkeypatch.setattr(app_module, "_bot_pool", BotPool(size=8, factory=AsyncBotStub))
+    app.config["TESTING"] = True
+
+def asgi_client():
+    """Create a client that talks to the ASGI app in-process"""
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=asgi_app), base_url="http://testserver")
+
+async def login(client):
+    """Log in through the Flask passthrough"""
+    response = await client.post('/login', json={'username': 'test', 'password': 'test123'})
+    assert response.status_code == 200
+
+def test_chat_message_requires_login(asgi_env):
+    """The async route keeps the Flask route's 401 contract"""
+    async def run():
+        async with asgi_client() as client:
+            response = await client.post('/chat-message', json={"message": "hi"})
+            assert response.status_code == 401
+            assert response.json() == {"error": "Not logged in"}
+    asyncio.run(run())
+
+def test_chat_message_async(asgi_env):
+    """Chat turns are answered and stored through the async path"""
+    async def run():
+        async with asgi_client() as client:
+            await login(client)
+            response = await client.post('/chat-message', json={})
+            assert response.status_code == 400
+            response = await client.post('/chat-message', json={"message": "slept well"})
+            assert response.status_code == 200
+            assert response.json() == {"response": "Noted: slept well"}
+            # The next request restores the stored turn into whichever bot it gets
+            response = await client.post('/chat-message', json={"message": "no dreams"})
+            assert response.status_code == 200
+    asyncio.run(run())
+    with app_module.get_pool(app.config["DATABASE"]).connection() as db:
+        assert db.execute("SELECT COUNT(*) FROM chat_sessions").fetchone()[0] == 1
+
+def test_concurrent_chats_share_one_process(asgi_env):
+    """Concurrent chats wait on the LLM together instead of one after another"""
+    async def run():
+        async with asgi_client() as client:
+            await login(client)
+            loop = asyncio.get_running_loop()
+            start = loop.time()
+            responses = await asyncio.gather(*[
+                client.post('/chat-message', json={"message": f"message {i}"})
+                for i in range(8)
+            ])
+            assert all(response.status_code == 200 for response in responses)
+            # Eight 50ms LLM calls run serially would take at least 400ms
+            assert loop.time() - start < 0.4
+    asyncio.run(run())
+
+def test_chats_queued_for_a_bot_hold_no_threads(asgi_env, monkeypatch):
+    """More chats than bots plus executor threads all finish instead of deadlocking"""
+    async def aprocess_message(self, message):
+        # The real bot runs its fast path, cache and flush on the default executor
+        await asyncio.to_thread(lambda: None)
+        await asyncio.sleep(0.01)
+        return {"response": f"Noted: {message}"}
+    monkeypatch.setattr(AsyncBotStub, "aprocess_message", aprocess_message)
+    monkeypatch.setattr(app_module, "_bot_pool", BotPool(size=2, factory=AsyncBotStub))
+
+    async def run():
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=2))
+        async with asgi_client() as client:
+            await login(client)
+            responses = await asyncio.wait_for(asyncio.gather(*[
+                client.post('/chat-message', json={"message": f"message {i}"})
+                for i in range(16)
+            ]), timeout=10)
+            assert [response.status_code for response in responses] == [200] * 16
+    asyncio.run(run())
+
+def test_chat_gets_503_when_no_bot_frees_up(asgi_env, monkeypatch):
+    """A chat that waits too long for a bot is turned away instead of queueing forever"""
+    import asgi
+    pool = BotPool(size=1, factory=AsyncBotStub)
+    monkeypatch.setattr(app_module, "_bot_pool", pool)
+    monkeypatch.setattr(asgi, "BOT_ACQUIRE_TIMEOUT", 0.05)
+    held = pool.acquire()
+
+    async def run():
+        async with asgi_client() as client:
+            await login(client)
+            response = await client.post('/chat-message', json={"message": "hi"})
+            assert response.status_code == 503
+            assert response.headers["retry-after"] == "1"
+    asyncio.run(run())
+    pool.release(held)
+
+def test_chat_stream_async(asgi_env):
+    """/chat-stream on the async path sends the same Server-Sent Events"""
+    async def run():
+        async with asgi_client() as client:
+            await login(client)
+            response = await client.post('/chat-stream', json={"message": "no dreams"})
+            assert response.status_code == 200
+            assert response.headers['content-type'].startswith('text/event-stream')
+            return response.text
+    text = asyncio.run(run())
+    events = [
+        json.loads(line[len('data: '):])
+        for line in text.splitlines()
+        if line.startswith('data: ')
+    ]
+    assert [event['type'] for event in events] == ["token", "token", "done"]
+    assert events[-1]["response"] == "Noted: no dreams"
+
+def test_other_routes_pass_through_to_flask(asgi_env):
+    """Routes without an async handler are served by the Flask app"""
+    async def run():
+        async with asgi_client() as client:
+            await login(client)
+            response = await client.get('/categories')
+            assert response.status_code == 200
+            assert len(response.json()) > 0
+    asyncio.run(run())
+
+def test_flask_requests_ignore_an_inherited_context(asgi_env):
+    """A Flask request started inside a previous request's context still gets a thread"""
+    async def run():
+        async with asgi_client() as client:
+            await login(client)
+            # uvicorn can start a keep-alive request in the context of the one before it
+            SyncToAsync.deadlock_context.set(True)
+            response = await client.get('/get-all-data?limit=5')
+            assert response.status_code == 200
+    asyncio.run(run())
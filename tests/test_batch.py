@@ -0,0 +1,71 @@
+import json
+from llama_index.core.base.llms.types import ChatMessage, ChatResponse, MessageRole
+from bot.batch import MicroBatcher, build_batch_messages, parse_batch_response
+from bot.llms import MockLLM
+from tools import TherapyDocTools
+
+SLEEP_CALL = {"tool": "set_category_section_observations",
+              "arguments": {"category_id": "sleep", "section_name": "Dreams", "observations": "No dreams"}}
+
+class ScriptedLLM:
+    """Answers each batch request with the next scripted reply"""
+    def __init__(self, *replies):
+        self.replies = list(replies)
+        self.requests = []
+
+    def chat(self, messages, **kwargs):
+        self.requests.append(messages)
+        return ChatResponse(message=ChatMessage(role=MessageRole.ASSISTANT, content=self.replies.pop(0)))
+
+def test_batch_request_numbers_lines():
+    """Lines are numbered in a single user message after the shared prompt"""
+    messages = build_batch_messages(["first  line", "second"])
+    assert [msg.role for msg in messages] == [MessageRole.SYSTEM, MessageRole.USER]
+    assert messages[1].content.endswith("1. first line\n2. second")
+
+def test_parse_keeps_only_clean_lines():
+    """Invalid, duplicated and out-of-range lines are left for the fallback"""
+    reply = "```json\n" + json.dumps({"results": [
+        {"line": 1, "calls": [SLEEP_CALL]},
+        {"line": 2, "calls": []},
+        {"line": 3, "calls": [{"tool": "clear_category", "arguments": {"category_id": "sleep"}}]},
+        {"line": 4, "calls": [{"tool": "add_category_notes", "arguments": {"category_id": "nope", "notes": "x"}}]},
+        {"line": 5, "calls": []},
+        {"line": 5, "calls": [SLEEP_CALL]},
+        {"line": 9, "calls": []},
+    ]}) + "\n```"
+    parsed = parse_batch_response(reply, 6)
+    assert parsed == {1: [("set_category_section_observations", SLEEP_CALL["arguments"])], 2: []}
+
+def test_parse_garbage_answers_nothing():
+    """An unparseable reply sends every line to the fallback"""
+    assert parse_batch_response("Sure! Here you go", 3) == {}
+
+def test_micro_batcher_writes_and_falls_back(db_path):
+    """Clean lines are written together; the rest go through the fallback one by one"""
+    tools = TherapyDocTools()
+    llm = ScriptedLLM(
+        json.dumps({"results": [{"line": 1, "calls": [SLEEP_CALL]}, {"line": 2, "calls": []}]}),
+        json.dumps({"results": [{"line": 1, "calls": [SLEEP_CALL]}]}),
+    )
+    fallen_back = []
+    batcher = MicroBatcher(llm, tools, batch_size=3, fallback=lambda line: fallen_back.append(line) or "ok")
+    lines = ["no dreams", "thanks", "mystery", "slept 8 hours", "no dreams again"]
+    results = list(batcher.run(lines))
+    assert [result["message"] for result in results] == lines
+    assert [result["source"] for result in results] == ["batch", "batch", "fallback", "fast_path", "batch"]
+    assert fallen_back == ["mystery"]
+    assert len(llm.requests) == 2
+    # The fast-path line never reaches the model
+    assert "slept 8 hours" not in llm.requests[1][1].content
+    sections = tools.get_category_summary(category_id="sleep")["sections"]
+    assert len(sections["Dreams"]) == 2
+    assert sections["Length of sleep"][0]["observation"] == "Slept 8 hours"
+    assert batcher.stats["fallback"] == 1 and batcher.stats["writes"] == 3
+
+def test_micro_batcher_with_mock_llm(db_path):
+    """The mock LLM answers batch requests for test mode"""
+    tools = TherapyDocTools()
+    results = list(MicroBatcher(MockLLM(), tools).run(["I slept well last night", "thanks"]))
+    assert [len(result["calls"]) for result in results] == [1, 0]
+    assert tools.get_category_summary(category_id="sleep")["sections"]["General notes"]
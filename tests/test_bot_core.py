@@ -0,0 +1,186 @@
+import pytest
+from llama_index.core.base.llms.types import MessageRole
+from bot.core import TherapyDocumentationBot
+from bot.llms import LatencyMockLLM
+
+@pytest.fixture
+def mock_llm_bot(db_path):
+    """Bot backed by real tools on a migrated database and the mock LLM"""
+    return TherapyDocumentationBot(test_mode=True)
+
+def test_mock_llm_documents_through_agent(mock_llm_bot):
+    """The mock LLM issues real tool calls through the function calling agent"""
+    mock_llm_bot.process_message("I slept well last night")
+    summary = mock_llm_bot.tools.get_category_summary(category_id="sleep")
+    assert summary["sections"]["General notes"][0]["observation"] == "Had a good night's sleep with no dreams"
+
+def test_latency_mock_llm_waits_and_documents(db_path):
+    """The load-test LLM follows its latency distribution and documents messages in real sections"""
+    llm = LatencyMockLLM(median_ms=20, p95_ms=40, tool_call_rate=1.0, seed=0)
+    latencies = sorted(llm.sample_latency() for _ in range(2000))
+    assert 0.017 < latencies[1000] < 0.023
+    assert 0.035 < latencies[1900] < 0.045
+    bot = TherapyDocumentationBot(test_mode=True, llm=llm)
+    bot.process_message("the garden looked lovely this afternoon")
+    entries = bot.tools.get_history(limit=5)["entries"]
+    assert [entry["observation"] for entry in entries] == ["the garden looked lovely this afternoon"]
+    with pytest.raises(ValueError):
+        LatencyMockLLM(median_ms=50, p95_ms=10)
+
+def test_latency_mock_llm_async_calls_hold_no_threads():
+    """Async calls wait on the event loop, so they overlap however small the executor is"""
+    import asyncio
+    from concurrent.futures import ThreadPoolExecutor
+    from llama_index.core.base.llms.types import ChatMessage
+    llm = LatencyMockLLM(median_ms=100, p95_ms=100)
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        loop.set_default_executor(ThreadPoolExecutor(max_workers=1))
+        start = loop.time()
+        messages = [ChatMessage(role=MessageRole.USER, content="hello")]
+        await asyncio.gather(*[llm.achat(messages) for _ in range(10)])
+        # Ten 100ms calls on one thread would take a second
+        assert loop.time() - start < 0.5
+    asyncio.run(run())
+
+def test_stream_message_events(mock_llm_bot):
+    """Streaming yields tool events, then tokens, then the full response"""
+    events = list(mock_llm_bot.stream_message("I slept well last night"))
+    types = [event["type"] for event in events]
+    assert types[0] == "tool"
+    assert events[0]["summary"] == "documented sleep/General notes"
+    assert "token" in types
+    assert types[-1] == "done"
+    streamed = "".join(event["delta"] for event in events if event["type"] == "token")
+    assert streamed == events[-1]["response"]
+    assert "slept well" in streamed
+
+def test_stream_message_updates_history(mock_llm_bot):
+    """A streamed turn is recorded in chat history and agent memory"""
+    list(mock_llm_bot.stream_message("hello there"))
+    assert [msg.role for msg in mock_llm_bot.chat_history] == [MessageRole.USER, MessageRole.ASSISTANT]
+    assert mock_llm_bot.chat_history[0].content == "hello there"
+    assert len(mock_llm_bot.agent.memory.get_all()) == 2
+
+def test_stream_empty_message(mock_llm_bot):
+    """An empty message yields a single done event"""
+    events = list(mock_llm_bot.stream_message(""))
+    assert len(events) == 1
+    assert "I'm sorry" in events[0]["response"]
+
+def test_aprocess_message_documents_through_agent(mock_llm_bot):
+    """The async path runs the same tool calls as process_message"""
+    import asyncio
+    result = asyncio.run(mock_llm_bot.aprocess_message("I slept well last night"))
+    assert "slept well" in result["response"]
+    summary = mock_llm_bot.tools.get_category_summary(category_id="sleep")
+    assert summary["sections"]["General notes"][0]["observation"] == "Had a good night's sleep with no dreams"
+    assert len(mock_llm_bot.chat_history) == 2
+
+def test_astream_message_matches_stream_message(mock_llm_bot):
+    """Async streaming yields the same event sequence as stream_message"""
+    import asyncio
+
+    async def collect():
+        return [event async for event in mock_llm_bot.astream_message("I slept well last night")]
+
+    events = asyncio.run(collect())
+    assert [event["type"] for event in events][0] == "tool"
+    assert events[-1]["type"] == "done"
+    streamed = "".join(event["delta"] for event in events if event["type"] == "token")
+    assert streamed == events[-1]["response"]
+
+def capture_llm_messages(bot, monkeypatch):
+    """Record the messages of every chat call the bot's LLM receives"""
+    calls = []
+    llm_class = type(bot.llm)
+    original = llm_class.chat
+    def chat(self, messages, **kwargs):
+        calls.append(list(messages))
+        return original(self, messages, **kwargs)
+    monkeypatch.setattr(llm_class, "chat", chat)
+    return calls
+
+def test_restored_history_is_sent_once(mock_llm_bot, monkeypatch):
+    """Restored turns reach the LLM as chat messages, not repeated inside the user message"""
+    from llama_index.core.base.llms.types import ChatMessage
+    mock_llm_bot.reset(chat_history=[
+        ChatMessage(role=MessageRole.USER, content="I went for a run"),
+        ChatMessage(role=MessageRole.ASSISTANT, content="Nice, how far?"),
+    ])
+    calls = capture_llm_messages(mock_llm_bot, monkeypatch)
+    mock_llm_bot.process_message("about five miles")
+    sent = calls[0]
+    contents = [str(msg.content) for msg in sent]
+    assert sum("I went for a run" in content for content in contents) == 1
+    assert sent[0].role == MessageRole.SYSTEM
+    assert sent[-1].content == "about five miles"
+
+def test_prompt_budget_folds_old_turns(mock_llm_bot, monkeypatch):
+    """History beyond the prompt budget is folded into the conversation state message"""
+    from llama_index.core.base.llms.types import ChatMessage
+    from bot.context import count_message_tokens
+    builder = mock_llm_bot.context_builder
+    monkeypatch.setattr(builder, "budget", builder.fixed_tokens + 300)
+    monkeypatch.setattr(builder, "state_budget", 100)
+    history = []
+    for turn in range(20):
+        history.append(ChatMessage(role=MessageRole.USER, content=f"turn {turn} " + "words " * 20))
+        history.append(ChatMessage(role=MessageRole.ASSISTANT, content=f"reply {turn}"))
+    mock_llm_bot.reset(chat_history=history)
+    calls = capture_llm_messages(mock_llm_bot, monkeypatch)
+    mock_llm_bot.process_message("hello")
+    sent = calls[0]
+    assert builder.fixed_tokens + count_message_tokens(sent[1:]) <= builder.budget
+    assert sent[1].role == MessageRole.SYSTEM
+    assert sent[1].content.startswith("Conversation state:")
+    assert "turn 0 " not in "".join(str(msg.content) for msg in sent[2:])
+    assert sent[2].role == MessageRole.USER
+    # The summary keeps the most recent of the folded turns
+    assert "reply 15" in mock_llm_bot.conversation_summary
+
+def test_turn_writes_are_flushed_together(mock_llm_bot, monkeypatch):
+    """All of a turn's tool calls are written in one bulk write"""
+    flushed = []
+    record_many = mock_llm_bot.tools.record_many
+    monkeypatch.setattr(mock_llm_bot.tools, "record_many",
+                        lambda calls: flushed.append(list(calls)) or record_many(calls))
+    mock_llm_bot.process_message("slept 7 hours, woke at 6am")
+    assert [len(calls) for calls in flushed] == [2]
+    list(mock_llm_bot.stream_message("I slept well last night"))
+    assert [len(calls) for calls in flushed] == [2, 1]
+
+def test_failed_commit_gives_error_response(mock_llm_bot, monkeypatch):
+    """A turn whose writes can't be committed answers like any other failed turn"""
+    import asyncio
+    import sqlite3
+    def record_many(calls):
+        raise sqlite3.OperationalError("database is locked")
+    monkeypatch.setattr(mock_llm_bot.tools, "record_many", record_many)
+    assert mock_llm_bot.process_message("I slept well last night") == {"response": "Error: database is locked"}
+    with pytest.raises(sqlite3.OperationalError):
+        mock_llm_bot.process_message("I slept well again", raise_errors=True)
+    result = asyncio.run(mock_llm_bot.aprocess_message("I slept well last night"))
+    assert result == {"response": "Error: database is locked"}
+    events = list(mock_llm_bot.stream_message("I slept well last night"))
+    assert events[-1] == {"type": "error", "response": "Error: database is locked"}
+
+    async def stream():
+        return [event async for event in mock_llm_bot.astream_message("I slept well last night")]
+    assert asyncio.run(stream())[-1] == {"type": "error", "response": "Error: database is locked"}
+
+def test_disconnected_stream_keeps_documented_writes(mock_llm_bot):
+    """Writes the client was told about in a tool event are committed even if it disconnects"""
+    import asyncio
+    events = mock_llm_bot.stream_message("I slept well last night")
+    assert next(events)["type"] == "tool"
+    events.close()
+    assert len(mock_llm_bot.tools.get_history(limit=5)["entries"]) == 1
+
+    async def run():
+        events = mock_llm_bot.astream_message("I slept well again last night")
+        assert (await events.__anext__())["type"] == "tool"
+        await events.aclose()
+    asyncio.run(run())
+    assert len(mock_llm_bot.tools.get_history(limit=5)["entries"]) == 2
@@ -0,0 +1,35 @@
+import dataclasses
+import pytest
+import categories
+
+def test_registry_indexes_are_frozen():
+    """The registry and its indexes cannot be changed at runtime"""
+    with pytest.raises(TypeError):
+        categories.CATEGORIES_BY_ID['new'] = None
+    with pytest.raises(TypeError):
+        categories.SECTIONS[('sleep', 'Naps')] = None
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        categories.CATEGORIES_BY_ID['sleep'].name = 'Rest'
+
+def test_get_categories_returns_copies():
+    """Callers may modify what get_categories returns without touching the registry"""
+    first = categories.get_categories()
+    first[0]['sections'].append('Extra')
+    first[0]['name'] = 'Changed'
+    assert categories.get_categories()[0] == dict(categories.CATEGORY_LIST[0], sections=list(categories.CATEGORY_LIST[0]['sections']))
+
+def test_validation():
+    """Unknown categories and sections raise ValueError"""
+    assert categories.validate_section('sleep', 'Dreams').name == 'Dreams'
+    with pytest.raises(ValueError, match="Invalid category"):
+        categories.validate_section('nope', 'Dreams')
+    with pytest.raises(ValueError, match="Invalid section"):
+        categories.validate_section('sleep', 'Nope')
+
+def test_prompt_guide_lists_every_section():
+    """The system prompt's category guide is generated from the registry"""
+    guide = categories.render_category_guide()
+    for category in categories.CATEGORIES:
+        assert f"- {category.id}: {category.name}" in guide
+        for section in category.sections:
+            assert f"'{section.name}'" in guide
@@ -0,0 +1,48 @@
+import pytest
+from chat_store import ChatSessionStore
+from storage import get_pool
+
+@pytest.fixture
+def store(db_path):
+    return ChatSessionStore(get_pool(db_path), max_turns=4, max_summary_chars=120)
+
+def turn(role, content):
+    return {'role': role, 'content': content}
+
+def test_load_returns_messages_in_order(store):
+    """Messages come back oldest first"""
+    session_id = store.create()
+    store.append(session_id, [turn('user', 'hi'), turn('assistant', 'hello')])
+    history, summary = store.load(session_id)
+    assert history == [turn('user', 'hi'), turn('assistant', 'hello')]
+    assert summary == ''
+
+def test_history_is_a_bounded_ring_buffer(store):
+    """Only the most recent max_turns messages are kept"""
+    session_id = store.create()
+    for i in range(10):
+        store.append(session_id, [turn('user', f'message {i}')])
+    history, summary = store.load(session_id)
+    assert [msg['content'] for msg in history] == ['message 6', 'message 7', 'message 8', 'message 9']
+    with store.pool.connection() as db:
+        assert db.execute("SELECT COUNT(*) FROM chat_turns WHERE session_id = ?", (session_id,)).fetchone()[0] == 4
+
+def test_evicted_turns_fold_into_bounded_summary(store):
+    """Evicted messages roll into the summary, which never exceeds its cap"""
+    session_id = store.create()
+    for i in range(40):
+        store.append(session_id, [turn('user', f'message {i}'), turn('assistant', f'reply {i}')])
+    _, summary = store.load(session_id)
+    assert 'User: message 37' in summary
+    assert 'message 0\n' not in summary
+    assert len(summary) <= 120
+
+def test_delete_removes_session(store):
+    """Deleting a session removes its messages too"""
+    session_id = store.create()
+    store.append(session_id, [turn('user', 'hi')])
+    store.delete(session_id)
+    assert not store.exists(session_id)
+    assert store.load(session_id) == ([], '')
+    with store.pool.connection() as db:
+        assert db.execute("SELECT COUNT(*) FROM chat_turns").fetchone()[0] == 0
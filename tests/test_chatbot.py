@@ -1,11 +1,11 @@
 import pytest
 from unittest.mock import Mock, patch, MagicMock
 from bot.core import TherapyDocumentationBot
-from llama_index.llms import ChatMessage, MessageRole, ChatResponse
+from llama_index.core.llms import ChatMessage, MessageRole, ChatResponse
 
 @pytest.fixture
 def mock_openai():
-    with patch('llama_index.llms.OpenAI') as mock:
+    with patch('bot.core.OpenAI') as mock:
         mock_instance = Mock()
         mock_instance.chat.return_value = ChatResponse(
             message=ChatMessage(
@@ -18,7 +18,7 @@ def mock_openai():
 
 @pytest.fixture
 def mock_tools():
-    mock_instance = Mock()
+    mock_instance = MagicMock()
     mock_instance.get_tools.return_value = [
         {
             'name': 'set_category_observations',
@@ -60,7 +60,8 @@ def mock_tools():
     return mock_instance
 
 @pytest.fixture
-def chatbot(mock_openai, mock_tools):
+def chatbot(db_path, mock_openai, mock_tools):
+    mock_tools.db_path = db_path
     with patch('bot.core.TherapyDocTools', return_value=mock_tools):
         bot = TherapyDocumentationBot(test_mode=True)
         return bot
@@ -93,12 +94,11 @@ def test_process_empty_message(chatbot):
     assert "I'm sorry" in response["response"]
     assert "tell me more" in response["response"]
 
-def test_process_message_error(chatbot, mock_openai):
+def test_process_message_error(chatbot):
     """Test error handling in message processing"""
-    # Make the agent raise an exception
-    mock_openai.return_value.chat.side_effect = Exception("Test error")
-    
-    response = chatbot.process_message("tell me about my progress")
+    # Make the agent's LLM raise an exception
+    with patch.object(type(chatbot.llm), 'chat', side_effect=Exception("Test error")):
+        response = chatbot.process_message("tell me about my progress")
     assert isinstance(response, dict)
     assert "response" in response
     assert "Error" in response["response"]
@@ -0,0 +1,94 @@
+import threading
+import time
+from bot.pool import BotPool
+from cli import RateLimitBackoff, is_rate_limit_error, percentile, run_parallel_batch
+
+class RateLimitError(Exception):
+    """Same class name as the OpenAI client's rate limit error"""
+
+class BatchBotStub:
+    """Stand-in for a pooled bot that answers slowly and can be rate limited"""
+    lock = threading.Lock()
+    active = 0
+    peak = 0
+    rate_limited = set()
+
+    def __init__(self):
+        self.chat_history = []
+
+    def reset(self, chat_history=None, summary="", user_id=None):
+        self.chat_history = list(chat_history) if chat_history else []
+
+    def process_message(self, message, raise_errors=False):
+        assert self.chat_history == []  # Every message gets a fresh conversation
+        with BatchBotStub.lock:
+            BatchBotStub.active += 1
+            BatchBotStub.peak = max(BatchBotStub.peak, BatchBotStub.active)
+            limited = message not in BatchBotStub.rate_limited and message.endswith("limit me")
+            if limited:
+                BatchBotStub.rate_limited.add(message)
+        time.sleep(0.05)
+        with BatchBotStub.lock:
+            BatchBotStub.active -= 1
+        if limited:
+            raise RateLimitError("Error code: 429 - Rate limit reached")
+        self.chat_history.append(message)
+        return {"response": f"Noted: {message.split('] ', 1)[1]}"}
+
+def test_parallel_batch_preserves_order_and_bounds_workers():
+    """Results come back in input order from at most N concurrent workers"""
+    BatchBotStub.peak = 0
+    messages = [f"message {i}" for i in range(12)]
+    pool = BotPool(size=3, factory=BatchBotStub)
+    start = time.monotonic()
+    results = list(run_parallel_batch(messages, pool, workers=3))
+    assert [result["response"]["response"] for result in results] == [f"Noted: {m}" for m in messages]
+    assert BatchBotStub.peak <= 3
+    assert pool.created <= 3
+    # Twelve 50ms calls take at least 600ms one after another
+    assert time.monotonic() - start < 0.5
+    assert all(result["latency"] >= 0.05 for result in results)
+
+def test_parallel_batch_retries_rate_limits():
+    """Rate-limited messages are retried after a backoff instead of failing"""
+    messages = ["first", "please limit me", "last"]
+    backoff = RateLimitBackoff(retries=2, base_delay=0.01)
+    results = list(run_parallel_batch(messages, BotPool(size=2, factory=BatchBotStub), workers=2, backoff=backoff))
+    assert [result["error"] for result in results] == [None, None, None]
+    assert [result["retries"] for result in results] == [0, 1, 0]
+
+def test_rate_limit_detection_and_percentile():
+    """Rate limit errors are recognized and percentiles use nearest rank"""
+    assert is_rate_limit_error(RateLimitError("slow down"))
+    assert not is_rate_limit_error(ValueError("bad input"))
+    assert percentile([1, 2, 3, 4], 50) == 2
+    assert percentile([1, 2, 3, 4], 95) == 4
+
+def test_read_only_entry_points_skip_llm_imports(db_path):
+    """--summary and app import never load the LLM or agent stack"""
+    import os
+    import subprocess
+    import sys
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    check = (
+        "import sys, runpy; sys.argv = ['cli.py', '--summary']; "
+        "runpy.run_path('cli.py', run_name='__main__'); import app; "
+        "heavy = [m for m in ('llama_index', 'openai', 'tiktoken') if m in sys.modules]; "
+        "assert not heavy, heavy"
+    )
+    proc = subprocess.run([sys.executable, '-c', check], cwd=root, capture_output=True, text=True,
+                          env=dict(os.environ, DATABASE=db_path))
+    assert proc.returncode == 0, proc.stderr
+
+def test_user_option_picks_whose_documentation(db_path, monkeypatch):
+    """--user documents as that login; without it the CLI uses the same default as the web login"""
+    import sys
+    import cli
+    from migrations import DEFAULT_USER_ID
+    seen = []
+    monkeypatch.setattr(cli, "get_history_summary", lambda c, days: seen.append(c.tools.user_id))
+    for argv in (['cli.py', '--summary', '--user', 'alice'], ['cli.py', '--summary']):
+        monkeypatch.setattr(sys, "argv", argv)
+        cli.main()
+    assert seen == ['alice', DEFAULT_USER_ID]
+    assert DEFAULT_USER_ID == 'test'
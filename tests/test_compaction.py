@@ -0,0 +1,69 @@
+import pytest
+from compaction import compact
+from tools import TherapyDocTools
+
+@pytest.fixture
+def tools(db_path):
+    return TherapyDocTools()
+
+def count(tools, sql):
+    with tools.pool.connection() as db:
+        return db.execute(sql).fetchone()[0]
+
+def test_clear_moves_marker_without_rewriting_rows(tools):
+    """Clearing hides a category's rows from every read but leaves them on disk"""
+    for number in range(3):
+        tools.set_category_section_observations(category_id='sleep', section_name='Dreams', observations=f'Ocean {number}')
+    tools.add_category_notes(category_id='sleep', notes='Ocean note')
+    cleared_id = tools.get_history()['entries'][0]['id']
+    
+    statements = []
+    with tools.pool.connection() as db:
+        db.set_trace_callback(statements.append)
+    try:
+        tools.clear_category(category_id='sleep')
+    finally:
+        with tools.pool.connection() as db:
+            db.set_trace_callback(None)
+    assert not any(' '.join(sql.split()).startswith('UPDATE category_sections') for sql in statements)
+    assert count(tools, "SELECT COUNT(*) FROM category_sections") == 3
+    
+    assert tools.get_category_summary(category_id='sleep') == {'sections': {}, 'next_steps': '', 'notes': ''}
+    assert tools.get_all_summaries()['sleep'] == {'sections': {}, 'next_steps': '', 'notes': ''}
+    assert tools.get_category_notes(category_id='sleep')['notes'] == []
+    assert tools.get_history()['entries'] == []
+    assert tools.search('ocean') == []
+    assert tools.get_trends(days=1)['categories']['sleep']['total'] == 0
+    assert not tools.delete_entry(cleared_id)
+    
+    # Writes after the clear are live, including in the same second
+    tools.set_category_section_observations(category_id='sleep', section_name='Dreams', observations='Ocean again')
+    tools.add_category_notes(category_id='sleep', notes='Fresh note')
+    summary = tools.get_category_summary(category_id='sleep')
+    assert [entry['observation'] for entry in summary['sections']['Dreams']] == ['Ocean again']
+    assert summary['notes'] == 'Fresh note'
+    assert [result['text'] for result in tools.search('ocean')] == ['Ocean again']
+    assert tools.get_trends(days=1)['categories']['sleep']['total'] == 1
+
+def test_compaction_archives_cleared_rows_in_chunks(tools):
+    """Compaction moves cleared rows out in chunks without touching live documentation"""
+    for number in range(5):
+        tools.set_category_section_observations(category_id='sleep', section_name='Dreams', observations=f'Ocean {number}')
+        tools.add_category_notes(category_id='sleep', notes=f'Note {number}')
+    tools.set_category_section_observations(category_id='physical', section_name='Strength training', observations='Squats')
+    tools.clear_category(category_id='sleep')
+    tools.set_category_section_observations(category_id='sleep', section_name='Dreams', observations='Ocean live')
+    before = tools.get_all_summaries(), tools.get_trends(days=1)
+    
+    assert compact(tools.pool, chunk_size=2) == {'category_sections': 5, 'category_notes': 5}
+    assert count(tools, "SELECT COUNT(*) FROM archived_category_sections") == 5
+    assert count(tools, "SELECT COUNT(*) FROM archived_category_notes") == 5
+    assert count(tools, "SELECT COUNT(*) FROM category_sections") == 2
+    assert count(tools, "SELECT COUNT(*) FROM doc_search") == 2
+    assert (tools.get_all_summaries(), tools.get_trends(days=1)) == before
+    assert compact(tools.pool) == {'category_sections': 0, 'category_notes': 0}
+    
+    tools.clear_category(category_id='sleep')
+    assert compact(tools.pool, archive=False) == {'category_sections': 1, 'category_notes': 0}
+    assert count(tools, "SELECT COUNT(*) FROM archived_category_sections") == 5
+    assert tools.get_trends(days=1)['categories']['physical']['total'] == 1
@@ -0,0 +1,58 @@
+from llama_index.core.base.llms.types import ChatMessage, MessageRole
+from bot.context import ContextBuilder, count_message_tokens, count_tokens, truncate_to_tokens
+
+def message(role, content):
+    return ChatMessage(role=role, content=content)
+
+def test_truncate_keeps_tail_lines():
+    """Truncation drops whole lines from the head by default"""
+    text = "\n".join(f"line {n} " + "x" * 40 for n in range(10))
+    truncated = truncate_to_tokens(text, 40)
+    assert count_tokens(truncated) <= 40
+    assert truncated.endswith(text.split("\n")[-1])
+    assert truncated.split("\n")[0].startswith("line ")
+
+def test_fit_history_keeps_newest_within_budget():
+    """The newest messages that fit are kept, starting on a user message"""
+    builder = ContextBuilder(fixed_tokens=0)
+    history = []
+    for turn in range(6):
+        history.append(message(MessageRole.USER, f"question {turn} " + "a " * 20))
+        history.append(message(MessageRole.ASSISTANT, f"answer {turn}"))
+    budget = count_message_tokens(history[-3:])
+    kept, dropped = builder.fit_history(history, budget)
+    assert kept == history[-2:]
+    assert dropped == history[:-2]
+    assert count_message_tokens(kept) <= budget
+
+def test_fit_history_everything_fits():
+    """Nothing is dropped when the whole history fits"""
+    builder = ContextBuilder(fixed_tokens=0)
+    history = [message(MessageRole.USER, "hi"), message(MessageRole.ASSISTANT, "hello")]
+    assert builder.fit_history(history, 1000) == (history, [])
+
+def test_fold_and_state_block_respect_state_budget():
+    """Folded turns are abbreviated and the state block stays within its budget"""
+    builder = ContextBuilder(fixed_tokens=0, state_budget=50)
+    dropped = [
+        message(MessageRole.USER, "first " * 200),
+        message(MessageRole.TOOL, "tool output"),
+        message(MessageRole.ASSISTANT, "noted"),
+    ]
+    summary = builder.fold("", dropped)
+    assert "tool output" not in summary
+    assert summary.endswith("Assistant: noted")
+    block = builder.state_block(summary, "sleep")
+    assert block.startswith("Conversation state:")
+    assert count_tokens(block) <= 50
+
+def test_state_block_empty_without_state():
+    """No state means no state message"""
+    assert ContextBuilder(fixed_tokens=0).state_block("", None) == ""
+
+def test_history_budget_accounts_for_fixed_and_state():
+    """The history budget is what remains after the fixed prompt, state and message"""
+    builder = ContextBuilder(fixed_tokens=100, budget=200)
+    assert builder.history_budget("", "") == 100 - 4
+    assert builder.history_budget("x" * 400, "") < 100 - 4
+    assert ContextBuilder(fixed_tokens=500, budget=200).history_budget("", "hi") == 0
@@ -0,0 +1,50 @@
+import json
+import metrics
+from bot.core import TherapyDocumentationBot
+
+def test_histogram_renders_prometheus_text():
+    """Histograms render cumulative buckets, a sum and a count per label set"""
+    registry = metrics.Registry()
+    histogram = registry.histogram('op_seconds', 'Operation time', ('op',), buckets=(0.1, 1.0))
+    counter = registry.counter('ops_total', 'Operations', ('op',))
+    for value in (0.05, 0.5, 5.0):
+        histogram.observe(value, op='read')
+    counter.inc(op='say "hi"')
+    lines = registry.render().splitlines()
+    assert '# TYPE op_seconds histogram' in lines
+    assert 'op_seconds_bucket{op="read",le="0.1"} 1.0' in lines
+    assert 'op_seconds_bucket{op="read",le="1.0"} 2.0' in lines
+    assert 'op_seconds_bucket{op="read",le="+Inf"} 3.0' in lines
+    assert 'op_seconds_sum{op="read"} 5.55' in lines
+    assert 'op_seconds_count{op="read"} 3.0' in lines
+    assert 'ops_total{op="say \\"hi\\""} 1.0' in lines
+
+def test_turn_trace_separates_llm_tool_and_db_time(db_path):
+    """A chat turn's trace has LLM, tool and SQLite spans and its prompt size"""
+    bot = TherapyDocumentationBot(test_mode=True)
+    llm_calls = metrics.LLM_DURATION.count(model='mock-llm', outcome='ok')
+    trace = metrics.start_trace('turn')
+    bot.process_message("I slept well last night")
+    result = metrics.finish_trace(trace)
+    
+    assert metrics.current_trace() is None
+    assert {'llm', 'tool', 'db'} <= set(result['totals_ms'])
+    assert [span['name'] for span in result['spans'] if span['kind'] == 'tool'] == ['set_category_section_observations']
+    llm_spans = [span for span in result['spans'] if span['kind'] == 'llm']
+    # One call that asks for the tool and one that answers after its result
+    assert len(llm_spans) == 2
+    assert all(span['prompt_tokens'] > 0 for span in llm_spans)
+    assert result['prompt_tokens'] > 0
+    assert metrics.LLM_DURATION.count(model='mock-llm', outcome='ok') == llm_calls + 2
+
+def test_traces_are_logged_when_enabled(db_path, monkeypatch, capsys):
+    """TRACE_REQUESTS logs each finished trace as one JSON line"""
+    from tools import TherapyDocTools
+    monkeypatch.setattr(metrics, 'TRACE_REQUESTS', True)
+    trace = metrics.start_trace('GET /history')
+    TherapyDocTools().get_all_summaries()
+    metrics.finish_trace(trace, status=200)
+    line = next(line for line in capsys.readouterr().out.splitlines() if line.startswith('Trace: '))
+    logged = json.loads(line[len('Trace: '):])
+    assert logged['name'] == 'GET /history' and logged['status'] == 200
+    assert any(span['kind'] == 'db' and span['name'] == 'SELECT' for span in logged['spans'])
@@ -0,0 +1,179 @@
+import sqlite3
+from migrations import DEFAULT_USER_ID, MIGRATIONS, current_version, drop_all, latest_version, migrate
+from storage import ConnectionPool
+from tools import TherapyDocTools
+
+def table_names(path):
+    with sqlite3.connect(path) as db:
+        return {row[0] for row in db.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+def test_migrate_fresh_database(tmp_path):
+    """A fresh database is brought to the latest version"""
+    pool = ConnectionPool(str(tmp_path / "fresh.db"))
+    assert migrate(pool) == latest_version()
+    tables = table_names(pool.db_path)
+    assert {'schema_version', 'category_data', 'category_sections', 'category_notes', 'users'} <= tables
+
+def test_migrate_is_idempotent(tmp_path):
+    """Running migrations again applies nothing new"""
+    pool = ConnectionPool(str(tmp_path / "again.db"))
+    migrate(pool)
+    migrate(pool)
+    with pool.connection() as db:
+        versions = [row[0] for row in db.execute("SELECT version FROM schema_version ORDER BY version")]
+    assert versions == [version for version, _, _ in MIGRATIONS]
+
+def test_migrate_adopts_legacy_bootstrap_schema(tmp_path):
+    """Databases created by the old TherapyDocTools bootstrap keep their data"""
+    path = str(tmp_path / "legacy.db")
+    with sqlite3.connect(path) as db:
+        db.execute("CREATE TABLE category_data (category_id TEXT PRIMARY KEY, next_steps TEXT)")
+        db.execute("""
+            CREATE TABLE category_sections (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                category_id TEXT NOT NULL,
+                section_name TEXT NOT NULL,
+                observations TEXT,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        db.execute("CREATE TABLE category_notes (category_id TEXT PRIMARY KEY, notes TEXT)")
+        db.execute("INSERT INTO category_sections (category_id, section_name, observations) VALUES ('sleep', 'Dreams', 'None')")
+    pool = ConnectionPool(path)
+    assert migrate(pool) == latest_version()
+    with pool.connection() as db:
+        assert db.execute("SELECT COUNT(*) FROM category_sections").fetchone()[0] == 1
+        # Existing entries are backfilled into the search index
+        assert db.execute("SELECT rowid FROM doc_search WHERE doc_search MATCH 'none'").fetchone()[0] == 2
+        # ...and into the daily rollup
+        assert db.execute("SELECT SUM(entries) FROM daily_section_counts WHERE category_id = 'sleep'").fetchone()[0] == 1
+
+def test_drop_all_then_migrate(tmp_path):
+    """drop_all leaves an empty database that migrates cleanly"""
+    pool = ConnectionPool(str(tmp_path / "reset.db"))
+    migrate(pool)
+    drop_all(pool)
+    with pool.connection() as db:
+        assert current_version(db) == 0
+    assert migrate(pool) == latest_version()
+
+def test_tools_construction_does_not_write(db_path):
+    """Constructing the tools never touches the schema or data"""
+    with sqlite3.connect(db_path) as db:
+        before = db.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()[0]
+    TherapyDocTools()
+    with sqlite3.connect(db_path) as db:
+        assert db.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()[0] == before
+        assert db.execute("SELECT COUNT(*) FROM category_data").fetchone()[0] == 0
+
+def test_migrate_splits_legacy_notes_blob(tmp_path):
+    """Notes stored as one concatenated blob become one row per note"""
+    path = str(tmp_path / "notes.db")
+    pool = ConnectionPool(path)
+    with pool.connection() as db:
+        db.execute("CREATE TABLE category_notes (category_id TEXT PRIMARY KEY, notes TEXT)")
+        db.execute("INSERT INTO category_notes VALUES ('sleep', 'first\nsecond\n\nthird')")
+        db.execute("INSERT INTO category_notes VALUES ('social', '')")
+    migrate(pool)
+    with pool.connection() as db:
+        rows = db.execute("SELECT category_id, note FROM category_notes ORDER BY id").fetchall()
+    assert [tuple(row) for row in rows] == [('sleep', 'first'), ('sleep', 'second'), ('sleep', 'third')]
+
+def test_migrate_assigns_legacy_rows_to_default_user(tmp_path):
+    """Rows written before user partitioning belong to the default user"""
+    path = str(tmp_path / "users.db")
+    with sqlite3.connect(path) as db:
+        db.execute("CREATE TABLE category_data (category_id TEXT PRIMARY KEY, next_steps TEXT)")
+        db.execute("INSERT INTO category_data VALUES ('sleep', 'Bed by 10')")
+    pool = ConnectionPool(path)
+    migrate(pool)
+    with pool.connection() as db:
+        assert tuple(db.execute("SELECT user_id, category_id, next_steps FROM category_data").fetchone()) == \
+            (DEFAULT_USER_ID, 'sleep', 'Bed by 10')
+
+# What the old schema.sql created, before migrations existed
+BASELINE_SCHEMA = """
+CREATE TABLE users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT UNIQUE NOT NULL,
+    password TEXT NOT NULL
+);
+CREATE TABLE category_data (
+    category_id TEXT PRIMARY KEY,
+    next_steps TEXT
+);
+CREATE TABLE category_sections (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    category_id TEXT NOT NULL,
+    section_name TEXT NOT NULL,
+    observations TEXT,
+    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE(category_id, section_name, timestamp)
+);
+CREATE TABLE category_notes (
+    category_id TEXT PRIMARY KEY,
+    notes TEXT
+);
+CREATE INDEX idx_category_data ON category_data(category_id);
+CREATE INDEX idx_category_notes ON category_notes(category_id);
+CREATE INDEX idx_category_sections ON category_sections(category_id);
+CREATE INDEX idx_category_sections_timestamp ON category_sections(timestamp);
+"""
+
+def baseline_database(path):
+    """Create a database the way the old schema.sql did, with a little documentation"""
+    with sqlite3.connect(path) as db:
+        db.executescript(BASELINE_SCHEMA)
+        db.execute("INSERT INTO category_sections (category_id, section_name, observations) VALUES ('sleep', 'Dreams', 'None')")
+        db.execute("INSERT INTO category_sections (category_id, section_name, observations) VALUES ('sleep', 'Schedule', 'x')")
+        db.execute("DELETE FROM category_sections WHERE section_name = 'Schedule'")
+        db.execute("INSERT INTO category_notes VALUES ('sleep', 'first')")
+        db.execute("INSERT INTO category_data VALUES ('sleep', 'Bed by 10')")
+
+def test_migrate_baseline_schema_drops_legacy_unique(tmp_path, monkeypatch):
+    """Users of an upgraded schema.sql database can document a section in the same second"""
+    path = str(tmp_path / "baseline.db")
+    baseline_database(path)
+    monkeypatch.setattr("migrations.DEFAULT_USER_ID", "test")
+    pool = ConnectionPool(path)
+    assert migrate(pool) == latest_version()
+    monkeypatch.setattr("tools.get_user_pool", lambda user_id, db_path=None: pool)
+    # Same category, section and CURRENT_TIMESTAMP second for two users, then twice in one batch
+    TherapyDocTools("alice").set_category_section_observations(category_id="sleep", section_name="Schedule", observations="a")
+    TherapyDocTools("bob").set_category_section_observations(category_id="sleep", section_name="Schedule", observations="b")
+    tools = TherapyDocTools("carol")
+    with tools.batch():
+        tools.set_category_section_observations(category_id="sleep", section_name="Schedule", observations="c1")
+        tools.set_category_section_observations(category_id="sleep", section_name="Schedule", observations="c2")
+    with pool.connection() as db:
+        rows = db.execute("SELECT id, user_id, observations FROM category_sections ORDER BY id").fetchall()
+        # Legacy rows keep their ids and go to the configured default user, and deleted ids are not reused
+        assert [tuple(row) for row in rows] == [
+            (1, 'test', 'None'), (3, 'alice', 'a'), (4, 'bob', 'b'), (5, 'carol', 'c1'), (6, 'carol', 'c2')
+        ]
+        assert db.execute("SELECT user_id FROM category_notes").fetchone()[0] == 'test'
+        assert db.execute("SELECT user_id FROM category_data").fetchone()[0] == 'test'
+
+def test_reassign_user_moves_documentation(tmp_path, monkeypatch):
+    """Documentation migrated to the default user can be handed to the account that logs in"""
+    from init_db import reassign_user
+    path = str(tmp_path / "reassign.db")
+    baseline_database(path)
+    monkeypatch.setattr("migrations.DEFAULT_USER_ID", "default")
+    pool = ConnectionPool(path)
+    migrate(pool)
+    monkeypatch.setattr("tools.get_user_pool", lambda user_id, db_path=None: pool)
+    TherapyDocTools("test").add_category_notes(category_id="sleep", notes="cleared")
+    TherapyDocTools("test").clear_category(category_id="sleep")
+    moved = reassign_user(pool, "default", "test")
+    assert moved["category_sections"] == 1
+    assert moved["category_notes"] == 1
+    summary = TherapyDocTools("test").get_category_summary(category_id="sleep")
+    assert summary["sections"]["Dreams"][0]["observation"] == "None"
+    assert summary["notes"] == "first"
+    assert summary["next_steps"] == "Bed by 10"
+    assert TherapyDocTools("test").search(query="none")
+    with pool.connection() as db:
+        rollup = db.execute("SELECT user_id, SUM(entries) FROM daily_section_counts GROUP BY user_id").fetchall()
+        assert [tuple(row) for row in rollup] == [('test', 1)]
+        assert db.execute("SELECT COUNT(*) FROM category_sections WHERE user_id = 'default'").fetchone()[0] == 0
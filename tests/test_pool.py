@@ -0,0 +1,101 @@
+import asyncio
+import threading
+import pytest
+from bot.pool import BotPool
+
+class FakeBot:
+    """Minimal stand-in for TherapyDocumentationBot"""
+    def __init__(self):
+        self.chat_history = []
+        self.resets = 0
+
+    def reset(self, chat_history=None, summary="", user_id=None):
+        self.resets += 1
+        self.chat_history = list(chat_history) if chat_history else []
+        self.conversation_summary = summary
+
+def test_pool_reuses_bots():
+    """A released bot is handed out again instead of building a new one"""
+    pool = BotPool(size=2, factory=FakeBot)
+    with pool.checkout() as first:
+        pass
+    with pool.checkout() as second:
+        pass
+    assert first is second
+    assert pool.created == 1
+
+def test_pool_loads_and_clears_chat_history():
+    """Chat history is per checkout and does not leak to the next user"""
+    pool = BotPool(size=1, factory=FakeBot)
+    with pool.checkout(chat_history=["hello"]) as bot:
+        assert bot.chat_history == ["hello"]
+    with pool.checkout() as bot:
+        assert bot.chat_history == []
+
+def test_pool_is_bounded():
+    """The pool never builds more than its size and blocks when exhausted"""
+    pool = BotPool(size=1, factory=FakeBot)
+    bot = pool.acquire()
+    with pytest.raises(Exception):
+        pool.acquire(timeout=0.01)
+    pool.release(bot)
+    assert pool.acquire() is bot
+    assert pool.created == 1
+
+def test_pool_concurrent_checkouts():
+    """Concurrent checkouts never share a bot"""
+    pool = BotPool(size=3, factory=FakeBot)
+    in_use = set()
+    errors = []
+    lock = threading.Lock()
+
+    def worker():
+        for _ in range(50):
+            with pool.checkout() as bot:
+                with lock:
+                    if id(bot) in in_use:
+                        errors.append(bot)
+                    in_use.add(id(bot))
+                with lock:
+                    in_use.discard(id(bot))
+
+    threads = [threading.Thread(target=worker) for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors
+    assert pool.created <= 3
+
+def test_async_waiters_get_released_bots():
+    """A coroutine waiting for a bot gets the next one released, even from another thread"""
+    pool = BotPool(size=1, factory=FakeBot)
+    held = pool.acquire()
+
+    async def run():
+        waiter = asyncio.ensure_future(pool.aacquire(user_id="bob"))
+        await asyncio.sleep(0.01)
+        assert not waiter.done()
+        threading.Thread(target=pool.release, args=(held,)).start()
+        return await asyncio.wait_for(waiter, 1)
+
+    assert asyncio.run(run()) is held
+    assert pool.created == 1
+
+def test_async_acquire_times_out_without_losing_bots():
+    """A waiter that gives up raises TimeoutError, and the bot released later goes back to the pool"""
+    pool = BotPool(size=1, factory=FakeBot)
+    held = pool.acquire()
+
+    async def run():
+        with pytest.raises(asyncio.TimeoutError):
+            await pool.aacquire(timeout=0.01)
+        pool.release(held)
+        return await pool.aacquire(timeout=1)
+
+    assert asyncio.run(run()) is held
+
+def test_pool_rejects_invalid_size():
+    """Pool size must be positive"""
+    with pytest.raises(ValueError):
+        BotPool(size=0)
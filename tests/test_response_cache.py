@@ -0,0 +1,133 @@
+import pytest
+from llama_index.core.base.llms.types import ChatMessage, MessageRole
+from response_cache import ResponseCache, cache_key, is_cacheable, normalize_message
+from storage import get_pool
+
+PLAN = [("set_category_section_observations",
+         {"category_id": "sleep", "section_name": "General notes", "observations": "Slept well"})]
+
+@pytest.fixture
+def cache(db_path):
+    return ResponseCache(get_pool(db_path), max_entries=2, ttl=60)
+
+def test_normalize_ignores_case_whitespace_and_trailing_punctuation():
+    """Trivially different phrasings share a key"""
+    assert normalize_message("  Thanks!! ") == normalize_message("thanks")
+    assert cache_key("Slept  well, no dreams.") == cache_key("slept well, no dreams")
+    assert cache_key("slept well") != cache_key("slept well", context="other")
+
+def test_only_write_plans_without_errors_are_cacheable():
+    """Reads, clears and failed calls are never replayed"""
+    assert is_cacheable([], [])
+    assert is_cacheable(PLAN, ["ok"])
+    assert not is_cacheable([("get_category_summary", {"category_id": "sleep"})], ["{}"])
+    assert not is_cacheable([("clear_category", {"category_id": "sleep"})], ["ok"])
+    assert not is_cacheable(PLAN, ["Error: Invalid section"])
+
+def test_put_get_and_stats(cache):
+    """Stored entries come back and lookups are counted"""
+    assert cache.get("a") is None
+    cache.put("a", PLAN, "Noted")
+    assert cache.get("a") == (PLAN, "Noted")
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["stores"]) == (1, 1, 1)
+    assert stats["hit_rate"] == 0.5
+
+def test_lru_evicts_to_table(cache):
+    """Entries evicted from memory are still served from the table"""
+    for key in "abc":
+        cache.put(key, [], key)
+    assert cache.stats()["evictions"] == 1
+    assert cache.get("a") == ([], "a")
+    assert cache.stats()["memory_hits"] == 0
+
+def test_entries_persist_across_instances(db_path, cache):
+    """A new process sees entries stored by another"""
+    cache.put("a", PLAN, "Noted")
+    assert ResponseCache(get_pool(db_path)).get("a") == (PLAN, "Noted")
+
+def test_expired_entries_miss(db_path, monkeypatch):
+    """Entries older than the TTL are not served"""
+    cache = ResponseCache(get_pool(db_path), ttl=10)
+    now = 1000.0
+    monkeypatch.setattr("response_cache.time.time", lambda: now)
+    cache.put("a", [], "old")
+    now += 11
+    assert cache.get("a") is None
+    assert ResponseCache(get_pool(db_path), ttl=10).get("a") is None
+
+def count_llm_calls(bot, monkeypatch):
+    """Count the chat calls the bot's LLM receives"""
+    calls = []
+    llm_class = type(bot.llm)
+    original = llm_class.chat
+    def chat(self, messages, **kwargs):
+        calls.append(messages)
+        return original(self, messages, **kwargs)
+    monkeypatch.setattr(llm_class, "chat", chat)
+    return calls
+
+@pytest.fixture
+def bot(db_path):
+    from bot.core import TherapyDocumentationBot
+    bot = TherapyDocumentationBot(test_mode=True)
+    bot.response_cache = ResponseCache(get_pool(db_path))
+    return bot
+
+def test_repeated_message_replays_tool_calls(bot, monkeypatch):
+    """A repeated message is documented again without calling the model"""
+    first = bot.process_message("I slept well last night")
+    # A fresh conversation, as each pooled batch bot starts with
+    bot.reset()
+    calls = count_llm_calls(bot, monkeypatch)
+    second = bot.process_message("i slept well last night!")
+    assert calls == []
+    assert second == first
+    notes = bot.tools.get_category_summary(category_id="sleep")["sections"]["General notes"]
+    assert len(notes) == 2
+    assert [msg.role for msg in bot.agent.memory.get_all()] == [MessageRole.USER, MessageRole.ASSISTANT]
+    assert bot.response_cache.stats()["hits"] == 1
+
+def test_stream_replays_cached_turn(bot):
+    """A cache hit streams the replayed tool calls and the cached reply"""
+    list(bot.stream_message("I slept well last night"))
+    bot.reset()
+    events = list(bot.stream_message("I slept well last night"))
+    assert [event["type"] for event in events] == ["tool", "token", "done"]
+    assert events[0]["summary"] == "documented sleep/General notes"
+    assert bot.response_cache.stats()["hits"] == 1
+
+def test_pending_question_is_part_of_the_key(bot, monkeypatch):
+    """An answer to a question is not reused for a different question"""
+    bot.process_message("yes")
+    bot.reset(chat_history=[ChatMessage(role=MessageRole.ASSISTANT, content="Did you sleep well?")])
+    calls = count_llm_calls(bot, monkeypatch)
+    bot.process_message("yes")
+    assert len(calls) == 1
+
+def test_users_get_separate_entries(bot, monkeypatch):
+    """One user's cached reply and plan are never replayed into another user's records"""
+    bot.reset(user_id="alice")
+    bot.process_message("slept well")
+    bot.reset(user_id="bob")
+    calls = count_llm_calls(bot, monkeypatch)
+    bot.process_message("Slept well!")
+    assert calls
+    assert bot.response_cache.stats()["hits"] == 0
+    assert bot.response_cache.stats()["stores"] == 2
+    assert len(bot.tools.get_history(limit=5)["entries"]) == 1
+
+def test_earlier_turns_are_part_of_the_key(bot, monkeypatch):
+    """A reply that may lean on earlier turns is not reused after different ones"""
+    bot.reset(chat_history=[
+        ChatMessage(role=MessageRole.USER, content="slept badly"),
+        ChatMessage(role=MessageRole.ASSISTANT, content="Sorry to hear that."),
+    ])
+    bot.process_message("same as yesterday")
+    bot.reset(chat_history=[
+        ChatMessage(role=MessageRole.USER, content="went for a run"),
+        ChatMessage(role=MessageRole.ASSISTANT, content="Nice work."),
+    ])
+    calls = count_llm_calls(bot, monkeypatch)
+    bot.process_message("same as yesterday")
+    assert calls
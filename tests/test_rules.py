@@ -0,0 +1,69 @@
+import pytest
+from bot.rules import RuleClassifier
+
+@pytest.fixture
+def classifier():
+    return RuleClassifier()
+
+@pytest.mark.parametrize("message, expected", [
+    ("slept 8 hours, bed at 10pm", [
+        ("sleep", "Length of sleep", "Slept 8 hours"),
+        ("sleep", "Schedule", "Bed at 10pm"),
+    ]),
+    ("3 journal entries today", [("journaling", "Counting entries", "3 journal entries today")]),
+    ("45 min strength training", [("physical", "Strength training", "45 min strength training")]),
+    ("20 min video call", [("social", "VC", "20 min video call")]),
+    ("[non-interactive mode] Woke up at 6:30am and went to bed at 11pm.", [
+        ("sleep", "Schedule", "Woke up at 6:30am; Went to bed at 11pm"),
+    ]),
+    ("up 6:45, bed 10pm", [("sleep", "Schedule", "Up 6:45; Bed 10pm")]),
+    ("up at 7", [("sleep", "Schedule", "Up at 7")]),
+    ("45 min solo meditation", [("spiritual", "Solo", "45 min solo meditation")]),
+    ("30 min texting", [("social", "Text", "30 min texting")]),
+])
+def test_structured_messages_map_to_sections(classifier, message, expected):
+    """Quantitative check-ins map onto registry sections"""
+    assert classifier.classify(message) == expected
+
+@pytest.mark.parametrize("message", [
+    "I slept well last night",
+    "slept 8 hours, no dreams",
+    "did my morning workout",
+    "didn't sleep 8 hours",
+    "up 3",
+    "bed 5",
+    "woke up 2",
+    "asleep around 11",
+    "45 min solo",
+    "30 min text",
+    "1 hour group",
+    "schedule 2 hours",
+    "20 min dreams",
+    "thanks",
+    "",
+])
+def test_unsure_messages_fall_through(classifier, message):
+    """Anything not fully covered by a rule goes to the model"""
+    assert classifier.classify(message) is None
+
+def test_stats_report_handled_fraction(classifier):
+    """The classifier counts how much traffic it answers"""
+    classifier.classify("slept 8 hours")
+    classifier.classify("thanks")
+    assert classifier.stats() == {"handled": 1, "total": 2, "handled_fraction": 0.5}
+
+def test_bot_documents_without_model(db_path, monkeypatch):
+    """The bot writes fast-path observations through the tools and skips the LLM"""
+    from bot.core import TherapyDocumentationBot
+    bot = TherapyDocumentationBot(test_mode=True)
+    def fail(*args, **kwargs):
+        raise AssertionError("the model should not be called")
+    monkeypatch.setattr(type(bot.llm), "chat", fail)
+    result = bot.process_message("slept 7 hours, woke at 6am")
+    assert "sleep/Length of sleep" in result["response"]
+    sections = bot.tools.get_category_summary(category_id="sleep")["sections"]
+    assert sections["Length of sleep"][0]["observation"] == "Slept 7 hours"
+    assert sections["Schedule"][0]["observation"] == "Woke at 6am"
+    assert len(bot.agent.memory.get_all()) == 2
+    events = list(bot.stream_message("45 min strength training"))
+    assert [event["type"] for event in events] == ["tool", "token", "done"]
@@ -0,0 +1,79 @@
+import os
+import threading
+import pytest
+from shards import ShardRouter, get_user_pool, query_all_shards
+from tools import TherapyDocTools
+
+@pytest.fixture
+def sharded(tmp_path, monkeypatch):
+    """Route every user to their own shard file under tmp_path"""
+    shard_dir = str(tmp_path / "shards")
+    monkeypatch.setenv('DATABASE', str(tmp_path / "main.db"))
+    monkeypatch.setenv('DB_SHARD_MODE', 'user')
+    monkeypatch.setenv('DB_SHARD_DIR', shard_dir)
+    return shard_dir
+
+def test_users_get_separate_shard_files(sharded):
+    """Each user's writes land in their own lazily created file"""
+    assert not os.path.exists(sharded)
+    TherapyDocTools(user_id='alice').add_category_notes(category_id='sleep', notes='alice note')
+    TherapyDocTools(user_id='bob').add_category_notes(category_id='sleep', notes='bob note')
+    assert get_user_pool('alice').db_path != get_user_pool('bob').db_path
+    assert len(os.listdir(sharded)) >= 2
+    assert TherapyDocTools(user_id='alice').get_category_summary(category_id='sleep')['notes'] == 'alice note'
+    rows = sorted((row['user_id'], row['note']) for _, row in query_all_shards(
+        "SELECT user_id, note FROM category_notes"))
+    assert rows == [('alice', 'alice note'), ('bob', 'bob note')]
+
+def test_hash_mode_is_stable_and_bounded(tmp_path):
+    """Hashing spreads users over a fixed number of shard files"""
+    router = ShardRouter(str(tmp_path), mode='hash', shard_count=4)
+    paths = {router.shard_path(f"user{i}") for i in range(100)}
+    assert len(paths) == 4
+    assert router.shard_path('alice') == ShardRouter(str(tmp_path), mode='hash', shard_count=4).shard_path('alice')
+
+def test_lru_bounds_open_shards(tmp_path):
+    """Least recently used shard pools are dropped beyond max_open"""
+    router = ShardRouter(str(tmp_path), max_open=2)
+    first = router.pool_for('a')
+    router.pool_for('b')
+    router.pool_for('a')
+    router.pool_for('c')
+    assert router.open_shards == 2
+    assert router.pool_for('a') is first  # Recently used, so it survived
+    assert len(router.shard_paths()) == 3
+    router.close()
+
+def test_evicted_pool_serves_callers_that_still_hold_it(tmp_path):
+    """A pool evicted between lookup and checkout still works and keeps nothing open once idle"""
+    router = ShardRouter(str(tmp_path), max_open=1)
+    alice = router.pool_for('alice')
+    held = alice.acquire()
+    router.pool_for('bob')  # Evicts alice's pool
+    with alice.connection() as db:
+        db.execute("INSERT INTO category_notes (user_id, category_id, note) VALUES ('alice', 'sleep', 'x')")
+    alice.release(held)
+    assert alice._idle.empty()
+    assert alice._created == 0
+    with router.pool_for('alice').connection() as db:
+        assert db.execute("SELECT COUNT(*) FROM category_notes").fetchone()[0] == 1
+    router.close()
+
+def test_writers_on_different_shards_do_not_block(tmp_path):
+    """A write transaction held on one user's shard never blocks another user"""
+    router = ShardRouter(str(tmp_path))
+    alice = router.pool_for('alice')
+    held = alice.acquire()
+    held.execute("BEGIN IMMEDIATE")
+    held.execute("INSERT INTO category_notes (user_id, category_id, note) VALUES ('alice', 'sleep', 'x')")
+    done = threading.Event()
+
+    def write_bob():
+        with router.pool_for('bob').connection() as db:
+            db.execute("INSERT INTO category_notes (user_id, category_id, note) VALUES ('bob', 'sleep', 'y')")
+        done.set()
+
+    threading.Thread(target=write_bob).start()
+    assert done.wait(timeout=2)
+    alice.release(held)
+    router.close()
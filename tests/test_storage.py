@@ -0,0 +1,69 @@
+import threading
+import pytest
+from storage import ConnectionPool, get_pool
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "storage.db"), size=3)
+    with pool.connection() as db:
+        db.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, value TEXT)")
+    yield pool
+    pool.close()
+
+def test_pragmas_applied(pool):
+    """Pooled connections run in WAL mode with tuned pragmas"""
+    with pool.connection() as db:
+        assert db.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert db.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+        assert db.execute("PRAGMA busy_timeout").fetchone()[0] > 0
+
+def test_connection_commits_and_rolls_back(pool):
+    """A unit of work commits on success and rolls back on error"""
+    with pool.connection() as db:
+        db.execute("INSERT INTO items (value) VALUES ('kept')")
+    with pytest.raises(RuntimeError):
+        with pool.connection() as db:
+            db.execute("INSERT INTO items (value) VALUES ('dropped')")
+            raise RuntimeError("boom")
+    with pool.connection() as db:
+        rows = [row['value'] for row in db.execute("SELECT value FROM items")]
+    assert rows == ['kept']
+
+def test_connections_are_reused(pool):
+    """Releasing a connection makes it available to the next checkout"""
+    first = pool.acquire()
+    pool.release(first)
+    second = pool.acquire()
+    pool.release(second)
+    assert first is second
+
+def test_concurrent_writers(pool):
+    """Writers on several threads do not fail with 'database is locked'"""
+    errors = []
+
+    def writer(n):
+        try:
+            for i in range(25):
+                with pool.connection() as db:
+                    db.execute("INSERT INTO items (value) VALUES (?)", (f"{n}-{i}",))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors
+    with pool.connection() as db:
+        assert db.execute("SELECT COUNT(*) FROM items").fetchone()[0] == 150
+
+def test_memory_database_shares_one_connection():
+    """Each :memory: connection is its own database, so the pool holds only one"""
+    pool = ConnectionPool(':memory:', size=5)
+    assert pool.size == 1
+
+def test_get_pool_is_process_wide(tmp_path):
+    """The same path always maps to the same pool"""
+    path = str(tmp_path / "shared.db")
+    assert get_pool(path) is get_pool(path)
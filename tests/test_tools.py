@@ -0,0 +1,338 @@
+import pytest
+from tools import LIVE_SECTIONS, TherapyDocTools
+
+@pytest.fixture
+def tools(db_path):
+    return TherapyDocTools()
+
+@pytest.fixture
+def populated_tools(tools):
+    tools.set_category_section_observations(category_id='sleep', section_name='Length of sleep', observations='8 hours')
+    tools.set_category_section_observations(category_id='sleep', section_name='Dreams', observations='No dreams')
+    tools.set_category_section_observations(category_id='physical', section_name='Strength training', observations='45 min')
+    tools.set_category_next_steps(category_id='sleep', next_steps='Keep bedtime at 10pm')
+    tools.add_category_notes(category_id='physical', notes='Felt strong')
+    return tools
+
+def test_get_all_summaries_matches_per_category(populated_tools):
+    """The bulk summary returns the same data as one summary per category"""
+    all_summaries = populated_tools.get_all_summaries()
+    assert set(all_summaries) == {cat['id'] for cat in populated_tools.get_categories()}
+    for category_id, summary in all_summaries.items():
+        assert summary == populated_tools.get_category_summary(category_id=category_id)
+
+def test_get_all_summaries_uses_fixed_query_count(populated_tools):
+    """The bulk summary does not issue one query per category"""
+    statements = []
+    with populated_tools.pool.connection() as db:
+        db.set_trace_callback(statements.append)
+    try:
+        populated_tools.get_all_summaries()
+    finally:
+        with populated_tools.pool.connection() as db:
+            db.set_trace_callback(None)
+    selects = [sql for sql in statements if sql.lstrip().upper().startswith('SELECT')]
+    assert len(selects) <= 2
+
+def test_summary_content(populated_tools):
+    """Observations, next steps and notes land in the right category"""
+    summary = populated_tools.get_all_summaries()
+    assert summary['sleep']['sections']['Length of sleep'][0]['observation'] == '8 hours'
+    assert summary['sleep']['next_steps'] == 'Keep bedtime at 10pm'
+    assert summary['physical']['notes'] == 'Felt strong'
+    assert summary['social'] == {'sections': {}, 'next_steps': '', 'notes': ''}
+
+def test_invalid_category_rejected(tools):
+    """Writes to unknown categories or sections raise ValueError"""
+    with pytest.raises(ValueError):
+        tools.set_category_section_observations(category_id='nope', section_name='General notes', observations='x')
+    with pytest.raises(ValueError):
+        tools.set_category_section_observations(category_id='sleep', section_name='Nope', observations='x')
+
+def test_notes_are_appended_as_rows(tools):
+    """Each note is its own row and earlier notes are never rewritten"""
+    tools.add_category_notes(category_id='sleep', notes='first')
+    tools.add_category_notes(category_id='sleep', notes='second')
+    with tools.pool.connection() as db:
+        rows = db.execute("SELECT note FROM category_notes WHERE category_id = 'sleep' ORDER BY id").fetchall()
+    assert [row[0] for row in rows] == ['first', 'second']
+    assert tools.get_category_summary(category_id='sleep')['notes'] == 'first\nsecond'
+
+def test_summary_includes_only_recent_notes(tools, monkeypatch):
+    """Summaries carry a bounded window of the newest notes"""
+    import tools as tools_module
+    monkeypatch.setattr(tools_module, 'NOTES_SUMMARY_LIMIT', 3)
+    for i in range(10):
+        tools.add_category_notes(category_id='sleep', notes=f'note {i}')
+    assert tools.get_category_summary(category_id='sleep')['notes'] == 'note 7\nnote 8\nnote 9'
+    assert tools.get_all_summaries()['sleep']['notes'] == 'note 7\nnote 8\nnote 9'
+
+def test_get_category_notes_paginates(tools):
+    """Pages walk from the newest note back to the oldest"""
+    for i in range(5):
+        tools.add_category_notes(category_id='sleep', notes=f'note {i}')
+    tools.add_category_notes(category_id='social', notes='elsewhere')
+    page = tools.get_category_notes(category_id='sleep', limit=2)
+    assert [note['note'] for note in page['notes']] == ['note 4', 'note 3']
+    page = tools.get_category_notes(category_id='sleep', limit=2, before_id=page['next_before_id'])
+    assert [note['note'] for note in page['notes']] == ['note 2', 'note 1']
+    page = tools.get_category_notes(category_id='sleep', limit=2, before_id=page['next_before_id'])
+    assert [note['note'] for note in page['notes']] == ['note 0']
+    assert page['next_before_id'] is None
+
+def query_plans(tools, fn):
+    """Run fn and get the EXPLAIN QUERY PLAN details of every SELECT it issued"""
+    statements = []
+    with tools.pool.connection() as db:
+        db.set_trace_callback(statements.append)
+    try:
+        fn()
+    finally:
+        with tools.pool.connection() as db:
+            db.set_trace_callback(None)
+    plans = []
+    with tools.pool.connection() as db:
+        for sql in statements:
+            if sql.lstrip().upper().startswith('SELECT'):
+                plans.append([row[3] for row in db.execute(f"EXPLAIN QUERY PLAN {sql}")])
+    return plans
+
+def test_category_summary_is_index_range_scan(populated_tools):
+    """The two-week observations window is read from the covering partial index in order"""
+    plans = query_plans(populated_tools, lambda: populated_tools.get_category_summary(category_id='sleep'))
+    section_plans = [plan for plan in plans if any('category_sections' in step for step in plan)]
+    assert len(section_plans) == 1
+    plan = section_plans[0]
+    assert any(
+        'SEARCH category_sections USING COVERING INDEX idx_category_sections_live (user_id=? AND category_id=? AND timestamp>?)' in step
+        for step in plan
+    ), plan
+    assert not any('TEMP B-TREE' in step or step.startswith('SCAN') for step in plan), plan
+
+def test_all_summaries_range_scan_one_user(populated_tools):
+    """The all-categories window is bounded to the user's rows by an index"""
+    plans = query_plans(populated_tools, populated_tools.get_all_summaries)
+    for plan in plans:
+        assert not any(step.startswith('SCAN category_') for step in plan), plan
+    section_plans = [plan for plan in plans if any('category_sections' in step for step in plan)]
+    assert any('idx_category_sections_user_time (user_id=? AND timestamp>?)' in step for step in section_plans[0])
+
+def test_users_see_only_their_own_documentation(db_path):
+    """Tools bound to different users never read or change each other's rows"""
+    alice = TherapyDocTools(user_id='alice')
+    bob = TherapyDocTools(user_id='bob')
+    alice.set_category_section_observations(category_id='sleep', section_name='Dreams', observations='Flying')
+    alice.set_category_next_steps(category_id='sleep', next_steps='Keep a dream journal')
+    alice.add_category_notes(category_id='sleep', notes='Vivid week')
+    assert bob.get_all_summaries()['sleep'] == {'sections': {}, 'next_steps': '', 'notes': ''}
+    assert bob.get_category_notes(category_id='sleep')['notes'] == []
+    bob.set_category_next_steps(category_id='sleep', next_steps='Sleep earlier')
+    bob.clear_category(category_id='sleep')
+    entry_id = alice.get_category_summary(category_id='sleep')['sections']['Dreams'][0]['id']
+    assert not bob.delete_entry(entry_id)
+    summary = alice.get_category_summary(category_id='sleep')
+    assert summary['next_steps'] == 'Keep a dream journal'
+    assert summary['notes'] == 'Vivid week'
+    assert summary['sections']['Dreams'][0]['observation'] == 'Flying'
+
+def test_record_many_writes_in_one_transaction(db_path):
+    """Bulk writes land together, and one invalid call writes nothing"""
+    tools = TherapyDocTools()
+    outputs = tools.record_many([
+        ("set_category_section_observations",
+         {"category_id": "sleep", "section_name": "Dreams", "observations": "Vivid"}),
+        ("set_category_next_steps", {"category_id": "sleep", "next_steps": "Earlier bedtime"}),
+        ("add_category_notes", {"category_id": "physical", "notes": "Sore legs"}),
+    ])
+    assert outputs == ["Observations set for sleep - Dreams", "Next steps set for sleep", "Notes added to physical"]
+    assert tools.current_category == "physical"
+    summary = tools.get_category_summary(category_id="sleep")
+    assert summary["sections"]["Dreams"][0]["observation"] == "Vivid"
+    assert summary["next_steps"] == "Earlier bedtime"
+    
+    with pytest.raises(ValueError):
+        tools.record_many([
+            ("add_category_notes", {"category_id": "sleep", "notes": "Kept?"}),
+            ("set_category_section_observations",
+             {"category_id": "sleep", "section_name": "Nope", "observations": "x"}),
+        ])
+    assert tools.get_category_notes(category_id="sleep")["notes"] == []
+
+def test_batch_flushes_once_on_exit(tools, monkeypatch):
+    """Writes inside batch() are validated at once but written together at the end"""
+    flushed = []
+    record_many = tools.record_many
+    monkeypatch.setattr(tools, "record_many", lambda calls: flushed.append(list(calls)) or record_many(calls))
+    with tools.batch():
+        assert tools.set_category_next_steps(category_id="sleep", next_steps="Earlier bedtime") == "Next steps set for sleep"
+        tools.add_category_notes(category_id="sleep", notes="Tired")
+        with pytest.raises(ValueError):
+            tools.add_category_notes(category_id="nope", notes="x")
+        assert flushed == []
+        assert tools.current_category == "sleep"
+    assert len(flushed) == 1 and len(flushed[0]) == 2
+    assert tools.get_category_summary(category_id="sleep")["next_steps"] == "Earlier bedtime"
+
+def test_batch_reads_see_buffered_writes(tools):
+    """Reads inside a batch flush first"""
+    with tools.batch():
+        tools.set_category_section_observations(category_id="sleep", section_name="Dreams", observations="Vivid")
+        assert tools.get_category_summary(category_id="sleep")["sections"]["Dreams"][0]["observation"] == "Vivid"
+
+def test_batch_discards_writes_when_block_raises(tools):
+    """A failed unit of work writes nothing"""
+    with pytest.raises(RuntimeError):
+        with tools.batch():
+            tools.add_category_notes(category_id="sleep", notes="Lost")
+            raise RuntimeError("turn failed")
+    assert tools.get_category_notes(category_id="sleep")["notes"] == []
+
+def test_search_ranks_observations_and_notes(tools):
+    """Search matches word forms in observations and notes, scoped to the user"""
+    tools.set_category_section_observations(category_id='sleep', section_name='Dreams', observations='Vivid dreams about the ocean')
+    tools.add_category_notes(category_id='spiritual', notes='Meditated by the ocean, ocean breeze')
+    tools.set_category_section_observations(category_id='physical', section_name='Strength training', observations='Leg day')
+    TherapyDocTools(user_id='someone-else').add_category_notes(category_id='sleep', notes='ocean')
+    
+    results = tools.search('Ocean')
+    assert [(result['kind'], result['category_id']) for result in results] == [('note', 'spiritual'), ('observation', 'sleep')]
+    assert results[0]['score'] >= results[1]['score']
+    assert [result['section_name'] for result in tools.search('dream')] == ['Dreams']
+    assert [result['category_id'] for result in tools.search('ocean', category_id='sleep')] == ['sleep']
+    assert tools.search('ocean', since='2999-01-01') == []
+    assert tools.search('ocean day') == []
+    # Query syntax in user input is treated as plain words
+    assert len(tools.search('ocean" OR "leg')) == 0
+    assert tools.search('  ') == []
+
+def test_search_index_follows_clears_and_deletes(tools):
+    """Triggers keep the index in sync with the documentation tables"""
+    tools.set_category_section_observations(category_id='sleep', section_name='Dreams', observations='Ocean dream')
+    tools.add_category_notes(category_id='sleep', notes='Ocean note')
+    tools.set_category_section_observations(category_id='physical', section_name='Strength training', observations='Ocean swim')
+    entry_id = next(result['id'] for result in tools.search('swim'))
+    assert tools.delete_entry(entry_id)
+    assert tools.search('swim') == []
+    tools.clear_category(category_id='sleep')
+    assert tools.search('ocean') == []
+
+def test_search_uses_full_text_index(tools):
+    """Search is answered by the FTS index, not by scanning the documentation tables"""
+    tools.add_category_notes(category_id='sleep', notes='Ocean note')
+    plans = query_plans(tools, lambda: tools.search('ocean', category_id='sleep', since='2020-01-01'))
+    details = [detail for plan in plans for detail in plan]
+    # ":M" means the MATCH constraint is answered by the full-text index
+    assert any('VIRTUAL TABLE INDEX' in detail and ':M' in detail for detail in details)
+    assert not any('category_sections' in detail or 'category_notes' in detail for detail in details)
+
+def insert_observation(tools, category_id, section_name, observation, timestamp):
+    with tools.pool.connection() as db:
+        db.execute("""
+            INSERT INTO category_sections (user_id, category_id, section_name, observations, timestamp)
+            VALUES (?, ?, ?, ?, ?)
+        """, (tools.user_id, category_id, section_name, observation, timestamp))
+
+def test_history_pages_by_timestamp_and_id(tools):
+    """Keyset pages cover every entry once, newest first, even with tied timestamps"""
+    for day in range(1, 6):
+        insert_observation(tools, 'sleep', 'Dreams', f'day {day} a', f'2023-01-0{day} 08:00:00')
+        insert_observation(tools, 'physical', 'Strength training', f'day {day} b', f'2023-01-0{day} 08:00:00')
+    insert_observation(tools, 'sleep', 'Dreams', 'cleared', '2023-01-09 08:00:00')
+    tools.clear_category(category_id='physical')
+    
+    seen, cursor = [], None
+    while True:
+        page = tools.get_history(cursor=cursor, limit=2)
+        seen.extend(entry['observation'] for entry in page['entries'])
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+    assert seen == ['cleared'] + [f'day {day} a' for day in range(5, 0, -1)]
+    
+    page = tools.get_history(category_id='sleep', since='2023-01-02', until='2023-01-04')
+    assert [entry['observation'] for entry in page['entries']] == ['day 3 a', 'day 2 a']
+    assert page['next_cursor'] is None
+    with pytest.raises(ValueError):
+        tools.get_history(cursor='not a cursor')
+    with pytest.raises(ValueError):
+        tools.get_history(since='last tuesday')
+
+def test_history_pages_seek_the_index(tools):
+    """Later pages seek into the index instead of sorting or skipping rows"""
+    for day in range(1, 6):
+        insert_observation(tools, 'sleep', 'Dreams', f'day {day}', f'2023-01-0{day} 08:00:00')
+    cursor = tools.get_history(limit=2)['next_cursor']
+    for category_id in (None, 'sleep'):
+        plans = query_plans(tools, lambda: tools.get_history(category_id=category_id, cursor=cursor, limit=2))
+        details = [detail for plan in plans for detail in plan]
+        assert any('USING INDEX' in detail and 'timestamp<' in detail for detail in details)
+        assert not any('TEMP B-TREE' in detail for detail in details)
+
+def test_summaries_cover_requested_days(tools):
+    """Summaries include entries older than two weeks when asked to"""
+    insert_observation(tools, 'sleep', 'Dreams', 'long ago', '2000-01-01 08:00:00')
+    assert tools.get_all_summaries()['sleep']['sections'] == {}
+    assert tools.get_all_summaries(days=100000)['sleep']['sections']['Dreams'][0]['observation'] == 'long ago'
+    assert tools.get_category_summary(category_id='sleep', days=100000)['sections']['Dreams']
+
+def rollup_matches_raw_rows(tools):
+    """Check the daily rollup against a full recount of category_sections"""
+    with tools.pool.connection() as db:
+        rollup = db.execute("""
+            SELECT user_id, day, category_id, section_name, entries FROM daily_section_counts ORDER BY 1, 2, 3, 4
+        """).fetchall()
+        recount = db.execute("""
+            SELECT user_id, date(timestamp), category_id, section_name, COUNT(*) FROM category_sections
+            WHERE observations != '' AND """ + LIVE_SECTIONS + """
+            GROUP BY 1, 2, 3, 4 ORDER BY 1, 2, 3, 4
+        """).fetchall()
+    return [tuple(row) for row in rollup] == [tuple(row) for row in recount]
+
+def test_trends_count_observations_per_day_and_week(tools):
+    """Trends count live observations per period and list the days without any"""
+    insert_observation(tools, 'sleep', 'Dreams', 'monday', '2023-01-02 08:00:00')
+    insert_observation(tools, 'sleep', 'Dreams', 'monday again', '2023-01-02 21:00:00')
+    insert_observation(tools, 'sleep', 'Length of sleep', '8 hours', '2023-01-04 07:00:00')
+    insert_observation(tools, 'physical', 'Strength training', 'squats', '2023-01-09 18:00:00')
+    
+    trends = tools.get_trends(days=8, until='2023-01-09')
+    assert (trends['start'], trends['end']) == ('2023-01-02', '2023-01-09')
+    sleep = trends['categories']['sleep']
+    assert sleep['total'] == 3
+    assert sleep['sections'] == {'Dreams': 2, 'Length of sleep': 1}
+    assert [point['entries'] for point in sleep['series']] == [2, 0, 1, 0, 0, 0, 0, 0]
+    assert sleep['empty_days'] == ['2023-01-03', '2023-01-05', '2023-01-06', '2023-01-07', '2023-01-08', '2023-01-09']
+    
+    weekly = tools.get_trends(days=8, until='2023-01-09', period='week', category_id='sleep')
+    assert list(weekly['categories']) == ['sleep']
+    assert weekly['categories']['sleep']['series'] == [
+        {'period': '2023-01-02', 'entries': 3}, {'period': '2023-01-09', 'entries': 0}
+    ]
+    with pytest.raises(ValueError):
+        tools.get_trends(period='month')
+
+def test_trends_stay_correct_after_clear_and_delete(tools):
+    """Writes, deletes and clears keep the rollup equal to a recount of the raw rows"""
+    tools.set_category_section_observations(category_id='sleep', section_name='Dreams', observations='Flying')
+    tools.set_category_section_observations(category_id='sleep', section_name='Dreams', observations='Falling')
+    tools.set_category_section_observations(category_id='physical', section_name='Strength training', observations='Squats')
+    assert rollup_matches_raw_rows(tools)
+    assert tools.get_trends(days=1)['categories']['sleep']['total'] == 2
+    
+    flying = tools.get_history(category_id='sleep')['entries'][-1]['id']
+    assert tools.delete_entry(flying)
+    assert rollup_matches_raw_rows(tools)
+    assert tools.get_trends(days=1)['categories']['sleep']['total'] == 1
+    
+    tools.clear_category(category_id='sleep')
+    assert rollup_matches_raw_rows(tools)
+    trends = tools.get_trends(days=1)['categories']
+    assert trends['sleep']['total'] == 0
+    assert trends['physical']['total'] == 1
+
+def test_trends_read_only_the_rollup(tools):
+    """Trend queries range over the rollup's primary key and never touch category_sections"""
+    plans = query_plans(tools, lambda: tools.get_trends(days=30))
+    details = [detail for plan in plans for detail in plan]
+    assert any('daily_section_counts' in detail and 'PRIMARY KEY' in detail for detail in details)
+    assert not any('category_sections' in detail for detail in details)
@@ -1,232 +1,565 @@
-from typing import Dict, List, Optional
+import base64
+import os
+import re
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+from migrations import DEFAULT_USER_ID
+from shards import get_user_pool
+import categories
+
+# How many of the most recent notes a category summary includes
+NOTES_SUMMARY_LIMIT = int(os.environ.get('NOTES_SUMMARY_LIMIT', '10'))
+MAX_NOTES_PAGE_SIZE = 200
+MAX_SEARCH_RESULTS = 100
+MAX_HISTORY_PAGE_SIZE = 200
+# Days of section observations included in category summaries
+SUMMARY_DAYS = 14
+# Days covered by trend reports unless asked otherwise, and the most they cover
+TRENDS_DAYS = 30
+MAX_TRENDS_DAYS = 3660
+TREND_PERIODS = ('day', 'week')
+
+# clear_category records a marker per category instead of rewriting rows:
+# observations and notes with ids up to the marker are cleared, and reads skip them
+LIVE_SECTIONS = """category_sections.id > COALESCE((
+    SELECT section_id FROM category_clears AS clears
+    WHERE clears.user_id = category_sections.user_id AND clears.category_id = category_sections.category_id
+), 0)"""
+LIVE_NOTES = """category_notes.id > COALESCE((
+    SELECT note_id FROM category_clears AS clears
+    WHERE clears.user_id = category_notes.user_id AND clears.category_id = category_notes.category_id
+), 0)"""
+# Search index rowids are 2 * id for observations and 2 * id + 1 for notes
+LIVE_SEARCH_ROWS = """doc_search.rowid / 2 > COALESCE((
+    SELECT CASE doc_search.kind WHEN 'note' THEN note_id ELSE section_id END FROM category_clears AS clears
+    WHERE clears.user_id = doc_search.user_id AND clears.category_id = doc_search.category_id
+), 0)"""
+
+# Write tools and the arguments each one takes
+WRITE_TOOLS = {
+    'set_category_section_observations': {'category_id', 'section_name', 'observations'},
+    'set_category_next_steps': {'category_id', 'next_steps'},
+    'add_category_notes': {'category_id', 'notes'},
+}
+
+def _db_timestamp(value) -> Optional[str]:
+    """Convert an ISO date or datetime to the 'YYYY-MM-DD HH:MM:SS' text timestamps are stored as"""
+    if value is None:
+        return None
+    return datetime.fromisoformat(str(value)).strftime('%Y-%m-%d %H:%M:%S')
+
+def _encode_cursor(timestamp: str, entry_id: int) -> str:
+    """Encode a history position as an opaque cursor"""
+    return base64.urlsafe_b64encode(f"{timestamp}|{entry_id}".encode('utf-8')).decode('ascii')
+
+def _decode_cursor(cursor: str) -> Tuple[str, int]:
+    """Decode a history cursor, raising ValueError for malformed ones"""
+    try:
+        timestamp, entry_id = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').rsplit('|', 1)
+        return timestamp, int(entry_id)
+    except (ValueError, UnicodeError):
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+def _period_start(day: str, period: str) -> str:
+    """Get the first day of the trend period (a day, or a week from Monday) an ISO date falls in"""
+    if period == 'day':
+        return day
+    start = datetime.fromisoformat(day).date()
+    return (start - timedelta(days=start.weekday())).isoformat()
 
 class TherapyDocTools:
     """Tools for documenting therapy sessions"""
     
-    def __init__(self):
-        """Initialize therapy documentation tools"""
-        import sqlite3
-        import os
-        
+    def __init__(self, user_id: Optional[str] = None):
+        """Initialize therapy documentation tools bound to a user"""
+        self.user_id = user_id or DEFAULT_USER_ID
         self.current_category = None
         self.current_data = {}
         self.notes = {}
         self.db_path = os.environ.get('DATABASE', '/app/data/therapy.db')
-        
-        # Create tables if they don't exist
-        with sqlite3.connect(self.db_path) as db:
-            db.execute("""
-                CREATE TABLE IF NOT EXISTS category_data (
-                    category_id TEXT PRIMARY KEY,
-                    next_steps TEXT
-                )
-            """)
-            db.execute("""
-                CREATE TABLE IF NOT EXISTS category_sections (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    category_id TEXT NOT NULL,
-                    section_name TEXT NOT NULL,
-                    observations TEXT,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            db.execute("""
-                CREATE TABLE IF NOT EXISTS category_notes (
-                    category_id TEXT PRIMARY KEY,
-                    notes TEXT
-                )
-            """)
-            
-            # Initialize categories and their sections
-            categories = self.get_categories()
-            for category in categories:
-                db.execute("""
-                    INSERT OR IGNORE INTO category_data (category_id, next_steps)
-                    VALUES (?, '')
-                """, (category['id'],))
-                db.execute("""
-                    INSERT OR IGNORE INTO category_notes (category_id, notes)
-                    VALUES (?, '')
-                """, (category['id'],))
-                
-                # No need to initialize empty sections anymore
-                pass
+        # Writes buffered by batch(); None outside a batch
+        self._pending: Optional[List[Tuple[str, Dict]]] = None
+        # Schema is owned by migrations.py and applied once at startup, so
+        # constructing the tools does no writes
+    
+    @property
+    def pool(self):
+        """Get the connection pool holding this user's data (their shard, when sharding is on)"""
+        return get_user_pool(self.user_id, self.db_path)
     
     def set_category_section_observations(self, *, category_id: str, section_name: str, observations: str):
         """Set observations for a specific section of a therapy category"""
-        # Validate category exists
-        categories = {cat['id']: cat for cat in self.get_categories()}
-        if category_id not in categories:
-            raise ValueError(f"Invalid category: {category_id}")
-        
-        # Validate section exists
-        if section_name not in categories[category_id].get('sections', []):
-            raise ValueError(f"Invalid section: {section_name}")
-        
-        import sqlite3
-        self.current_category = category_id
-        with sqlite3.connect(self.db_path) as db:
-            db.execute("""
-                INSERT INTO category_sections (category_id, section_name, observations)
-                VALUES (?, ?, ?)
-            """, (category_id, section_name, observations))
-            db.commit()
-        return f"Observations set for {category_id} - {section_name}"
+        return self._write('set_category_section_observations', {
+            'category_id': category_id, 'section_name': section_name, 'observations': observations
+        })
     
     def set_category_next_steps(self, *, category_id: str, next_steps: str):
         """Set next steps for a therapy category"""
-        # Validate category exists
-        categories = {cat['id'] for cat in self.get_categories()}
-        if category_id not in categories:
-            raise ValueError(f"Invalid category: {category_id}")
-        
-        import sqlite3
-        self.current_category = category_id
-        with sqlite3.connect(self.db_path) as db:
-            db.execute("""
-                INSERT OR REPLACE INTO category_data (category_id, next_steps)
-                VALUES (?, ?)
-            """, (category_id, next_steps))
-            db.commit()
-        return f"Next steps set for {category_id}"
+        return self._write('set_category_next_steps', {'category_id': category_id, 'next_steps': next_steps})
     
     def add_category_notes(self, *, category_id: str, notes: str):
         """Add notes to a therapy category"""
+        # Each note is its own row, so an append never rewrites earlier notes
+        return self._write('add_category_notes', {'category_id': category_id, 'notes': notes})
+    
+    @staticmethod
+    def _validate_write(tool_name: str, arguments: Dict) -> str:
+        """Validate a write against the category registry and get its tool output"""
+        if tool_name not in WRITE_TOOLS or set(arguments) != WRITE_TOOLS[tool_name]:
+            raise ValueError(f"Invalid write: {tool_name} {sorted(arguments)}")
+        category_id = arguments['category_id']
+        if tool_name == 'set_category_section_observations':
+            categories.validate_section(category_id, arguments['section_name'])
+            return f"Observations set for {category_id} - {arguments['section_name']}"
+        categories.validate_category(category_id)
+        if tool_name == 'set_category_next_steps':
+            return f"Next steps set for {category_id}"
+        return f"Notes added to {category_id}"
+    
+    def _write(self, tool_name: str, arguments: Dict) -> str:
+        """Apply one write now, or buffer it when inside batch()"""
+        if self._pending is None:
+            return self.record_many([(tool_name, arguments)])[0]
+        # Validate now, so the caller sees a bad category or section immediately
+        output = self._validate_write(tool_name, arguments)
+        self._pending.append((tool_name, arguments))
+        self.current_category = arguments['category_id']
+        return output
+    
+    def record_many(self, calls: List[Tuple[str, Dict]]) -> List[str]:
+        """Apply many documentation writes in one transaction.
+        
+        ``calls`` are (tool name, arguments) pairs for the write tools. Every
+        call is validated before anything is written, so an invalid call
+        raises ValueError and writes nothing. Returns each call's tool output.
+        """
+        outputs = [self._validate_write(tool_name, arguments) for tool_name, arguments in calls]
+        if not calls:
+            return outputs
+        rows = {tool_name: [] for tool_name in WRITE_TOOLS}
+        for tool_name, arguments in calls:
+            if tool_name == 'set_category_section_observations':
+                row = (arguments['category_id'], arguments['section_name'], arguments['observations'])
+            elif tool_name == 'set_category_next_steps':
+                row = (arguments['category_id'], arguments['next_steps'])
+            else:
+                row = (arguments['category_id'], arguments['notes'])
+            rows[tool_name].append((self.user_id,) + row)
+        
+        with self.pool.connection() as db:
+            if rows['set_category_section_observations']:
+                db.executemany("""
+                    INSERT INTO category_sections (user_id, category_id, section_name, observations)
+                    VALUES (?, ?, ?, ?)
+                """, rows['set_category_section_observations'])
+            if rows['set_category_next_steps']:
+                db.executemany("""
+                    INSERT OR REPLACE INTO category_data (user_id, category_id, next_steps)
+                    VALUES (?, ?, ?)
+                """, rows['set_category_next_steps'])
+            if rows['add_category_notes']:
+                db.executemany("""
+                    INSERT INTO category_notes (user_id, category_id, note)
+                    VALUES (?, ?, ?)
+                """, rows['add_category_notes'])
+        self.current_category = calls[-1][1]['category_id']
+        return outputs
+    
+    @contextmanager
+    def batch(self):
+        """Unit of work: buffer writes and apply them in one transaction when the block exits.
+        
+        Writes are validated as they are made. If the block raises, the
+        buffered writes are discarded. Reads and clears inside the block
+        flush first, so they see earlier writes. Nested batches join the
+        outer one.
+        """
+        if self._pending is not None:
+            yield self
+            return
+        self._pending = []
+        try:
+            yield self
+            self.flush()
+        finally:
+            self._pending = None
+    
+    def flush(self):
+        """Apply the writes buffered so far by batch()"""
+        if self._pending:
+            pending, self._pending = self._pending, []
+            self.record_many(pending)
+    
+    def get_category_notes(self, *, category_id: str, limit: int = 50,
+                           before_id: Optional[int] = None) -> Dict:
+        """Get a page of notes for a category, newest first.
+        
+        Pass the returned ``next_before_id`` as ``before_id`` to get the next
+        (older) page; it is None once there are no older notes.
+        """
+        # Apply writes buffered by an open batch() first, so reads see them
+        self.flush()
         # Validate category exists
-        categories = {cat['id'] for cat in self.get_categories()}
-        if category_id not in categories:
-            raise ValueError(f"Invalid category: {category_id}")
+        categories.validate_category(category_id)
+        limit = max(1, min(int(limit), MAX_NOTES_PAGE_SIZE))
         
-        import sqlite3
-        self.current_category = category_id
-        with sqlite3.connect(self.db_path) as db:
-            # Get existing notes
-            cur = db.execute("SELECT notes FROM category_notes WHERE category_id = ?", (category_id,))
-            row = cur.fetchone()
-            existing_notes = row[0] if row else ''
-            
-            # Append new notes
-            new_notes = notes if not existing_notes else f"{existing_notes}\n{notes}"
-            
-            # Update notes
-            db.execute("""
-                INSERT OR REPLACE INTO category_notes (category_id, notes)
-                VALUES (?, ?)
-            """, (category_id, new_notes))
-            db.commit()
-        return f"Notes added to {category_id}"
+        with self.pool.connection() as db:
+            # Fetch one extra row to learn whether an older page exists
+            cur = db.execute(f"""
+                SELECT id, note, timestamp
+                FROM category_notes
+                WHERE user_id = ?
+                AND category_id = ?
+                AND id < ?
+                AND {LIVE_NOTES}
+                ORDER BY id DESC
+                LIMIT ?
+            """, (self.user_id, category_id, before_id if before_id is not None else 2 ** 63 - 1, limit + 1))
+            rows = cur.fetchall()
+        
+        notes = [
+            {'id': row[0], 'note': row[1], 'timestamp': row[2]}
+            for row in rows[:limit]
+        ]
+        return {
+            'notes': notes,
+            'next_before_id': notes[-1]['id'] if len(rows) > limit else None
+        }
     
-    def get_category_summary(self, *, category_id: str) -> Dict[str, str]:
+    def search(self, query: str, *, category_id: Optional[str] = None, since: Optional[str] = None,
+               limit: int = 20) -> List[Dict]:
+        """Search observations and notes, best matches first.
+        
+        Every word in the query must match, ignoring case and word endings.
+        ``since`` is an ISO date or datetime; only entries at or after it match.
+        """
+        self.flush()
+        if category_id is not None:
+            categories.validate_category(category_id)
+        since = _db_timestamp(since)
+        limit = max(1, min(int(limit), MAX_SEARCH_RESULTS))
+        # Quote each word so user input can't inject FTS5 query syntax
+        words = re.findall(r'\w+', query or '')
+        if not words:
+            return []
+        match = ' '.join(f'"{word}"' for word in words)
+        
+        sql = """
+            SELECT rowid, kind, category_id, section_name, body, timestamp,
+                   snippet(doc_search, 0, '[', ']', '...', 12), bm25(doc_search)
+            FROM doc_search
+            WHERE doc_search MATCH ?
+            AND user_id = ?
+            AND """ + LIVE_SEARCH_ROWS
+        params = [match, self.user_id]
+        if category_id is not None:
+            sql += " AND category_id = ?"
+            params.append(category_id)
+        if since is not None:
+            sql += " AND timestamp >= ?"
+            params.append(since)
+        sql += " ORDER BY bm25(doc_search), timestamp DESC LIMIT ?"
+        params.append(limit)
+        
+        with self.pool.connection() as db:
+            rows = db.execute(sql, params).fetchall()
+        return [
+            {
+                'id': row[0] // 2,
+                'kind': row[1],
+                'category_id': row[2],
+                'section_name': row[3],
+                'text': row[4],
+                'timestamp': row[5],
+                'snippet': row[6],
+                'score': -row[7]
+            }
+            for row in rows
+        ]
+    
+    def get_history(self, *, category_id: Optional[str] = None, since: Optional[str] = None,
+                    until: Optional[str] = None, cursor: Optional[str] = None, limit: int = 50) -> Dict:
+        """Get a page of section observations, newest first.
+        
+        ``since`` (inclusive) and ``until`` (exclusive) are ISO dates or
+        datetimes. Pass the returned ``next_cursor`` as ``cursor`` to get the
+        next (older) page; it is None on the last page. Pages are found by
+        seeking to the cursor in the index, so every page costs the same.
+        """
+        self.flush()
+        if category_id is not None:
+            categories.validate_category(category_id)
+        since, until = _db_timestamp(since), _db_timestamp(until)
+        limit = max(1, min(int(limit), MAX_HISTORY_PAGE_SIZE))
+        
+        sql = """
+            SELECT id, category_id, section_name, observations, timestamp
+            FROM category_sections
+            WHERE user_id = ?
+            AND observations != ''
+            AND """ + LIVE_SECTIONS
+        params = [self.user_id]
+        if category_id is not None:
+            sql += " AND category_id = ?"
+            params.append(category_id)
+        if since is not None:
+            sql += " AND timestamp >= ?"
+            params.append(since)
+        if until is not None:
+            sql += " AND timestamp < ?"
+            params.append(until)
+        if cursor:
+            sql += " AND (timestamp, id) < (?, ?)"
+            params.extend(_decode_cursor(cursor))
+        # Fetch one extra row to learn whether an older page exists
+        sql += " ORDER BY timestamp DESC, id DESC LIMIT ?"
+        params.append(limit + 1)
+        
+        with self.pool.connection() as db:
+            rows = db.execute(sql, params).fetchall()
+        entries = [
+            {
+                'id': row[0],
+                'category_id': row[1],
+                'section_name': row[2],
+                'observation': row[3],
+                'timestamp': row[4]
+            }
+            for row in rows[:limit]
+        ]
+        last = entries[-1] if len(rows) > limit else None
+        return {
+            'entries': entries,
+            'next_cursor': _encode_cursor(last['timestamp'], last['id']) if last else None
+        }
+    
+    def get_category_summary(self, *, category_id: str, days: int = SUMMARY_DAYS) -> Dict[str, str]:
         """Get summary of documentation for a category"""
+        self.flush()
         # Validate category exists
-        categories = {cat['id']: cat for cat in self.get_categories()}
-        if category_id not in categories:
-            raise ValueError(f"Invalid category: {category_id}")
+        categories.validate_category(category_id)
         
-        import sqlite3
-        with sqlite3.connect(self.db_path) as db:
+        with self.pool.connection() as db:
             # Get main data
-            cur = db.execute("""
-                SELECT d.next_steps, n.notes
-                FROM category_data d
-                LEFT JOIN category_notes n ON d.category_id = n.category_id
-                WHERE d.category_id = ?
-            """, (category_id,))
+            cur = db.execute(
+                "SELECT next_steps FROM category_data WHERE user_id = ? AND category_id = ?",
+                (self.user_id, category_id)
+            )
             row = cur.fetchone()
             
-            # Get section observations from the last 2 weeks, excluding empty observations
-            sections_cur = db.execute("""
+            # Get only the most recent notes, oldest first
+            notes_cur = db.execute(f"""
+                SELECT note FROM category_notes
+                WHERE user_id = ?
+                AND category_id = ?
+                AND {LIVE_NOTES}
+                ORDER BY id DESC
+                LIMIT ?
+            """, (self.user_id, category_id, NOTES_SUMMARY_LIMIT))
+            notes = [note_row[0] for note_row in notes_cur][::-1]
+            
+            # Get section observations from the last N days, excluding empty observations
+            sections_cur = db.execute(f"""
                 SELECT id, section_name, observations, timestamp
                 FROM category_sections
-                WHERE category_id = ? 
-                AND timestamp >= datetime('now', '-14 days')
+                WHERE user_id = ?
+                AND category_id = ?
+                AND timestamp >= datetime('now', ?)
                 AND observations != ''
+                AND {LIVE_SECTIONS}
                 ORDER BY timestamp DESC
-            """, (category_id,))
+            """, (self.user_id, category_id, f'-{int(days)} days'))
             
-            sections_data = {}
+            return {
+                'sections': self._group_sections(sections_cur),
+                'next_steps': (row[0] if row else '') or '',
+                'notes': '\n'.join(notes)
+            }
+    
+    def get_all_summaries(self, days: int = SUMMARY_DAYS) -> Dict[str, Dict]:
+        """Get documentation summaries for every category in a fixed number of queries"""
+        self.flush()
+        summaries = {
+            category_id: {'sections': {}, 'next_steps': '', 'notes': ''}
+            for category_id in categories.CATEGORIES_BY_ID
+        }
+        
+        with self.pool.connection() as db:
+            # Next steps and the most recent notes of every category in one
+            # round trip; each notes branch walks idx_category_notes backwards
+            # and stops at the limit instead of reading the full history
+            text_cur = db.execute(
+                "SELECT 'next_steps', category_id, 0, next_steps FROM category_data WHERE user_id = ?"
+                + "".join(
+                    " UNION ALL SELECT * FROM (SELECT 'notes', category_id, id, note FROM category_notes "
+                    f"WHERE user_id = ? AND category_id = ? AND {LIVE_NOTES} ORDER BY id DESC LIMIT ?)"
+                    for _ in summaries
+                ) + " ORDER BY 2, 3",
+                [self.user_id] + [
+                    param
+                    for category_id in summaries
+                    for param in (self.user_id, category_id, NOTES_SUMMARY_LIMIT)
+                ]
+            )
+            notes = {}
+            for field, category_id, _, value in text_cur:
+                if category_id not in summaries:
+                    continue
+                if field == 'notes':
+                    notes.setdefault(category_id, []).append(value)
+                else:
+                    summaries[category_id]['next_steps'] = value or ''
+            for category_id, category_notes in notes.items():
+                summaries[category_id]['notes'] = '\n'.join(category_notes)
+            
+            # Section observations for all categories from the last N days, grouped in one pass
+            sections_cur = db.execute(f"""
+                SELECT id, section_name, observations, timestamp, category_id
+                FROM category_sections
+                WHERE user_id = ?
+                AND timestamp >= datetime('now', ?)
+                AND observations != ''
+                AND {LIVE_SECTIONS}
+                ORDER BY timestamp DESC
+            """, (self.user_id, f'-{int(days)} days'))
             for section_row in sections_cur:
-                section_name = section_row[1]
-                if section_name not in sections_data:
-                    sections_data[section_name] = []
-                sections_data[section_name].append({
+                summary = summaries.get(section_row[4])
+                if summary is None:
+                    continue
+                summary['sections'].setdefault(section_row[1], []).append({
                     'id': section_row[0],
                     'observation': section_row[2],
                     'timestamp': section_row[3]
                 })
-            
-            return {
-                'sections': sections_data,
-                'next_steps': row[0] if row else '',
-                'notes': row[1] if row else ''
+        
+        return summaries
+    
+    def get_trends(self, *, days: int = TRENDS_DAYS, category_id: Optional[str] = None,
+                   period: str = 'day', until: Optional[str] = None) -> Dict:
+        """Get how many observations were logged per category and section over the last N days.
+        
+        Counts come from the daily rollup table, so the cost grows with the
+        number of days covered rather than the number of observations.
+        ``period`` is 'day' or 'week' (weeks start on Monday), and ``until``
+        is the last ISO date covered, today (UTC) by default. Each category
+        lists its ``empty_days``, the days without a single observation.
+        """
+        self.flush()
+        if category_id is not None:
+            categories.validate_category(category_id)
+        if period not in TREND_PERIODS:
+            raise ValueError(f"Invalid period: {period}")
+        days = max(1, min(int(days), MAX_TRENDS_DAYS))
+        end = datetime.fromisoformat(str(until)).date() if until else datetime.now(timezone.utc).date()
+        all_days = [(end - timedelta(days=offset)).isoformat() for offset in range(days - 1, -1, -1)]
+        
+        periods = list(dict.fromkeys(_period_start(day, period) for day in all_days))
+        category_ids = [category_id] if category_id is not None else list(categories.CATEGORIES_BY_ID)
+        counts = {
+            cat_id: {'series': dict.fromkeys(periods, 0), 'sections': {}, 'days': set(), 'total': 0}
+            for cat_id in category_ids
+        }
+        
+        sql = """
+            SELECT day, category_id, section_name, entries
+            FROM daily_section_counts
+            WHERE user_id = ?
+            AND day BETWEEN ? AND ?
+        """
+        params = [self.user_id, all_days[0], all_days[-1]]
+        if category_id is not None:
+            sql += " AND category_id = ?"
+            params.append(category_id)
+        with self.pool.connection() as db:
+            rows = db.execute(sql, params).fetchall()
+        
+        for day, cat_id, section_name, entries in rows:
+            trend = counts.get(cat_id)
+            if trend is None:
+                continue
+            trend['series'][_period_start(day, period)] += entries
+            trend['sections'][section_name] = trend['sections'].get(section_name, 0) + entries
+            trend['days'].add(day)
+            trend['total'] += entries
+        
+        return {
+            'start': all_days[0],
+            'end': all_days[-1],
+            'period': period,
+            'categories': {
+                cat_id: {
+                    'total': trend['total'],
+                    'sections': trend['sections'],
+                    'series': [{'period': key, 'entries': value} for key, value in trend['series'].items()],
+                    'empty_days': [day for day in all_days if day not in trend['days']]
+                }
+                for cat_id, trend in counts.items()
             }
+        }
+    
+    @staticmethod
+    def _group_sections(rows) -> Dict[str, List[Dict]]:
+        """Group (id, section_name, observations, timestamp) rows by section"""
+        sections_data = {}
+        for section_row in rows:
+            sections_data.setdefault(section_row[1], []).append({
+                'id': section_row[0],
+                'observation': section_row[2],
+                'timestamp': section_row[3]
+            })
+        return sections_data
+    
+    def delete_entry(self, entry_id: int) -> bool:
+        """Delete one of this user's live section observations, returning whether it existed"""
+        self.flush()
+        with self.pool.connection() as db:
+            cur = db.execute(
+                f"DELETE FROM category_sections WHERE id = ? AND user_id = ? AND {LIVE_SECTIONS}",
+                (entry_id, self.user_id)
+            )
+        return cur.rowcount > 0
     
     def clear_category(self, *, category_id: str):
-        """Clear documentation for a category"""
+        """Clear documentation for a category.
+        
+        Observations and notes are not rewritten: the category's clear marker
+        moves to the newest ids, so the cost doesn't grow with the history.
+        Cleared rows stay on disk until compaction.py archives or purges them.
+        """
+        # Writes made earlier in an open batch() come before the clear
+        self.flush()
         # Validate category exists
-        categories = {cat['id'] for cat in self.get_categories()}
-        if category_id not in categories:
-            raise ValueError(f"Invalid category: {category_id}")
+        categories.validate_category(category_id)
         
-        import sqlite3
-        with sqlite3.connect(self.db_path) as db:
+        with self.pool.connection() as db:
             db.execute("""
                 UPDATE category_data
                 SET next_steps = ''
-                WHERE category_id = ?
-            """, (category_id,))
+                WHERE user_id = ? AND category_id = ?
+            """, (self.user_id, category_id))
+            # AUTOINCREMENT ids only grow, so every row written after the clear is above the marker
             db.execute("""
-                UPDATE category_sections
-                SET observations = ''
-                WHERE category_id = ?
-            """, (category_id,))
+                INSERT INTO category_clears (user_id, category_id, section_id, note_id, cleared_at)
+                VALUES (?, ?,
+                        (SELECT COALESCE(MAX(id), 0) FROM category_sections),
+                        (SELECT COALESCE(MAX(id), 0) FROM category_notes),
+                        CURRENT_TIMESTAMP)
+                ON CONFLICT (user_id, category_id) DO UPDATE SET
+                    section_id = excluded.section_id,
+                    note_id = excluded.note_id,
+                    cleared_at = excluded.cleared_at
+            """, (self.user_id, category_id))
+            # The rollup holds at most one row per day and section, so dropping the category's rows is cheap
             db.execute("""
-                UPDATE category_notes
-                SET notes = ''
-                WHERE category_id = ?
-            """, (category_id,))
-            db.commit()
+                DELETE FROM daily_section_counts
+                WHERE user_id = ? AND category_id = ?
+            """, (self.user_id, category_id))
         return f"Documentation cleared for {category_id}"
     
     def get_categories(self) -> List[Dict[str, str]]:
         """Get list of available therapy categories"""
-        return [
-            {
-                'id': 'journaling',
-                'name': 'Journaling',
-                'sections': ['General notes', 'Counting entries', 'Cognitive therapy']
-            },
-            {
-                'id': 'sleep',
-                'name': 'Sleep',
-                'sections': ['General notes', 'Length of sleep', 'Schedule', 'Dreams']
-            },
-            {
-                'id': 'physical',
-                'name': 'Physical Activity',
-                'sections': ['General notes', 'Fitbit heart rate zones', 'Strength training']
-            },
-            {
-                'id': 'social',
-                'name': 'Social Engagement',
-                'sections': ['General notes', 'In-person', 'Text', 'VC']
-            },
-            {
-                'id': 'productivity',
-                'name': 'Productivity & Work',
-                'sections': ['General notes', 'Cold Turkey', 'iOS Screen Time']
-            },
-            {
-                'id': 'spiritual',
-                'name': 'Spiritual Practice',
-                'sections': ['General notes', 'Solo', 'Group']
-            },
-            {
-                'id': 'self_care',
-                'name': 'Basic Self-Care',
-                'sections': ['General notes', 'Meals hygiene meds', 'budget checklist medical appts']
-            }
-        ]
+        return categories.get_categories()
     
     def get_tools(self) -> List[Dict[str, str]]:
         """Get list of available tools"""